@@ -5,12 +5,90 @@ from http.server import BaseHTTPRequestHandler
 from urllib.parse import parse_qs, urlparse
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
-from lib.db import get_conn
+from lib.db import connection
+from lib.migrations import LATEST_VERSION, migrate, check_schema
+from lib.admin_stats import dashboard_stats, concepts_stats, stats_history
 
 ADMIN_SECRET_KEY = os.environ.get("ADMIN_SECRET_KEY")
 if not ADMIN_SECRET_KEY:
     raise RuntimeError("ADMIN_SECRET_KEY environment variable is required")
 
+# 유저·리뷰 목록 — (created_at, id) 내림차순 keyset 페이지네이션
+PAGE_DEFAULT_LIMIT = 100
+PAGE_MAX_LIMIT = 1000
+STREAM_BATCH_ROWS = 1000
+
+_LISTINGS = {
+    "users": {
+        "select": "SELECT u.id, COALESCE(u.streak_count, 0), u.created_at, u.platform FROM users u",
+        "order": ("u.created_at", "u.id"),
+        "row": lambda r: {
+            "id": r[0],
+            "streak_count": r[1],
+            "created_at": r[2],
+            "platform": r[3] or "google",
+        },
+    },
+    "reviews": {
+        "select": "SELECT id, user_id, review_text, created_at FROM app_reviews",
+        "order": ("created_at", "id"),
+        "row": lambda r: {
+            "id": r[0],
+            "user_id": r[1],
+            "review_text": r[2],
+            "created_at": r[3],
+        },
+    },
+}
+
+
+def _listing_queries(kind: str, after: tuple | None) -> list:
+    """[(query, args)] — after보다 뒤 행을 created_at DESC NULLS LAST, id DESC 순으로
+    읽는 단계들 (호출 측이 남은 개수만큼 LIMIT을 붙여 차례로 실행).
+    created_at 있는 행은 (created_at DESC, id DESC) 인덱스 순서 그대로, 그다음
+    created_at NULL 행을 id 역순으로. after가 NULL 행 커서면 둘째 단계만."""
+    ts_col, id_col = _LISTINGS[kind]["order"]
+    select = _LISTINGS[kind]["select"]
+    phases = []
+    if after is None or after[0] is not None:
+        cond, args = f"{ts_col} IS NOT NULL", []
+        if after:
+            cond += f" AND ({ts_col}, {id_col}) < (%s, %s)"
+            args.extend(after)
+        phases.append((f"{select} WHERE {cond} ORDER BY {ts_col} DESC, {id_col} DESC", args))
+    cond, args = f"{ts_col} IS NULL", []
+    if after and after[0] is None:
+        cond += f" AND {id_col} < %s"
+        args.append(after[1])
+    phases.append((f"{select} WHERE {cond} ORDER BY {id_col} DESC", args))
+    return phases
+
+
+def _encode_cursor(item: dict) -> str:
+    """목록 항목 → "created_at,id" (다음 페이지의 after 값). created_at이 NULL이면 ",id"."""
+    created_at = item["created_at"]
+    if created_at is None:
+        created_at = ""
+    elif hasattr(created_at, "isoformat"):
+        created_at = created_at.isoformat()
+    return f"{created_at},{item['id']}"
+
+
+def _decode_cursor(raw: str) -> tuple | None:
+    """after 값 "created_at,id" → (created_at, id), ",id" → (None, id).
+    빈 값이면 None, 형식 오류면 ValueError.
+    created_at(ISO 시각)에는 쉼표가 없으므로 첫 쉼표로 나눔."""
+    if not raw:
+        return None
+    created_at, sep, item_id = raw.partition(",")
+    if not sep or not item_id:
+        raise ValueError(raw)
+    return created_at or None, item_id
+
+
+# backfill_concepts 1회 호출에서 새 건을 집는 시간 예산 (함수 타임아웃보다 짧게)
+BACKFILL_TIME_BUDGET_SEC = float(os.environ.get("BACKFILL_TIME_BUDGET_SEC", "45"))
+
 
 def _check_auth(headers, params) -> bool:
     key = headers.get("X-Admin-Key") or params.get("key", [None])[0]
@@ -26,131 +104,101 @@ class handler(BaseHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(body)
 
-    def _get_stats(self):
-        conn = get_conn()
-        try:
+    def _get_listing(self, kind: str, after: tuple | None, limit: int) -> dict:
+        """keyset 페이지 1장. limit+1건을 읽어 다음 페이지 유무 판단."""
+        spec = _LISTINGS[kind]
+        rows = []
+        with connection() as conn:
             cur = conn.cursor()
-
-            # 총 유저 수
-            cur.execute("SELECT COUNT(*) FROM users")
-            total_users = int(cur.fetchone()[0])
-
-            # 오늘 신규 가입
-            cur.execute("""
-                SELECT COUNT(*) FROM users
-                WHERE created_at::date = CURRENT_DATE
-            """)
-            new_users_today = int(cur.fetchone()[0])
-
-            # 총 뉴스 기사 수
-            cur.execute("SELECT COUNT(*) FROM news")
-            total_news = int(cur.fetchone()[0])
-
-            # 오늘 생성된 뉴스
-            cur.execute("""
-                SELECT COUNT(*) FROM news
-                WHERE created_at::date = CURRENT_DATE
-            """)
-            new_news_today = int(cur.fetchone()[0])
-
-            # 총 리뷰 수
-            cur.execute("SELECT COUNT(*) FROM app_reviews")
-            total_reviews = int(cur.fetchone()[0])
-
+            for query, args in _listing_queries(kind, after):
+                cur.execute(query + " LIMIT %s", args + [limit + 1 - len(rows)])
+                rows.extend(cur.fetchall())
+                if len(rows) > limit:
+                    break
             cur.close()
-            return {
-                "total_users": total_users,
-                "new_users_today": new_users_today,
-                "total_news": total_news,
-                "new_news_today": new_news_today,
-                "total_reviews": total_reviews,
-            }
-        finally:
-            conn.close()
-
-    def _get_concepts_stats(self):
-        """백필 진척·코퍼스 현황 확인용."""
-        conn = get_conn()
+        items = [spec["row"](r) for r in rows[:limit]]
+        next_cursor = _encode_cursor(items[-1]) if len(rows) > limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+    def _begin_stream(self, content_type: str, extra_headers: dict | None = None):
+        """길이를 모르는 응답 시작. 본문은 _write_chunk로 나눠 보내고 연결 종료로 끝냄."""
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("X-Accel-Buffering", "no")
+        self.send_header("Connection", "close")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        if extra_headers:
+            for key, value in extra_headers.items():
+                self.send_header(key, value)
+        self.end_headers()
+        self.close_connection = True
+
+    def _write_chunk(self, data: bytes):
+        if data:
+            self.wfile.write(data)
+            self.wfile.flush()
+
+    def _stream_listing(self, kind: str, after: tuple | None, limit: int | None):
+        """NDJSON(한 줄에 한 행) 스트리밍. 서버 측 커서로 STREAM_BATCH_ROWS씩 읽어
+        바로 보내므로 전체 결과를 메모리에 두지 않음. 중간 실패는 {"detail"} 줄로 알림."""
+        spec = _LISTINGS[kind]
+        sent = 0
+        self._begin_stream("application/x-ndjson; charset=utf-8")
         try:
-            cur = conn.cursor()
-            cur.execute("SELECT COUNT(*) FROM concepts")
-            total_concepts = int(cur.fetchone()[0])
-            cur.execute("SELECT COUNT(*) FROM concept_occurrences")
-            total_occurrences = int(cur.fetchone()[0])
-            cur.execute("SELECT COUNT(*) FROM news")
-            total_news = int(cur.fetchone()[0])
-            cur.execute(
-                "SELECT COUNT(DISTINCT news_id) FROM concept_occurrences"
-            )
-            tagged_news = int(cur.fetchone()[0])
-            cur.execute(
-                "SELECT domain, COUNT(*) FROM concepts GROUP BY domain "
-                "ORDER BY COUNT(*) DESC"
-            )
-            by_domain = {d: int(c) for d, c in cur.fetchall()}
-            cur.close()
-            return {
-                "total_concepts": total_concepts,
-                "total_occurrences": total_occurrences,
-                "total_news": total_news,
-                "tagged_news": tagged_news,
-                "untagged_news": total_news - tagged_news,
-                "by_domain": by_domain,
-            }
-        finally:
-            conn.close()
-
-    def _get_users(self):
-        conn = get_conn()
+            with connection() as conn:
+                for phase, (query, args) in enumerate(_listing_queries(kind, after)):
+                    if limit is not None:
+                        if sent >= limit:
+                            break
+                        query, args = query + " LIMIT %s", args + [limit - sent]
+                    cur = conn.cursor(name=f"admin_{kind}_stream_{phase}")
+                    cur.itersize = STREAM_BATCH_ROWS
+                    try:
+                        cur.execute(query, args)
+                        while True:
+                            rows = cur.fetchmany(STREAM_BATCH_ROWS)
+                            if not rows:
+                                break
+                            sent += len(rows)
+                            self._write_chunk("".join(
+                                json.dumps(spec["row"](r), ensure_ascii=False, default=str) + "\n"
+                                for r in rows
+                            ).encode("utf-8"))
+                    finally:
+                        cur.close()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except Exception as e:
+            try:
+                self._write_chunk((json.dumps({"detail": str(e)}) + "\n").encode("utf-8"))
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    def _handle_listing(self, kind: str, params: dict):
+        """users/reviews 목록. ?after=<created_at,id>&limit=N (기본 PAGE_DEFAULT_LIMIT).
+        format=ndjson(또는 Accept: application/x-ndjson)이면 after 이후 전체를 스트리밍
+        (limit을 주면 그만큼만)."""
+        stream = (params.get("format", [""])[0] == "ndjson"
+                  or "application/x-ndjson" in self.headers.get("Accept", ""))
         try:
-            cur = conn.cursor()
-            cur.execute("""
-                SELECT
-                    u.id,
-                    COALESCE(u.streak_count, 0) AS streak_count,
-                    u.created_at,
-                    u.platform
-                FROM users u
-                ORDER BY u.created_at DESC
-            """)
-            rows = cur.fetchall()
-            cur.close()
-            return [
-                {
-                    "id": row[0],
-                    "streak_count": row[1],
-                    "created_at": row[2],
-                    "platform": row[3] or "google",
-                }
-                for row in rows
-            ]
-        finally:
-            conn.close()
-
-    def _get_reviews(self):
-        conn = get_conn()
+            after = _decode_cursor(params.get("after", [""])[0])
+            limit_raw = params.get("limit", [None])[0]
+            limit = max(1, min(PAGE_MAX_LIMIT, int(limit_raw))) if limit_raw else None
+        except ValueError:
+            self._json_response(400, {"detail": "after must be '<created_at>,<id>' (or ',<id>') and limit an integer"})
+            return
+        if stream:
+            self._stream_listing(kind, after, limit)
+            return
         try:
-            cur = conn.cursor()
-            cur.execute("""
-                SELECT id, user_id, review_text, created_at
-                FROM app_reviews
-                ORDER BY created_at DESC
-            """)
-            rows = cur.fetchall()
-            cur.close()
-            return [
-                {
-                    "id": row[0],
-                    "user_id": row[1],
-                    "review_text": row[2],
-                    "created_at": row[3],
-                }
-                for row in rows
-            ]
-        finally:
-            conn.close()
+            self._json_response(200, self._get_listing(kind, after, limit or PAGE_DEFAULT_LIMIT))
+        except Exception as e:
+            self._json_response(500, {"detail": str(e)})
 
     def _export_csv(self, export_type, columns, date_from, date_to):
+        """CSV 내보내기 스트리밍. 서버 측 커서로 STREAM_BATCH_ROWS씩 읽어 배치마다
+        CSV로 써서 바로 보냄 — 내보내기 크기와 무관하게 메모리 일정. BOM은 맨 앞 1회."""
         import csv
         import io
         from datetime import date
@@ -168,79 +216,60 @@ class handler(BaseHTTPRequestHandler):
         if not valid_cols:
             valid_cols = allowed[export_type]
 
-        conn = get_conn()
-        try:
-            cur = conn.cursor()
-            rows = []
-
-            if export_type == "users":
-                query = """
-                    SELECT u.id, COALESCE(u.streak_count, 0), u.platform, u.created_at
-                    FROM users u
-                """
-                conditions = []
-                args = []
-                if date_from:
-                    conditions.append("u.created_at >= %s")
-                    args.append(date_from)
-                if date_to:
-                    conditions.append("u.created_at < (%s::date + interval '1 day')")
-                    args.append(date_to)
-                if conditions:
-                    query += " WHERE " + " AND ".join(conditions)
-                query += " ORDER BY u.created_at DESC"
-                cur.execute(query, args)
-                for row in cur.fetchall():
-                    rows.append({
-                        "id": row[0],
-                        "streak_count": row[1],
-                        "platform": row[2] or "google",
-                        "created_at": str(row[3]) if row[3] else "",
-                    })
-
-            elif export_type == "reviews":
-                query = "SELECT id, user_id, review_text, created_at FROM app_reviews"
-                conditions = []
-                args = []
-                if date_from:
-                    conditions.append("created_at >= %s")
-                    args.append(date_from)
-                if date_to:
-                    conditions.append("created_at < (%s::date + interval '1 day')")
-                    args.append(date_to)
-                if conditions:
-                    query += " WHERE " + " AND ".join(conditions)
-                query += " ORDER BY created_at DESC"
-                cur.execute(query, args)
-                for row in cur.fetchall():
-                    rows.append({
-                        "id": row[0],
-                        "user_id": row[1],
-                        "review_text": row[2],
-                        "created_at": str(row[3]) if row[3] else "",
-                    })
-
-            cur.close()
-
-            output = io.StringIO()
-            writer = csv.DictWriter(output, fieldnames=valid_cols)
-            writer.writeheader()
-            for row in rows:
-                writer.writerow({k: row.get(k, "") for k in valid_cols})
-
-            csv_bytes = ("﻿" + output.getvalue()).encode("utf-8")
-            filename = f"{export_type}_{date.today()}.csv"
-            self.send_response(200)
-            self.send_header("Content-Type", "text/csv; charset=utf-8-sig")
-            self.send_header("Content-Disposition", f'attachment; filename="{filename}"')
-            self.send_header("Access-Control-Allow-Origin", "*")
-            self.end_headers()
-            self.wfile.write(csv_bytes)
-        finally:
+        spec = _LISTINGS[export_type]
+        ts_col, id_col = spec["order"]
+        query = spec["select"]
+        conditions = []
+        args = []
+        if date_from:
+            conditions.append(f"{ts_col} >= %s")
+            args.append(date_from)
+        if date_to:
+            conditions.append(f"{ts_col} < (%s::date + interval '1 day')")
+            args.append(date_to)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += f" ORDER BY {ts_col} DESC NULLS LAST, {id_col} DESC"
+
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=valid_cols, extrasaction="ignore")
+
+        def _drain() -> bytes:
+            data = buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+            return data
+
+        with connection() as conn:
+            cur = conn.cursor(name=f"admin_{export_type}_export")
+            cur.itersize = STREAM_BATCH_ROWS
             try:
-                conn.close()
-            except Exception:
-                pass
+                # 첫 배치까지 읽은 뒤 헤더 전송 — 쿼리 오류는 아직 500으로 응답 가능
+                cur.execute(query, args)
+                rows = cur.fetchmany(STREAM_BATCH_ROWS)
+                filename = f"{export_type}_{date.today()}.csv"
+                self._begin_stream("text/csv; charset=utf-8-sig", {
+                    "Content-Disposition": f'attachment; filename="{filename}"',
+                })
+                buf.write("\ufeff")
+                writer.writeheader()
+                try:
+                    while rows:
+                        for r in rows:
+                            item = spec["row"](r)
+                            item["created_at"] = str(item["created_at"]) if item["created_at"] else ""
+                            writer.writerow(item)
+                        self._write_chunk(_drain())
+                        rows = cur.fetchmany(STREAM_BATCH_ROWS)
+                    self._write_chunk(_drain())
+                except (BrokenPipeError, ConnectionResetError):
+                    # 다운로드 취소 — 남은 행은 읽지 않음
+                    pass
+                except Exception as e:
+                    # 헤더를 이미 보냈으므로 500으로 바꿀 수 없음 — 잘린 채 종료
+                    print(f"  CSV 내보내기 중단: {e}")
+            finally:
+                cur.close()
 
     def do_GET(self):
         parsed = urlparse(self.path)
@@ -254,40 +283,113 @@ class handler(BaseHTTPRequestHandler):
 
         if action == "stats":
             try:
-                data = self._get_stats()
-                self._json_response(200, data)
+                check_schema()
+                fresh = params.get("fresh", ["0"])[0] == "1"
+                self._json_response(200, dashboard_stats(fresh=fresh))
+            except Exception as e:
+                self._json_response(500, {"detail": str(e)})
+
+        elif action in ("users", "reviews"):
+            self._handle_listing(action, params)
+
+        elif action == "concepts_stats":
+            try:
+                check_schema()
+                fresh = params.get("fresh", ["0"])[0] == "1"
+                self._json_response(200, concepts_stats(fresh=fresh))
             except Exception as e:
                 self._json_response(500, {"detail": str(e)})
 
-        elif action == "users":
+        elif action == "backfill_concepts":
+            # workers개가 큐에서 병렬 claim. 시간 예산 안에서만 새 건을 집음
+            try:
+                limit = max(1, min(200, int(params.get("limit", ["5"])[0])))
+            except ValueError:
+                limit = 5
             try:
-                data = self._get_users()
-                self._json_response(200, data)
+                workers = max(1, min(8, int(params.get("workers", ["1"])[0])))
+            except ValueError:
+                workers = 1
+            try:
+                from lib.gemini import backfill_concepts
+                check_schema()
+                self._json_response(200, backfill_concepts(
+                    limit, workers=workers, time_budget_sec=BACKFILL_TIME_BUDGET_SEC))
             except Exception as e:
                 self._json_response(500, {"detail": str(e)})
 
-        elif action == "reviews":
+        elif action == "reconcile_progress":
+            # 유저 진척 카운터 재계산 (uid 없으면 전체)
+            uid = params.get("uid", [None])[0]
             try:
-                data = self._get_reviews()
-                self._json_response(200, data)
+                from lib.concepts_db import reconcile_user_progress
+                check_schema()
+                self._json_response(200, {"users": reconcile_user_progress(uid)})
             except Exception as e:
                 self._json_response(500, {"detail": str(e)})
 
-        elif action == "concepts_stats":
+        elif action == "chat_cache_stats":
             try:
-                self._json_response(200, self._get_concepts_stats())
+                from lib.chat_response_cache import response_cache_stats
+                check_schema()
+                self._json_response(200, response_cache_stats())
             except Exception as e:
                 self._json_response(500, {"detail": str(e)})
 
-        elif action == "backfill_concepts":
-            limit_raw = params.get("limit", ["5"])[0]
+        elif action == "backfill_summary_json":
             try:
-                limit = max(1, min(20, int(limit_raw)))
+                from lib.db import backfill_summary_json
+                check_schema()
+                self._json_response(200, {"filled": backfill_summary_json()})
+            except Exception as e:
+                self._json_response(500, {"detail": str(e)})
+
+        elif action == "stats_history":
+            # 스냅샷 추이 (kind=dashboard|concepts, hours 기본 7일, 간격 불규칙)
+            kind = params.get("kind", ["dashboard"])[0]
+            if kind not in ("dashboard", "concepts"):
+                self._json_response(400, {"detail": "kind must be one of: dashboard, concepts"})
+                return
+            try:
+                hours = max(1, min(24 * 90, int(params.get("hours", ["168"])[0])))
             except ValueError:
-                limit = 5
+                hours = 168
             try:
-                from lib.gemini import backfill_concepts
-                self._json_response(200, backfill_concepts(limit))
+                check_schema()
+                self._json_response(200, stats_history(kind, hours))
+            except Exception as e:
+                self._json_response(500, {"detail": str(e)})
+
+        elif action == "pipeline_runs":
+            # 파이프라인 계측 — view=runs(최근 실행) | stages(단계별 p50/p95·토큰 집계)
+            view = params.get("view", ["runs"])[0]
+            name = params.get("name", [None])[0]
+            try:
+                limit = max(1, min(200, int(params.get("limit", ["50"])[0])))
+                hours = max(1, min(24 * 30, int(params.get("hours", ["24"])[0])))
+            except ValueError:
+                self._json_response(400, {"detail": "limit and hours must be integers"})
+                return
+            if view not in ("runs", "stages"):
+                self._json_response(400, {"detail": "view must be one of: runs, stages"})
+                return
+            try:
+                from lib.tracing import recent_runs, stage_stats
+                check_schema()
+                if view == "runs":
+                    self._json_response(200, recent_runs(name, limit))
+                else:
+                    self._json_response(200, stage_stats(name, hours))
+            except Exception as e:
+                self._json_response(500, {"detail": str(e)})
+
+        elif action == "migrate":
+            try:
+                applied = migrate()
+                if applied is None:
+                    self._json_response(409, {"detail": "migration already in progress"})
+                else:
+                    self._json_response(200, {"applied": applied, "version": LATEST_VERSION})
             except Exception as e:
                 self._json_response(500, {"detail": str(e)})
 
@@ -306,7 +408,7 @@ class handler(BaseHTTPRequestHandler):
                 self._json_response(500, {"detail": str(e)})
 
         else:
-            self._json_response(400, {"detail": "action must be one of: stats, users, reviews, export, concepts_stats, backfill_concepts"})
+            self._json_response(400, {"detail": "action must be one of: stats, users, reviews, export, concepts_stats, backfill_concepts, reconcile_progress, chat_cache_stats, backfill_summary_json, stats_history, pipeline_runs, migrate"})
 
     def do_OPTIONS(self):
         self.send_response(200)
@@ -1,41 +1,146 @@
 import json
 import os
 import sys
-import time
-from collections import defaultdict
 from http.server import BaseHTTPRequestHandler
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
-from google import genai
-from google.genai import types
-from lib.db import init_chat_db, increment_chat_usage
+from google.genai import errors, types
+from lib.chat_quota import consume_chat_quota
+from lib.migrations import check_schema
+from lib.ratelimit import RateLimiter, client_ip
+from lib.gemini_client import GEMINI_API_KEY, generate, response_text, stream
+from lib.chat_sessions import get_store, new_session_id
+from lib.chat_context import CACHE_MISS_CODES, drop_cached_content, get_cached_content
+from lib.chat_response_cache import get_cached_reply, store_reply
+from lib.chat_prompt import CHAT_SYSTEM_INSTRUCTION, PREAMBLE_ACK, build_preamble
 
 ALLOWED_ORIGINS = os.environ.get("ALLOWED_ORIGINS", "").split(",")
-GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "")
-GEMINI_MODEL = "gemini-2.5-flash"
 
 DAILY_LIMIT = 30  # 유저당 하루 최대 채팅 횟수 (KST 날짜 기준)
 
 RATE_LIMIT = 30
 RATE_WINDOW = 60
-_request_counts = defaultdict(list)
+_limiter = RateLimiter("chat", RATE_LIMIT, RATE_WINDOW)
 
 MAX_HISTORY = 12  # 마지막 12턴까지만 컨텍스트 유지
 MAX_MESSAGE_LEN = 500
+CHAT_TIMEOUT_SEC = 30
+FALLBACK_REPLY = "잠깐, 다시 한번 말해줄래?"
 
-SYSTEM_INSTRUCTION = """너는 지음. 사용자와 함께 뉴스를 읽고 같이 생각을 넓혀가는 AI 토론 친구다.
 
-대화 원칙:
-- 한국어, 친근한 반말 톤 ("~야", "~지", "~네")
-- 1회 답변은 2~4문장 (장황 금지)
-- 균형잡힌 시각: 한쪽 의견만 강요하지 않음. 찬반 모두 보여주기
-- 사용자가 의견 물으면 양쪽 입장 짚어주고 "너는 어떻게 봐?" 식으로 되묻기
-- 뉴스 사실 모르면 솔직히 "그건 잘 모르겠어" 인정. 추측하지 말 것
-- 정치/종교/민감 이슈는 중립 유지. 단정 금지
-- 이모지 1~2개까지만 사용 (남발 금지)
-- 뉴스 맥락(왜 중요한지 포함)을 바탕으로 구체적으로 답할 것. 뉴스와 동떨어진 추상적 답변 금지
-- 용어 설명이 뉴스 컨텍스트에 제공된 경우, 그 용어가 대화에 나오면 쉽고 자연스럽게 풀어 설명할 것
-- 소크라테스식 접근: 답변 끝에 사용자 사고를 넓히는 후속 질문이나 다른 관점을 가볍게 한 줄 던져. 단 매번 강제하지 말고, 자연스러울 때만."""
+def _clean_history(history) -> list:
+    """클라이언트 history → [{"role": "user"|"model", "content"}] (빈/잘못된 턴 제외)."""
+    if not isinstance(history, list):
+        return []
+    turns = []
+    for turn in history:
+        if not isinstance(turn, dict):
+            continue
+        role = turn.get("role")
+        content = (turn.get("content") or "").strip()
+        if not content:
+            continue
+        if role == "user":
+            turns.append({"role": "user", "content": content})
+        elif role == "assistant" or role == "model":
+            turns.append({"role": "model", "content": content})
+    return turns
+
+
+def _build_contents(preamble: str | None, history: list, message: str) -> list:
+    contents = []
+    # 뉴스 컨텍스트를 첫 turn으로 주입
+    if preamble:
+        contents.append(types.Content(role="user", parts=[types.Part(text=preamble)]))
+        contents.append(types.Content(role="model", parts=[types.Part(text=PREAMBLE_ACK)]))
+    # 이전 대화 히스토리
+    for turn in history:
+        contents.append(types.Content(role=turn["role"], parts=[types.Part(text=turn["content"])]))
+    # 최신 유저 메시지
+    contents.append(types.Content(role="user", parts=[types.Part(text=message)]))
+    return contents
+
+
+def _request(preamble: str | None, history: list, message: str, cache_name: str | None):
+    """(contents, config). cache_name이 있으면 시스템 지시문·프리앰블은 캐시가 담당."""
+    config = types.GenerateContentConfig(
+        temperature=0.8,
+        max_output_tokens=400,
+        thinking_config=types.ThinkingConfig(thinking_budget=0),
+    )
+    if cache_name:
+        config.cached_content = cache_name
+        return _build_contents(None, history, message), config
+    config.system_instruction = CHAT_SYSTEM_INSTRUCTION
+    return _build_contents(preamble, history, message), config
+
+
+def _is_cache_miss(e: Exception) -> bool:
+    return isinstance(e, errors.APIError) and e.code in CACHE_MISS_CODES
+
+
+def _generate_reply(preamble: str | None, history: list, message: str,
+                    cache_name: str | None) -> str:
+    """비스트리밍 응답 텍스트. 캐시가 원격에서 사라졌으면 매핑을 버리고 캐시 없이 재요청.
+    유저가 기다리는 경로 — cron 예산 대기 없이, 재시도는 1회만."""
+    try:
+        contents, config = _request(preamble, history, message, cache_name)
+        response = generate(contents, config=config, timeout=CHAT_TIMEOUT_SEC,
+                            retries=1, use_budget=False)
+    except Exception as e:
+        if not cache_name or not _is_cache_miss(e):
+            raise
+        drop_cached_content(cache_name)
+        contents, config = _request(preamble, history, message, None)
+        response = generate(contents, config=config, timeout=CHAT_TIMEOUT_SEC,
+                            retries=1, use_budget=False)
+    return response_text(response)
+
+
+def _stream_chunks(preamble: str | None, history: list, message: str,
+                   cache_name: str | None):
+    """스트리밍 텍스트 조각. 캐시 미스 폴백은 첫 조각 전에 실패한 경우에만."""
+    if cache_name:
+        emitted = False
+        try:
+            contents, config = _request(preamble, history, message, cache_name)
+            for text in stream(contents, config=config, timeout=CHAT_TIMEOUT_SEC,
+                               retries=1, use_budget=False):
+                emitted = True
+                yield text
+            return
+        except Exception as e:
+            if emitted or not _is_cache_miss(e):
+                raise
+            drop_cached_content(cache_name)
+    contents, config = _request(preamble, history, message, None)
+    yield from stream(contents, config=config, timeout=CHAT_TIMEOUT_SEC,
+                      retries=1, use_budget=False)
+
+
+def _load_session(session_id: str, user_id: str) -> dict | None:
+    try:
+        check_schema()
+        return get_store().load(session_id, user_id)
+    except Exception as e:
+        print(f"  채팅 세션 조회 실패: {e}")
+        return None
+
+
+def _save_session(session_id: str | None, user_id: str, preamble: str | None,
+                  history: list, message: str, reply: str) -> str | None:
+    """이번 턴을 붙여 MAX_HISTORY로 트리밍 후 저장. 저장된 session_id (실패 시 None)."""
+    history = history + [
+        {"role": "user", "content": message},
+        {"role": "model", "content": reply},
+    ]
+    session_id = session_id or new_session_id()
+    try:
+        get_store().save(session_id, user_id, preamble, history[-MAX_HISTORY:])
+        return session_id
+    except Exception as e:
+        print(f"  채팅 세션 저장 실패: {e}")
+        return None
 
 
 def _get_cors_origin(request_origin: str) -> str:
@@ -64,16 +169,48 @@ class handler(BaseHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
 
+    def _wants_stream(self, body: dict) -> bool:
+        return body.get("stream") is True or "text/event-stream" in self.headers.get("Accept", "")
+
+    def _sse(self, event: str, payload: dict):
+        data = json.dumps(payload, ensure_ascii=False)
+        self.wfile.write(f"event: {event}\ndata: {data}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def _stream_reply(self, chunks, finish):
+        """SSE 스트리밍 응답. 조각마다 delta 이벤트, 마지막에 done 이벤트로
+        비스트리밍 응답과 같은 finish(reply) 페이로드를 보냄.
+        생성 중 실패는 헤더를 이미 보냈으므로 error 이벤트로 전달."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("X-Accel-Buffering", "no")
+        self._send_cors_headers()
+        self.end_headers()
+
+        received = []
+        try:
+            try:
+                for text in chunks:
+                    received.append(text)
+                    self._sse("delta", {"text": text})
+            except (BrokenPipeError, ConnectionResetError):
+                raise
+            except Exception as e:
+                self._sse("error", {"detail": f"AI 응답 실패: {str(e)[:120]}"})
+                return
+
+            reply = "".join(received).strip()
+            if not reply:
+                reply = FALLBACK_REPLY
+                self._sse("delta", {"text": reply})
+            self._sse("done", finish(reply))
+        except (BrokenPipeError, ConnectionResetError):
+            # 클라이언트가 중간에 끊음 — 남은 생성은 버림
+            pass
+
     def _check_rate_limit(self) -> bool:
-        client_ip = self.headers.get("X-Forwarded-For", self.client_address[0])
-        now = time.time()
-        _request_counts[client_ip] = [
-            t for t in _request_counts[client_ip] if now - t < RATE_WINDOW
-        ]
-        if len(_request_counts[client_ip]) >= RATE_LIMIT:
-            return True
-        _request_counts[client_ip].append(now)
-        return False
+        return not _limiter.allow(client_ip(self.headers, self.client_address))
 
     def do_OPTIONS(self):
         self.send_response(200)
@@ -87,7 +224,7 @@ class handler(BaseHTTPRequestHandler):
             self._json_response(
                 429,
                 {"detail": "Too many requests. Please retry shortly."},
-                extra_headers={"Retry-After": str(RATE_WINDOW)},
+                extra_headers={"Retry-After": str(_limiter.retry_after())},
             )
             return
 
@@ -111,25 +248,51 @@ class handler(BaseHTTPRequestHandler):
             self._json_response(400, {"detail": f"message too long (max {MAX_MESSAGE_LEN})"})
             return
 
-        # 일일 사용량 제한 — Gemini 호출 전에 카운트 (실패 시 환불 없음, 단순 유지)
         uid = (body.get("uid") or "").strip()
         if uid:
             user_id = uid
         else:
             # 식별자 없으면 IP 기반 fallback
-            forwarded = self.headers.get("X-Forwarded-For", "")
-            client_ip = forwarded.split(",")[0].strip() if forwarded else self.client_address[0]
-            user_id = f"ip:{client_ip}"
+            user_id = f"ip:{client_ip(self.headers, self.client_address)}"
+
+        # 서버 측 세션 — 옵트인(session=true 또는 session_id)한 클라이언트만.
+        # 세션이 있으면 news_context/history는 보내지 않아도 됨.
+        session_id = str(body.get("session_id") or "").strip() or None
+        use_session = session_id is not None or body.get("session") is True
+        session = _load_session(session_id, user_id) if session_id else None
+        if session is not None:
+            preamble, history = session["preamble"], session["history"]
+        else:
+            if session_id and not body.get("news_context") and not body.get("history"):
+                # 만료/모르는 세션인데 복구할 컨텍스트도 없음 → 클라이언트가 컨텍스트 재전송
+                self._json_response(410, {"error": "session_expired", "detail": "chat session expired"})
+                return
+            session_id = None
+            preamble = build_preamble(body.get("news_context"))
+            history = _clean_history(body.get("history"))
+        history = history[-MAX_HISTORY:]
 
+        news_context = body.get("news_context") if isinstance(body.get("news_context"), dict) else {}
+        news_id = news_context.get("news_id") if isinstance(news_context.get("news_id"), int) else None
+
+        # 기사에 대한 첫 질문(히스토리 없음)은 응답 캐시부터 — 히트면 Gemini 호출 없음
+        first_turn = bool(preamble) and not history
+        cached_reply = get_cached_reply(CHAT_SYSTEM_INSTRUCTION, preamble, message) if first_turn else None
+
+        # 일일 사용량 제한 — 응답 캐시 미스일 때만, Gemini 호출 전에 차감
+        # (캐시 히트는 Gemini 비용이 없으므로 차감하지 않고 remaining도 생략.
+        # 실패 시 환불 없음, 단순 유지). 이미 한도인 유저는 프로세스 메모로 DB 없이 거절됨
         used = None
-        try:
-            init_chat_db()
-            used = increment_chat_usage(user_id)
-        except Exception:
-            # DB 장애 시 채팅 자체는 허용 (fail-open)
-            used = None
+        allowed = True
+        if cached_reply is None:
+            try:
+                check_schema()
+                allowed, used = consume_chat_quota(user_id, DAILY_LIMIT)
+            except Exception:
+                # DB 장애 시 채팅 자체는 허용 (fail-open)
+                used = None
 
-        if used is not None and used > DAILY_LIMIT:
+        if not allowed:
             self._json_response(
                 429,
                 {
@@ -140,88 +303,45 @@ class handler(BaseHTTPRequestHandler):
             )
             return
 
-        news_context = body.get("news_context") or {}
-        history = body.get("history") or []
-        if not isinstance(history, list):
-            history = []
-        history = history[-MAX_HISTORY:]
+        # 기사 프리앰블 + 시스템 지시문은 cron이 만들어 둔 공유 컨텍스트 캐시로
+        # (조회만 — 없으면 None, 캐시 없이 보냄)
+        cache_name = None
+        if preamble and cached_reply is None:
+            cache_name = get_cached_content(CHAT_SYSTEM_INSTRUCTION, preamble, PREAMBLE_ACK)
 
-        contents = []
-
-        # 뉴스 컨텍스트를 첫 turn으로 주입
-        if isinstance(news_context, dict) and news_context:
-            title = (news_context.get("title") or "").strip()
-            body_text = (news_context.get("body") or "").strip()
-            if title or body_text:
-                ctx_lines = ["[지금 보고 있는 뉴스]"]
-                if title:
-                    ctx_lines.append(f"제목: {title}")
-                if body_text:
-                    ctx_lines.append(f"내용: {body_text}")
-
-                why_matters = (news_context.get("why_matters") or "").strip()
-                if why_matters:
-                    ctx_lines.append(f"왜 중요한가: {why_matters}")
-
-                glossary = news_context.get("glossary")
-                if isinstance(glossary, list) and glossary:
-                    terms = []
-                    for item in glossary:
-                        if not isinstance(item, dict):
-                            continue
-                        term = (item.get("term") or "").strip()
-                        definition = (item.get("definition") or "").strip()
-                        if term and definition:
-                            terms.append(f"{term} - {definition}")
-                    if terms:
-                        ctx_lines.append(f"용어: {' / '.join(terms)}")
-
-                ctx_lines.append("\n이 뉴스에 대해 사용자랑 자연스럽게 대화 시작해.")
-                context_msg = "\n".join(ctx_lines)
-                contents.append(types.Content(role="user", parts=[types.Part(text=context_msg)]))
-                contents.append(types.Content(role="model", parts=[types.Part(text="응, 이 뉴스 같이 봤지! 궁금한 거 있으면 편하게 물어봐.")]))
-
-        # 이전 대화 히스토리
-        for turn in history:
-            if not isinstance(turn, dict):
-                continue
-            role = turn.get("role")
-            content = (turn.get("content") or "").strip()
-            if not content:
-                continue
-            if role == "user":
-                contents.append(types.Content(role="user", parts=[types.Part(text=content)]))
-            elif role == "assistant" or role == "model":
-                contents.append(types.Content(role="model", parts=[types.Part(text=content)]))
-
-        # 최신 유저 메시지
-        contents.append(types.Content(role="user", parts=[types.Part(text=message)]))
+        def finish(reply: str) -> dict:
+            payload = {"reply": reply}
+            if cached_reply is not None:
+                payload["cached"] = True
+            elif first_turn and reply != FALLBACK_REPLY:
+                store_reply(CHAT_SYSTEM_INSTRUCTION, preamble, message, reply, news_id=news_id)
+            if use_session:
+                sid = _save_session(session_id, user_id, preamble, history, message, reply)
+                if sid:
+                    payload["session_id"] = sid
+            if used is not None:
+                payload["remaining"] = max(0, DAILY_LIMIT - used)
+            return payload
+
+        # 스트리밍은 옵트인 (body.stream=true 또는 Accept: text/event-stream).
+        # 구버전 앱은 기존 {"reply", "remaining"} 단일 JSON 그대로.
+        if self._wants_stream(body):
+            if cached_reply is not None:
+                self._stream_reply(iter([cached_reply]), finish)
+            else:
+                self._stream_reply(_stream_chunks(preamble, history, message, cache_name), finish)
+            return
+
+        if cached_reply is not None:
+            self._json_response(200, finish(cached_reply))
+            return
 
         try:
-            client = genai.Client(api_key=GEMINI_API_KEY)
-            response = client.models.generate_content(
-                model=GEMINI_MODEL,
-                contents=contents,
-                config=types.GenerateContentConfig(
-                    system_instruction=SYSTEM_INSTRUCTION,
-                    temperature=0.8,
-                    max_output_tokens=400,
-                    thinking_config=types.ThinkingConfig(thinking_budget=0),
-                ),
-            )
-            raw_reply = (response.text or "").strip()
-            if not raw_reply and response.candidates:
-                parts = response.candidates[0].content.parts if response.candidates[0].content else []
-                text_parts = [p.text for p in parts if hasattr(p, "text") and p.text]
-                raw_reply = "\n".join(text_parts).strip()
-            reply = raw_reply
+            reply = _generate_reply(preamble, history, message, cache_name)
             if not reply:
-                reply = "잠깐, 다시 한번 말해줄래?"
+                reply = FALLBACK_REPLY
         except Exception as e:
             self._json_response(500, {"detail": f"AI 응답 실패: {str(e)[:120]}"})
             return
 
-        payload = {"reply": reply}
-        if used is not None:
-            payload["remaining"] = max(0, DAILY_LIMIT - used)
-        self._json_response(200, payload)
+        self._json_response(200, finish(reply))
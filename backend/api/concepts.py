@@ -2,23 +2,28 @@
 
 POST /api/concepts   body { action, uid, ... }
   - action="exposure": { uid, concept_ids: [int, ...] }  카드 노출 시 패시브 기록
+                       → { recorded, results: {concept_id: exposure_count} }
   - action="review":   { uid, concept_id: int, correct: bool }  퀴즈/복습 결과
+  - action="reviews":  { uid, reviews: [{concept_id, correct}, ...] }  퀴즈 세션 일괄
+                       (순서대로 적용, 진척은 마지막에 한 번만 계산)
 GET  /api/concepts?uid=<uid>   → 진척 시각화용 집계 (완독보너스 자리)
 """
 
 import json
 import os
 import sys
-import time
-from collections import defaultdict
 from http.server import BaseHTTPRequestHandler
 from urllib.parse import parse_qs, urlparse
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from lib.migrations import check_schema
+from lib.ratelimit import RateLimiter, client_ip
 from lib.concepts_db import (
-    init_concepts_db,
-    record_exposure,
+    EXPOSURE_COALESCE_SEC,
+    exposure_buffer,
+    record_exposures,
     record_review,
+    record_reviews,
     get_user_progress,
 )
 
@@ -26,9 +31,20 @@ ALLOWED_ORIGINS = os.environ.get("ALLOWED_ORIGINS", "").split(",")
 
 RATE_LIMIT = 60
 RATE_WINDOW = 60
-_request_counts = defaultdict(list)
+_limiter = RateLimiter("concepts", RATE_LIMIT, RATE_WINDOW)
 
 MAX_EXPOSURE_IDS = 50  # 1회 요청당 노출 기록 상한
+MAX_REVIEW_ITEMS = 50  # 1회 요청당 복습 결과 상한
+CONCEPT_ID_MAX = 2 ** 31  # concepts.id는 SERIAL(int4) — 범위 밖 id는 캐스트 오류로 배치 전체 실패
+
+
+def _concept_id(value):
+    """요청의 concept id를 int로. 숫자가 아니거나 int4 양수 범위 밖이면 None."""
+    try:
+        cid = int(value)
+    except (TypeError, ValueError):
+        return None
+    return cid if 0 < cid < CONCEPT_ID_MAX else None
 
 
 def _get_cors_origin(request_origin: str) -> str:
@@ -58,23 +74,13 @@ class handler(BaseHTTPRequestHandler):
         self.wfile.write(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
 
     def _check_rate_limit(self) -> bool:
-        client_ip = self.headers.get("X-Forwarded-For", self.client_address[0])
-        now = time.time()
-        _request_counts[client_ip] = [
-            t for t in _request_counts[client_ip] if now - t < RATE_WINDOW
-        ]
-        if len(_request_counts[client_ip]) >= RATE_LIMIT:
-            return True
-        _request_counts[client_ip].append(now)
-        return False
+        return not _limiter.allow(client_ip(self.headers, self.client_address))
 
     def _uid(self, body: dict) -> str:
         uid = (body.get("uid") or "").strip()
         if uid:
             return uid
-        forwarded = self.headers.get("X-Forwarded-For", "")
-        client_ip = forwarded.split(",")[0].strip() if forwarded else self.client_address[0]
-        return f"ip:{client_ip}"
+        return f"ip:{client_ip(self.headers, self.client_address)}"
 
     def do_OPTIONS(self):
         self.send_response(200)
@@ -86,7 +92,7 @@ class handler(BaseHTTPRequestHandler):
     def do_GET(self):
         if self._check_rate_limit():
             self._json_response(429, {"detail": "Too many requests."},
-                                extra_headers={"Retry-After": str(RATE_WINDOW)})
+                                extra_headers={"Retry-After": str(_limiter.retry_after())})
             return
         params = parse_qs(urlparse(self.path).query)
         uid = (params.get("uid", [""])[0]).strip()
@@ -94,7 +100,7 @@ class handler(BaseHTTPRequestHandler):
             self._json_response(400, {"detail": "uid is required"})
             return
         try:
-            init_concepts_db()
+            check_schema()
             self._json_response(200, get_user_progress(uid))
         except Exception as e:
             self._json_response(500, {"detail": f"progress 조회 실패: {str(e)[:120]}"})
@@ -102,7 +108,7 @@ class handler(BaseHTTPRequestHandler):
     def do_POST(self):
         if self._check_rate_limit():
             self._json_response(429, {"detail": "Too many requests."},
-                                extra_headers={"Retry-After": str(RATE_WINDOW)})
+                                extra_headers={"Retry-After": str(_limiter.retry_after())})
             return
         try:
             length = int(self.headers.get("Content-Length", "0"))
@@ -115,36 +121,33 @@ class handler(BaseHTTPRequestHandler):
         action = (body.get("action") or "").strip()
         uid = self._uid(body)
 
-        try:
-            init_concepts_db()
-        except Exception as e:
-            self._json_response(500, {"detail": f"DB init 실패: {str(e)[:120]}"})
-            return
+        check_schema()
 
         if action == "exposure":
             ids = body.get("concept_ids") or []
             if not isinstance(ids, list):
                 self._json_response(400, {"detail": "concept_ids must be a list"})
                 return
-            clean = []
-            for x in ids[:MAX_EXPOSURE_IDS]:
-                try:
-                    clean.append(int(x))
-                except (TypeError, ValueError):
-                    continue
-            recorded = 0
-            for cid in clean:
-                try:
-                    record_exposure(uid, cid)
-                    recorded += 1
-                except Exception:
-                    continue
-            self._json_response(200, {"recorded": recorded})
+            clean = [cid for cid in map(_concept_id, ids[:MAX_EXPOSURE_IDS]) if cid is not None]
+            try:
+                if EXPOSURE_COALESCE_SEC > 0:
+                    # 합치기 모드: 버퍼에 적재, 창이 지나면 일괄 flush
+                    recorded = exposure_buffer.add(uid, clean)
+                    self._json_response(200, {"recorded": recorded, "buffered": True})
+                    return
+                results = record_exposures(uid, clean)
+            except Exception as e:
+                self._json_response(500, {"detail": f"exposure 기록 실패: {str(e)[:120]}"})
+                return
+            # id별 결과 — 미존재 concept id는 null
+            self._json_response(200, {
+                "recorded": len(results),
+                "results": {str(cid): results.get(cid) for cid in dict.fromkeys(clean)},
+            })
 
         elif action == "review":
-            try:
-                concept_id = int(body.get("concept_id"))
-            except (TypeError, ValueError):
+            concept_id = _concept_id(body.get("concept_id"))
+            if concept_id is None:
                 self._json_response(400, {"detail": "concept_id (int) is required"})
                 return
             correct = bool(body.get("correct"))
@@ -156,5 +159,31 @@ class handler(BaseHTTPRequestHandler):
             # 갱신된 진척 함께 반환 → 앱이 즉시 viz 업데이트
             self._json_response(200, {"ok": True, "progress": get_user_progress(uid)})
 
+        elif action == "reviews":
+            items = body.get("reviews") or []
+            if not isinstance(items, list):
+                self._json_response(400, {"detail": "reviews must be a list"})
+                return
+            reviews = []
+            for it in items[:MAX_REVIEW_ITEMS]:
+                if not isinstance(it, dict):
+                    continue
+                concept_id = _concept_id(it.get("concept_id"))
+                if concept_id is not None:
+                    reviews.append((concept_id, bool(it.get("correct"))))
+            try:
+                rows = record_reviews(uid, reviews)
+            except Exception as e:
+                self._json_response(500, {"detail": f"review 기록 실패: {str(e)[:120]}"})
+                return
+            self._json_response(200, {
+                "ok": True,
+                "results": [
+                    {"concept_id": cid, "srs_stage": stage, "mastered": mastered}
+                    for cid, stage, mastered in rows
+                ],
+                "progress": get_user_progress(uid),
+            })
+
         else:
-            self._json_response(400, {"detail": "action must be 'exposure' or 'review'"})
+            self._json_response(400, {"detail": "action must be 'exposure', 'review' or 'reviews'"})
@@ -6,11 +6,25 @@ from urllib.parse import urlparse, parse_qs
 
 # Add parent directory to path for lib imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
-from lib.db import init_db
+from lib.migrations import migrate
 from lib.gemini import fetch_and_store
+from lib.scheduler import run_jobs
+from lib.chat_sessions import prune_chat_sessions
+from lib.chat_context import expire_context_caches
+from lib.chat_response_cache import expire_response_cache
+from lib.chat_quota import rollup_chat_usage
+from lib.ratelimit import prune_rate_limits
+from lib.admin_stats import snapshot_stats
+from lib.tracing import prune_pipeline_runs
 
 CRON_SECRET = os.environ.get("CRON_SECRET", "")
 VALID_CATEGORIES = ("general", "tech", "economy", "entertainment", "sports", "politics", "health", "science")
+VALID_REGIONS = ("us", "kr", "world")
+
+# (region, category) job 병렬 실행 설정 — Gemini 분당 예산은 lib/gemini.py GEMINI_RPM
+CRON_CONCURRENCY = int(os.environ.get("CRON_CONCURRENCY", "4"))
+CRON_JOB_TIMEOUT = float(os.environ.get("CRON_JOB_TIMEOUT", "240"))
+CRON_DEADLINE = float(os.environ.get("CRON_DEADLINE", "270"))
 
 
 class handler(BaseHTTPRequestHandler):
@@ -21,59 +35,94 @@ class handler(BaseHTTPRequestHandler):
     def do_POST(self):
         self._handle()
 
+    def _json(self, status_code: int, payload: dict):
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
     def _handle(self):
         # 인증 검증: Vercel Cron은 Authorization 헤더에 Bearer <CRON_SECRET>을 보냄
         auth_header = self.headers.get("Authorization", "")
         expected = f"Bearer {CRON_SECRET}"
 
         if not CRON_SECRET or auth_header != expected:
-            self.send_response(401)
-            self.send_header("Content-Type", "application/json")
-            self.end_headers()
-            self.wfile.write(json.dumps(
-                {"detail": "Unauthorized"},
-                ensure_ascii=False,
-            ).encode("utf-8"))
+            self._json(401, {"detail": "Unauthorized"})
             return
 
-        init_db()
+        # DDL은 읽기 경로가 아닌 cron에서 적용. 실패하면 job 없이 같은 JSON 형태로 보고
+        try:
+            applied = migrate()
+        except Exception as e:
+            print(f"  마이그레이션 실패: {e}")
+            self._json(500, {"status": "error", "message": f"마이그레이션 실패: {str(e)[:200]}",
+                             "jobs": []})
+            return
+        if applied is None:
+            # 겹친 cron 실행이 마이그레이션 중 — 그쪽이 뉴스 갱신도 하므로 이번 회차는 생략
+            self._json(503, {"status": "busy", "message": "다른 인스턴스가 마이그레이션 중",
+                             "jobs": []})
+            return
 
         parsed = urlparse(self.path)
         params = parse_qs(parsed.query)
         region = params.get("region", [None])[0]
         category = params.get("category", [None])[0]
 
-        try:
-            if region and region not in ("us", "kr", "world"):
-                raise ValueError("Invalid region")
-            if category and category not in VALID_CATEGORIES:
-                raise ValueError("Invalid category")
-
-            if region and category:
-                # 단일 리전 + 단일 카테고리
-                fetch_and_store(region, category)
-            elif region:
-                # 단일 리전, 모든 카테고리
-                for cat in VALID_CATEGORIES:
-                    fetch_and_store(region, cat)
-            else:
-                # 전체 갱신
-                for r in ["us", "kr", "world"]:
-                    for cat in VALID_CATEGORIES:
-                        fetch_and_store(r, cat)
-
-            self.send_response(200)
-            self.send_header("Content-Type", "application/json")
-            self.end_headers()
-            self.wfile.write(json.dumps(
-                {"status": "ok", "message": f"뉴스 갱신 완료: {region or 'all'}/{category or 'all'}"},
-                ensure_ascii=False,
-            ).encode("utf-8"))
-        except Exception as e:
-            self.send_response(500)
-            self.send_header("Content-Type", "application/json")
-            self.end_headers()
-            self.wfile.write(json.dumps(
-                {"detail": f"뉴스 갱신 실패: {str(e)}"},
-                ensure_ascii=False,
-            ).encode("utf-8"))
+        if region and region not in VALID_REGIONS:
+            self._json(400, {"detail": "Invalid region"})
+            return
+        if category and category not in VALID_CATEGORIES:
+            self._json(400, {"detail": "Invalid category"})
+            return
+
+        regions = [region] if region else list(VALID_REGIONS)
+        categories = [category] if category else list(VALID_CATEGORIES)
+        jobs = [(r, cat) for r in regions for cat in categories]
+
+        results = run_jobs(
+            fetch_and_store, jobs,
+            max_workers=CRON_CONCURRENCY,
+            job_timeout=CRON_JOB_TIMEOUT,
+            deadline_sec=CRON_DEADLINE,
+        )
+        job_status = []
+        for res in results:
+            r, cat = res["args"]
+            entry = {"region": r, "category": cat, "status": res["status"],
+                     "elapsed_ms": res["elapsed_ms"]}
+            if res["status"] == "ok" and res.get("result") is None:
+                entry["status"] = "skipped"  # 전부 중복 — 저장할 뉴스 없음
+            if res.get("error"):
+                entry["error"] = res["error"]
+            job_status.append(entry)
+
+        # 새 브리핑이 저장된 (region, category)만 이전 기사용 채팅 캐시(컨텍스트·첫 턴 응답) 정리
+        replaced = [(*res["args"], res["result"]) for res in results
+                    if res["status"] == "ok" and res.get("result") is not None]
+        if replaced:
+            try:
+                expire_context_caches(replaced)
+                expire_response_cache(replaced)
+            except Exception as e:
+                print(f"  채팅 캐시 정리 실패: {e}")
+
+        # 만료 채팅 세션·오래된 사용량·rate limit 카운터·계측 기록 정리 + 통계 스냅샷
+        # — 실패해도 뉴스 갱신 결과엔 영향 없음
+        for housekeeping in (prune_chat_sessions, rollup_chat_usage, prune_rate_limits,
+                             prune_pipeline_runs, snapshot_stats):
+            try:
+                housekeeping()
+            except Exception as e:
+                print(f"  정리 작업 실패 ({housekeeping.__name__}): {e}")
+
+        failed = [j for j in job_status if j["status"] not in ("ok", "skipped")]
+        target = f"{region or 'all'}/{category or 'all'}"
+        if not failed:
+            status, code, message = "ok", 200, f"뉴스 갱신 완료: {target}"
+        elif len(failed) < len(job_status):
+            # 일부 카테고리 실패는 전체 실패로 취급하지 않음
+            status, code, message = "partial", 200, f"뉴스 일부 갱신: {target} ({len(failed)}건 실패)"
+        else:
+            status, code, message = "error", 500, f"뉴스 갱신 실패: {target}"
+        self._json(code, {"status": status, "message": message, "jobs": job_status})
@@ -1,14 +1,14 @@
 ﻿import json
 import os
 import sys
-import time
-from collections import defaultdict
 from http.server import BaseHTTPRequestHandler
 from urllib.parse import parse_qs, urlparse
 
 # Add parent directory to path for lib imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
-from lib.db import get_latest_news, init_db
+from lib.briefing import CACHE_CONTROL, etag_matches, get_briefing
+from lib.migrations import check_schema
+from lib.ratelimit import RateLimiter, client_ip
 
 ALLOWED_ORIGINS = os.environ.get("ALLOWED_ORIGINS", "").split(",")
 VALID_CATEGORIES = ("general", "tech", "economy", "entertainment", "sports", "politics", "health", "science")
@@ -16,18 +16,7 @@ VALID_CATEGORIES = ("general", "tech", "economy", "entertainment", "sports", "po
 # In-memory rate limiting: max 30 req / 60s per IP
 RATE_LIMIT = 30
 RATE_WINDOW = 60
-_request_counts = defaultdict(list)
-
-
-def _safe_json(value, fallback=None):
-    if fallback is None:
-        fallback = []
-    if not value:
-        return fallback
-    try:
-        return json.loads(value)
-    except (json.JSONDecodeError, TypeError):
-        return fallback
+_limiter = RateLimiter("news", RATE_LIMIT, RATE_WINDOW)
 
 
 def _get_cors_origin(request_origin: str) -> str:
@@ -40,56 +29,6 @@ def _get_cors_origin(request_origin: str) -> str:
     return ""
 
 
-def _try_json_loads(value):
-    try:
-        return json.loads(value)
-    except Exception:
-        return None
-
-
-def _parse_summary_value(summary_value):
-    """
-    Normalize summary payload from DB into a dict with at least:
-    {"items": [...], "insight": "..."}
-    """
-    if isinstance(summary_value, dict):
-        return summary_value
-
-    if not isinstance(summary_value, str):
-        return {"items": [], "insight": str(summary_value or "")}
-
-    # 1) direct JSON object string
-    direct = _try_json_loads(summary_value)
-    if isinstance(direct, dict):
-        return direct
-
-    # 2) double-encoded JSON string
-    if isinstance(direct, str):
-        nested = _try_json_loads(direct)
-        if isinstance(nested, dict):
-            return nested
-
-    text = summary_value.strip()
-
-    # 3) markdown fenced JSON
-    if text.startswith("```"):
-        text = text.replace("```json", "", 1).replace("```", "").strip()
-        fenced = _try_json_loads(text)
-        if isinstance(fenced, dict):
-            return fenced
-
-    # 4) extract first JSON object fragment
-    start = text.find("{")
-    end = text.rfind("}")
-    if start >= 0 and end > start:
-        fragment = _try_json_loads(text[start : end + 1])
-        if isinstance(fragment, dict):
-            return fragment
-
-    # 5) plain text fallback
-    return {"items": [], "insight": text}
-
-
 class handler(BaseHTTPRequestHandler):
     def _send_cors_headers(self):
         origin = self.headers.get("Origin", "")
@@ -109,26 +48,18 @@ class handler(BaseHTTPRequestHandler):
         self.wfile.write(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
 
     def _check_rate_limit(self) -> bool:
-        client_ip = self.headers.get("X-Forwarded-For", self.client_address[0])
-        now = time.time()
-        _request_counts[client_ip] = [
-            t for t in _request_counts[client_ip] if now - t < RATE_WINDOW
-        ]
-        if len(_request_counts[client_ip]) >= RATE_LIMIT:
-            return True
-        _request_counts[client_ip].append(now)
-        return False
+        return not _limiter.allow(client_ip(self.headers, self.client_address))
 
     def do_GET(self):
         if self._check_rate_limit():
             self._json_response(
                 429,
                 {"detail": "Too many requests. Please retry shortly."},
-                extra_headers={"Retry-After": str(RATE_WINDOW)},
+                extra_headers={"Retry-After": str(_limiter.retry_after())},
             )
             return
 
-        init_db()
+        check_schema()
 
         parsed = urlparse(self.path)
         params = parse_qs(parsed.query)
@@ -146,39 +77,34 @@ class handler(BaseHTTPRequestHandler):
             )
             return
 
-        row = get_latest_news(region, category)
-        if not row:
+        briefing = get_briefing(region, category)
+        if not briefing:
             self._json_response(404, {"detail": "No briefing found yet."})
             return
+        etag, body = briefing
 
-        parsed_summary = _parse_summary_value(row["summary"])
-
-        # Keep compatibility with existing app/client contracts.
-        payload = {
-            "summary": json.dumps(parsed_summary, ensure_ascii=False),
-            "sources": _safe_json(row["sources"]),
-            "updated_at": row["created_at"],
-        }
-
-        # Also expose normalized fields directly for newer clients.
-        payload["items"] = parsed_summary.get("items", [])
-        payload["insight"] = parsed_summary.get("insight", "")
-        payload["dialogue"] = _safe_json(row.get("dialogue"), fallback=[])
-
-        # 학습 개념(있으면) — 앱이 카드 노출/퀴즈 시 concept_id 기록용.
-        # 개념 레이어 미구축/장애여도 뉴스 응답엔 영향 없게 fail-soft.
-        try:
-            from lib.concepts_db import get_concepts_for_news
-            payload["concepts"] = get_concepts_for_news(row["id"])
-        except Exception:
-            payload["concepts"] = []
+        cache_headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+        if etag_matches(self.headers.get("If-None-Match"), etag):
+            self.send_response(304)
+            self._send_cors_headers()
+            for key, value in cache_headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            return
 
-        self._json_response(200, payload)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self._send_cors_headers()
+        for key, value in cache_headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
 
     def do_OPTIONS(self):
         self.send_response(200)
         self._send_cors_headers()
         self.send_header("Access-Control-Allow-Methods", "GET, OPTIONS")
-        self.send_header("Access-Control-Allow-Headers", "Content-Type")
+        self.send_header("Access-Control-Allow-Headers", "Content-Type, If-None-Match")
         self.end_headers()
 
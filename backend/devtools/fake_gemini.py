@@ -0,0 +1,279 @@
+"""로컬 가짜 Gemini 서버 — 네트워크/API 키 없이 lib.gemini_client 동작·지연 측정용.
+
+    python devtools/fake_gemini.py serve --port 8765 --latency-ms 50 --fail-rate 0.1
+    GEMINI_BASE_URL=http://127.0.0.1:8765 GEMINI_API_KEY=fake python ...
+
+    python devtools/fake_gemini.py bench -n 50
+      → 같은 프로세스에 서버를 띄우고 "호출마다 새 Client" vs "공용 Client" 지연 비교.
+
+--fail-rate 비율만큼 503을 돌려주므로 재시도 경로도 확인 가능.
+:streamGenerateContent(?alt=sse)는 STREAM_CHUNKS를 --chunk-ms 간격으로 흘려보냄
+(첫 토큰까지 시간 vs 전체 시간 측정용).
+cachedContents(create/get/delete)는 메모리에 보관 — 추정 토큰이 --min-cache-tokens
+미만이면 실제 API처럼 400. 모르는 cachedContent로 생성 요청하면 404.
+:countTokens는 같은 추정치(요청 바이트 / 4)를 돌려줌.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+STREAM_CHUNKS = ["fake ", "streamed ", "response ", "in ", "chunks"]
+USAGE = {"promptTokenCount": 10, "candidatesTokenCount": 2, "totalTokenCount": 12}
+
+
+def _candidate(text: str, finished: bool = True) -> dict:
+    c = {"content": {"role": "model", "parts": [{"text": text}]}}
+    if finished:
+        c["finishReason"] = "STOP"
+    return c
+
+
+def _error(code: int, message: str, status: str) -> dict:
+    return {"error": {"code": code, "message": message, "status": status}}
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive — 실제 엔드포인트와 같게
+    latency_sec = 0.0
+    chunk_sec = 0.05
+    fail_rate = 0.0
+    min_cache_tokens = 1024
+    caches = {}  # name → cachedContent 응답 dict
+    caches_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _cache_name(self) -> str | None:
+        path = self.path.split("?")[0]
+        marker = "/cachedContents/"
+        if marker not in path:
+            return None
+        return "cachedContents/" + path.split(marker, 1)[1]
+
+    def do_GET(self):
+        name = self._cache_name()
+        with self.caches_lock:
+            cache = self.caches.get(name)
+        if cache is None:
+            self._send(404, _error(404, "cached content not found", "NOT_FOUND"))
+            return
+        self._send(200, cache)
+
+    def do_DELETE(self):
+        name = self._cache_name()
+        with self.caches_lock:
+            cache = self.caches.pop(name, None)
+        if cache is None:
+            self._send(404, _error(404, "cached content not found", "NOT_FOUND"))
+            return
+        self._send(200, {})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length)
+        try:
+            body = json.loads(raw) if raw else {}
+        except ValueError:
+            body = {}
+        if self.latency_sec:
+            time.sleep(self.latency_sec)
+
+        path = self.path.split("?")[0]
+        if path.endswith("/cachedContents"):
+            self._create_cache(body, len(raw))
+            return
+        if path.endswith(":countTokens"):
+            self._send(200, {"totalTokens": len(raw) // 4})
+            return
+        if not path.endswith((":generateContent", ":streamGenerateContent")):
+            self._send(404, _error(404, "not found", "NOT_FOUND"))
+            return
+        if random.random() < self.fail_rate:
+            self._send(503, _error(503, "overloaded", "UNAVAILABLE"))
+            return
+
+        usage = dict(USAGE)
+        cached_content = body.get("cachedContent")
+        if cached_content:
+            with self.caches_lock:
+                cache = self.caches.get(cached_content)
+            if cache is None:
+                self._send(404, _error(404, "cached content not found", "NOT_FOUND"))
+                return
+            usage["cachedContentTokenCount"] = cache["usageMetadata"]["totalTokenCount"]
+
+        if path.endswith(":streamGenerateContent"):
+            self._stream(usage)
+            return
+        self._send(200, {"candidates": [_candidate("fake response")], "usageMetadata": usage})
+
+    def _create_cache(self, body: dict, size: int):
+        tokens = size // 4  # 대략적인 토큰 추정
+        if tokens < self.min_cache_tokens:
+            self._send(400, _error(
+                400, f"Cached content is too small. total_token_count={tokens}, "
+                     f"min_total_token_count={self.min_cache_tokens}", "INVALID_ARGUMENT",
+            ))
+            return
+        now = datetime.now(timezone.utc)
+        ttl = float(str(body.get("ttl", "3600s")).rstrip("s"))
+        cache = {
+            "name": f"cachedContents/{uuid.uuid4().hex[:16]}",
+            "model": body.get("model", ""),
+            "createTime": now.isoformat().replace("+00:00", "Z"),
+            "updateTime": now.isoformat().replace("+00:00", "Z"),
+            "expireTime": (now + timedelta(seconds=ttl)).isoformat().replace("+00:00", "Z"),
+            "usageMetadata": {"totalTokenCount": tokens},
+        }
+        with self.caches_lock:
+            self.caches[cache["name"]] = cache
+        self._send(200, cache)
+
+    def _stream(self, usage: dict):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, text in enumerate(STREAM_CHUNKS):
+            last = i == len(STREAM_CHUNKS) - 1
+            chunk = {"candidates": [_candidate(text, finished=last)]}
+            if last:
+                chunk["usageMetadata"] = usage
+            data = f"data: {json.dumps(chunk)}\r\n\r\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+            if not last:
+                time.sleep(self.chunk_sec)
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def start_server(port: int = 0, latency_ms: float = 0, fail_rate: float = 0.0,
+                 chunk_ms: float = 50, min_cache_tokens: int = 1024):
+    """백그라운드 스레드로 서버 기동. (server, base_url) 반환."""
+    FakeGeminiHandler.latency_sec = latency_ms / 1000
+    FakeGeminiHandler.chunk_sec = chunk_ms / 1000
+    FakeGeminiHandler.fail_rate = fail_rate
+    FakeGeminiHandler.min_cache_tokens = min_cache_tokens
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeGeminiHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def _summary(label: str, samples: list):
+    ms = sorted(s * 1000 for s in samples)
+    p95 = ms[max(0, int(len(ms) * 0.95) - 1)]
+    print(f"{label:<14} n={len(ms)}  mean={statistics.mean(ms):.2f}ms  "
+          f"p50={statistics.median(ms):.2f}ms  p95={p95:.2f}ms")
+
+
+def bench(n: int, latency_ms: float):
+    server, base_url = start_server(latency_ms=latency_ms)
+    os.environ["GEMINI_BASE_URL"] = base_url
+    os.environ.setdefault("GEMINI_API_KEY", "fake")
+    os.environ["GEMINI_RPM"] = "0"
+
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+    from google import genai
+    from google.genai import types
+    from lib import gemini_client
+
+    fresh, shared, ttft, stream_total = [], [], [], []
+    for _ in range(n):
+        t = time.perf_counter()
+        client = genai.Client(
+            api_key=gemini_client.GEMINI_API_KEY,
+            http_options=types.HttpOptions(base_url=base_url),
+        )
+        client.models.generate_content(model=gemini_client.GEMINI_MODEL, contents="ping")
+        fresh.append(time.perf_counter() - t)
+
+    gemini_client.generate("warmup")
+    for _ in range(n):
+        t = time.perf_counter()
+        gemini_client.response_text(gemini_client.generate("ping"))
+        shared.append(time.perf_counter() - t)
+
+    for _ in range(n):
+        t = time.perf_counter()
+        first = None
+        for _text in gemini_client.stream("ping"):
+            if first is None:
+                first = time.perf_counter() - t
+        ttft.append(first)
+        stream_total.append(time.perf_counter() - t)
+
+    # 컨텍스트 캐시: 생성 → cached_content로 호출 → 삭제 후 404(폴백 경로) 확인
+    cache = gemini_client.get_client().caches.create(
+        model=gemini_client.GEMINI_MODEL,
+        config=types.CreateCachedContentConfig(
+            system_instruction="system " * 2000, ttl="600s",
+        ),
+    )
+    cached = gemini_client.generate(
+        "ping", config=types.GenerateContentConfig(cached_content=cache.name),
+    )
+    gemini_client.get_client().caches.delete(name=cache.name)
+    try:
+        gemini_client.generate(
+            "ping", config=types.GenerateContentConfig(cached_content=cache.name), retries=0,
+        )
+        cache_miss = "unexpected success"
+    except Exception as e:
+        cache_miss = f"{type(e).__name__} {getattr(e, 'code', '')}"
+
+    server.shutdown()
+    print(f"cache {cache.name}: cached tokens="
+          f"{cached.usage_metadata.cached_content_token_count}, after delete → {cache_miss}")
+    _summary("fresh client", fresh)
+    _summary("shared client", shared)
+    _summary("stream TTFT", ttft)
+    _summary("stream total", stream_total)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_serve = sub.add_parser("serve")
+    p_serve.add_argument("--port", type=int, default=8765)
+    p_serve.add_argument("--latency-ms", type=float, default=0)
+    p_serve.add_argument("--fail-rate", type=float, default=0.0)
+    p_serve.add_argument("--chunk-ms", type=float, default=50)
+    p_serve.add_argument("--min-cache-tokens", type=int, default=1024)
+    p_bench = sub.add_parser("bench")
+    p_bench.add_argument("-n", type=int, default=50)
+    p_bench.add_argument("--latency-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    if args.cmd == "serve":
+        server, base_url = start_server(args.port, args.latency_ms, args.fail_rate,
+                                        args.chunk_ms, args.min_cache_tokens)
+        print(f"fake Gemini listening on {base_url}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+    else:
+        bench(args.n, args.latency_ms)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""관리자 대시보드 통계 — 화면당 쿼리 1번 + 짧은 TTL 캐시 + 추이용 스냅샷.
+
+- 전체 건수는 pg_class.reltuples 추정치 (ANALYZE 기준, 풀스캔 없음). 추정치가
+  EXACT_COUNT_BELOW 미만(작은 테이블·ANALYZE 전)일 때만 COUNT(*)로 정확히 셈.
+- "오늘" 건수는 인덱스 범위 조건 (users.created_at, news.created_kst_date).
+- 결과는 프로세스 메모리에 STATS_CACHE_TTL_SEC 동안 캐시 → 대시보드를 여러 번
+  열어도 DB 부하는 TTL당 1회.
+- 새로 계산할 때마다 같은 쿼리 안에서 admin_stats_snapshots의 그 시(hour) 버킷에
+  1행 기록 (이미 있으면 무시) — 추이 그래프용. STATS_SNAPSHOT_ENABLED로 끌 수 있음.
+  기록 시점은 cron 실행·대시보드 조회뿐이라 매시간 채워지지 않음 (빈 구간 있음).
+- 응답의 "approximate"는 추정치일 수 있는 필드 목록 (reltuples, 큐 기반 근사).
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from .db import connection
+from .concepts_db import EXTRACTION_MAX_ATTEMPTS
+
+
+STATS_CACHE_TTL_SEC = int(os.environ.get("STATS_CACHE_TTL_SEC", "60"))
+STATS_SNAPSHOT_ENABLED = os.environ.get("STATS_SNAPSHOT_ENABLED", "1") == "1"
+EXACT_COUNT_BELOW = 10000
+
+_cache = {}  # name → (expires_at, value)
+_cache_lock = threading.Lock()
+
+
+def _count_sql(table: str) -> str:
+    """table 행 수 스칼라 서브쿼리. 큰 테이블은 reltuples, 작으면 COUNT(*).
+    (CASE 안의 비상관 서브쿼리는 필요할 때만 실행됨)"""
+    return f"""(
+        SELECT CASE WHEN c.reltuples >= {EXACT_COUNT_BELOW} THEN c.reltuples::bigint
+                    ELSE (SELECT COUNT(*) FROM {table}) END
+        FROM (SELECT COALESCE(MAX(reltuples), -1) AS reltuples
+              FROM pg_class WHERE oid = to_regclass('{table}')) c
+    )"""
+
+
+_DASHBOARD_SQL = f"""
+    SELECT
+        {_count_sql("users")} AS total_users,
+        (SELECT COUNT(*) FROM users
+         WHERE created_at >= CURRENT_DATE AND created_at < CURRENT_DATE + 1) AS new_users_today,
+        {_count_sql("news")} AS total_news,
+        (SELECT COUNT(*) FROM news
+         WHERE created_kst_date = (now() AT TIME ZONE 'Asia/Seoul')::date) AS new_news_today,
+        {_count_sql("app_reviews")} AS total_reviews
+"""
+
+_CONCEPTS_SQL = f"""
+    SELECT
+        {_count_sql("concepts")} AS total_concepts,
+        {_count_sql("concept_occurrences")} AS total_occurrences,
+        {_count_sql("news")} AS total_news,
+        (SELECT COALESCE(json_object_agg(domain, n ORDER BY n DESC), '{{}}')
+         FROM (SELECT domain, COUNT(*) AS n FROM concepts GROUP BY domain) d) AS by_domain,
+        (SELECT COALESCE(json_object_agg(status, json_build_array(n, exhausted)), '{{}}')
+         FROM (SELECT status, COUNT(*) AS n,
+                      COUNT(*) FILTER (WHERE attempts >= %(max_attempts)s) AS exhausted
+               FROM concept_extraction_status GROUP BY status) s) AS queue
+"""
+
+
+def _snapshot_wrap(sql: str, kind: str) -> str:
+    """통계 SELECT를 스냅샷 INSERT와 한 문장으로 묶음 (왕복 추가 없음)."""
+    return f"""
+        WITH s AS ({sql}),
+        snap AS (
+            INSERT INTO admin_stats_snapshots (kind, taken_at, stats)
+            SELECT '{kind}', date_trunc('hour', now()), to_jsonb(s) FROM s
+            ON CONFLICT (kind, taken_at) DO NOTHING
+        )
+        SELECT * FROM s
+    """
+
+
+def _query_one(sql: str, kind: str, args: dict | None = None) -> dict:
+    if STATS_SNAPSHOT_ENABLED:
+        sql = _snapshot_wrap(sql, kind)
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(sql, args)
+        names = [d[0] for d in cur.description]
+        row = cur.fetchone()
+        cur.close()
+    return dict(zip(names, row))
+
+
+def _cached(name: str, compute, ttl_sec: int = STATS_CACHE_TTL_SEC) -> dict:
+    now = time.monotonic()
+    hit = _cache.get(name)
+    if hit and hit[0] > now:
+        return hit[1]
+    value = compute()
+    value["as_of"] = datetime.now(timezone.utc).isoformat()
+    with _cache_lock:
+        _cache[name] = (now + ttl_sec, value)
+    return value
+
+
+def _dashboard() -> dict:
+    row = _query_one(_DASHBOARD_SQL, "dashboard")
+    stats = {k: int(v) for k, v in row.items()}
+    stats["approximate"] = ["total_users", "total_news", "total_reviews"]
+    return stats
+
+
+def _concepts() -> dict:
+    row = _query_one(_CONCEPTS_SQL, "concepts", {"max_attempts": EXTRACTION_MAX_ATTEMPTS})
+    queue = {s: 0 for s in ("pending", "running", "done", "failed", "skipped")}
+    failed_final = 0
+    for status, (count, exhausted) in (row["queue"] or {}).items():
+        queue[status] = int(count)
+        if status == "failed":
+            failed_final = int(exhausted)
+    total = sum(queue.values())
+    queue["failed_final"] = failed_final
+    queue["total"] = total
+    total_news = int(row["total_news"])
+    # concept_occurrences가 있는 뉴스 ≈ 추출 큐 done (마이그레이션 14 시드 기준).
+    # 큐 밖에서 개념이 붙거나 지워진 뉴스는 반영되지 않는 근사치
+    tagged_news = queue["done"]
+    return {
+        "total_concepts": int(row["total_concepts"]),
+        "total_occurrences": int(row["total_occurrences"]),
+        "total_news": total_news,
+        "tagged_news": tagged_news,
+        "untagged_news": max(0, total_news - tagged_news),
+        "by_domain": {d: int(c) for d, c in (row["by_domain"] or {}).items()},
+        "extraction_queue": queue,
+        "approximate": ["total_concepts", "total_occurrences", "total_news",
+                        "tagged_news", "untagged_news"],
+    }
+
+
+def dashboard_stats(fresh: bool = False) -> dict:
+    """유저·뉴스·리뷰 전체/오늘 건수. total_*는 추정치일 수 있음."""
+    if fresh:
+        with _cache_lock:
+            _cache.pop("dashboard", None)
+    return _cached("dashboard", _dashboard)
+
+
+def concepts_stats(fresh: bool = False) -> dict:
+    """개념 코퍼스·추출 큐 현황 (백필 진척 확인용)."""
+    if fresh:
+        with _cache_lock:
+            _cache.pop("concepts", None)
+    return _cached("concepts", _concepts)
+
+
+def snapshot_stats():
+    """현재 시(hour) 버킷에 스냅샷 기록 (cron에서 호출). 캐시도 갱신됨."""
+    if STATS_SNAPSHOT_ENABLED:
+        dashboard_stats(fresh=True)
+        concepts_stats(fresh=True)
+
+
+def stats_history(kind: str = "dashboard", hours: int = 168) -> list:
+    """최근 hours시간의 스냅샷 [{"taken_at", ...stats}] (오래된 순). 시 버킷당 최대
+    1행이지만 기록된 시간만 있으므로 간격은 일정하지 않음."""
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT taken_at, stats FROM admin_stats_snapshots
+            WHERE kind = %s AND taken_at >= now() - make_interval(hours => %s)
+            ORDER BY taken_at
+            """,
+            (kind, hours),
+        )
+        rows = cur.fetchall()
+        cur.close()
+    return [{"taken_at": r[0].isoformat(), **(r[1] or {})} for r in rows]
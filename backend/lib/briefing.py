@@ -0,0 +1,155 @@
+"""/api/news 응답 캐시 — (region, category, news_id)별로 렌더 완료된 바이트를 보관.
+
+콘텐츠는 cron(fetch_and_store)이 돌 때만 바뀌므로, 개념 조인·
+json.dumps는 news row당 한 번만 한다.
+
+- L1: 프로세스 메모리 (MEMO_TTL_SEC). 히트 시 DB 접근 없음.
+- L2: briefing_cache 테이블. 최신 news id와 일치할 때만 유효 → 단일 조회.
+- 미스: news row에서 렌더 후 L2에 upsert.
+cron은 파이프라인 끝에 refresh_briefing()으로 다시 렌더해 덮어쓴다.
+후처리가 끝나지 않은 row(news.enriched_at NULL)는 렌더만 하고 캐시하지 않음 —
+dialogue·개념 없는 본문이 같은 news_id로 굳지 않게.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from .db import connection, get_latest_news
+
+
+MEMO_TTL_SEC = 60
+# CDN이 대부분의 읽기를 흡수하도록. 브리핑은 하루 2회만 바뀜.
+CACHE_CONTROL = "public, max-age=0, s-maxage=300, stale-while-revalidate=43200"
+
+_memo = {}  # (region, category) → (expires_at, etag, body)
+_memo_lock = threading.Lock()
+
+
+def _safe_json(value, fallback=None):
+    if fallback is None:
+        fallback = []
+    if not value:
+        return fallback
+    try:
+        return json.loads(value)
+    except (json.JSONDecodeError, TypeError):
+        return fallback
+
+
+def render_briefing(row: dict) -> tuple:
+    """news row(get_latest_news) → (etag, body bytes, cacheable). ETag은 본문 해시 기반
+    strong ETag. summary는 저장 시 정규화된 summary_json을 그대로 사용 (재파싱 없음).
+    개념 조회가 실패해 빈 concepts로 대체한 본문은 cacheable=False (이번 응답에만 사용)."""
+    # Keep compatibility with existing app/client contracts.
+    payload = {
+        "summary": row["summary"],
+        "sources": _safe_json(row["sources"]),
+        "updated_at": row["created_at"],
+    }
+
+    # Also expose normalized fields directly for newer clients.
+    payload["items"] = row["items"] or []
+    payload["insight"] = row["insight"]
+    payload["dialogue"] = _safe_json(row.get("dialogue"), fallback=[])
+
+    # 학습 개념(있으면) — 앱이 카드 노출/퀴즈 시 concept_id 기록용.
+    # 개념 레이어 미구축/장애여도 뉴스 응답엔 영향 없게 fail-soft.
+    cacheable = True
+    try:
+        from .concepts_db import get_concepts_for_news
+        payload["concepts"] = get_concepts_for_news(row["id"])
+    except Exception as e:
+        print(f"  브리핑 개념 조회 실패 (캐시하지 않음): {e}")
+        payload["concepts"] = []
+        cacheable = False
+
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    return f'"{row["id"]}-{digest}"', body, cacheable
+
+
+def _store(region: str, category: str, news_id: int, etag: str, body: bytes):
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            INSERT INTO briefing_cache (region, category, news_id, etag, body)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (region, category) DO UPDATE SET
+                news_id = EXCLUDED.news_id,
+                etag = EXCLUDED.etag,
+                body = EXCLUDED.body,
+                rendered_at = now()
+            """,
+            (region, category, news_id, etag, body),
+        )
+        cur.close()
+
+
+def _remember(region: str, category: str, etag: str, body: bytes):
+    with _memo_lock:
+        _memo[(region, category)] = (time.monotonic() + MEMO_TTL_SEC, etag, body)
+
+
+def get_briefing(region: str, category: str):
+    """최신 브리핑 (etag, body). 뉴스가 아직 없으면 None."""
+    hit = _memo.get((region, category))
+    if hit and hit[0] > time.monotonic():
+        return hit[1], hit[2]
+
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT b.etag, b.body FROM briefing_cache b
+            WHERE b.region = %s AND b.category = %s
+              AND b.news_id = (
+                  SELECT id FROM news WHERE region = %s AND category = %s
+                  ORDER BY created_ts DESC LIMIT 1
+              )
+            """,
+            (region, category, region, category),
+        )
+        row = cur.fetchone()
+        cur.close()
+    if row:
+        etag, body = row[0], bytes(row[1])
+        _remember(region, category, etag, body)
+        return etag, body
+
+    return refresh_briefing(region, category)
+
+
+def refresh_briefing(region: str, category: str):
+    """최신 news row를 다시 렌더해 캐시 교체. cron이 쓰기를 마친 뒤 호출."""
+    invalidate_briefing(region, category)
+    row = get_latest_news(region, category)
+    if not row:
+        return None
+    etag, body, cacheable = render_briefing(row)
+    if not cacheable or not row["enriched"]:
+        return etag, body
+    try:
+        _store(region, category, row["id"], etag, body)
+    except Exception as e:
+        # 캐시 저장 실패는 응답에 영향 없음 (다음 요청이 다시 렌더)
+        print(f"  briefing 캐시 저장 실패: {e}")
+    _remember(region, category, etag, body)
+    return etag, body
+
+
+def invalidate_briefing(region: str, category: str):
+    with _memo_lock:
+        _memo.pop((region, category), None)
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match 헤더(목록/와일드카드/W/ 접두사 포함)와 ETag 비교."""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
@@ -0,0 +1,229 @@
+"""채팅 프리앰블용 Gemini 컨텍스트 캐시 — 기사별 cachedContent를 유저 간 공유.
+
+같은 브리핑 기사로 대화하는 요청은 SYSTEM_INSTRUCTION + 뉴스 프리앰블이
+매번 동일하므로, 이를 client.caches로 한 번 만들어 두고 이름만 참조한다.
+
+- 키: (모델, 시스템 지시문, 프리앰블) 해시 — 내용이 바뀌면 자동으로 다른 캐시.
+  news_id/title은 관리용 메타데이터로 함께 저장.
+- L1: 프로세스 메모리 (MEMO_TTL_SEC, 미스는 MISS_MEMO_SEC) / L2: chat_context_cache 테이블.
+- 생성은 cron만 (ensure_cached_content) — 요청 경로(get_cached_content)는 조회만
+  하고 없으면 None → 호출 측은 캐시 없이 기존 방식으로 보냄.
+- 모델별 최소 토큰(CHAT_CACHE_MIN_TOKENS) 미달이면 생성 요청 자체를 보내지 않음
+  (UTF-8 바이트 수 ≥ 토큰 수이므로 바이트로 먼저 거르고, 넘으면 count_tokens로 확인).
+- cron이 새 브리핑을 저장하면 expire_context_caches()로 교체된 기사의 항목만 정리.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from google.genai import errors, types
+from .db import connection
+from .gemini_client import GEMINI_MODEL, get_client
+
+
+CHAT_CACHE_ENABLED = os.environ.get("CHAT_CACHE_ENABLED", "1") == "1"
+CHAT_CACHE_TTL_SEC = int(os.environ.get("CHAT_CACHE_TTL_SEC", str(12 * 3600)))
+# gemini-2.5-flash 명시적 캐시 최소 토큰 — 미달이면 caches.create가 400
+CHAT_CACHE_MIN_TOKENS = int(os.environ.get("CHAT_CACHE_MIN_TOKENS", "1024"))
+MEMO_TTL_SEC = 300
+MISS_MEMO_SEC = 60  # cron이 새로 만든 캐시를 이 안에 집어 듦
+# 매핑은 원격 캐시보다 조금 먼저 만료시켜 만료 직전 캐시를 참조하지 않게
+EXPIRY_MARGIN_SEC = 120
+# generate 시 이 코드면 원격 캐시가 사라진 것으로 보고 매핑을 버림
+# (400은 요청 자체 문제일 수 있으므로 캐시 미스로 보지 않음)
+CACHE_MISS_CODES = (403, 404)
+
+_memo = {}  # cache_key → (expires_at, cache_name | None)
+_memo_lock = threading.Lock()
+
+
+def _cache_key(system_instruction: str, preamble: str, ack: str) -> str:
+    h = hashlib.sha256()
+    for part in (GEMINI_MODEL, system_instruction, preamble, ack):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _remember(key: str, name: str | None, ttl_sec: float):
+    with _memo_lock:
+        _memo[key] = (time.monotonic() + min(ttl_sec, MEMO_TTL_SEC), name)
+
+
+def _lookup(key: str):
+    """(found, cache_name, 남은 초). found=False면 기록 없음·만료."""
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT cache_name, EXTRACT(EPOCH FROM expires_at - now())
+            FROM chat_context_cache
+            WHERE cache_key = %s AND expires_at > now()
+            """,
+            (key,),
+        )
+        row = cur.fetchone()
+        cur.close()
+    if not row:
+        return False, None, 0
+    return True, row[0], float(row[1])
+
+
+def _contents(preamble: str, ack: str) -> list:
+    return [
+        types.Content(role="user", parts=[types.Part(text=preamble)]),
+        types.Content(role="model", parts=[types.Part(text=ack)]),
+    ]
+
+
+def _large_enough(system_instruction: str, preamble: str, ack: str) -> bool:
+    """캐시 최소 토큰 이상인가. 토큰 하나는 1바이트 이상이므로 UTF-8 바이트 합이
+    최소치 미만이면 API 호출 없이 False."""
+    size = sum(len(t.encode("utf-8")) for t in (system_instruction, preamble, ack))
+    if size < CHAT_CACHE_MIN_TOKENS:
+        return False
+    # count_tokens는 system_instruction을 받지 않으므로 user 턴으로 함께 셈
+    result = get_client().models.count_tokens(
+        model=GEMINI_MODEL,
+        contents=[types.Content(role="user", parts=[types.Part(text=system_instruction)])]
+        + _contents(preamble, ack),
+    )
+    return (result.total_tokens or 0) >= CHAT_CACHE_MIN_TOKENS
+
+
+def _create(system_instruction: str, preamble: str, ack: str) -> str | None:
+    """새 cachedContent 이름. 400(최소 토큰 미달 등 재시도해도 같은 결과)이면 None,
+    그 외 오류(일시 장애)는 그대로 올림."""
+    try:
+        cache = get_client().caches.create(
+            model=GEMINI_MODEL,
+            config=types.CreateCachedContentConfig(
+                system_instruction=system_instruction,
+                contents=_contents(preamble, ack),
+                ttl=f"{CHAT_CACHE_TTL_SEC}s",
+            ),
+        )
+        return cache.name
+    except errors.APIError as e:
+        if e.code != 400:
+            raise
+        print(f"  컨텍스트 캐시 생성 거절: {str(e)[:120]}")
+        return None
+
+
+def _delete_remote(name: str):
+    try:
+        get_client().caches.delete(name=name)
+    except Exception as e:
+        print(f"  컨텍스트 캐시 삭제 실패: {str(e)[:120]}")
+
+
+def get_cached_content(system_instruction: str, preamble: str, ack: str) -> str | None:
+    """프리앰블을 담은 cachedContent 이름 (요청 경로 — 조회만). 아직 없거나
+    캐시를 쓸 수 없으면 None (fail-soft)."""
+    if not CHAT_CACHE_ENABLED:
+        return None
+    key = _cache_key(system_instruction, preamble, ack)
+    hit = _memo.get(key)
+    if hit and hit[0] > time.monotonic():
+        return hit[1]
+
+    try:
+        found, name, remaining = _lookup(key)
+    except Exception as e:
+        print(f"  컨텍스트 캐시 조회 실패: {e}")
+        return None
+    if found:
+        _remember(key, name, remaining)
+    else:
+        _remember(key, None, MISS_MEMO_SEC)
+    return name
+
+
+def ensure_cached_content(system_instruction: str, preamble: str, ack: str,
+                          news_id: int | None = None, title: str | None = None) -> str | None:
+    """cron에서 기사별 cachedContent를 미리 생성. 이미 있으면 그 이름, 최소 토큰
+    미달이면 기록 없이 None. 오류는 그대로 올림 (호출 측이 fail-soft)."""
+    if not CHAT_CACHE_ENABLED:
+        return None
+    key = _cache_key(system_instruction, preamble, ack)
+    found, name, _ = _lookup(key)
+    if found and name:
+        return name
+    if not _large_enough(system_instruction, preamble, ack):
+        return None
+    name = _create(system_instruction, preamble, ack)
+    if not name:
+        return None
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            INSERT INTO chat_context_cache (cache_key, news_id, title, cache_name, expires_at)
+            VALUES (%s, %s, %s, %s, now() + make_interval(secs => %s))
+            ON CONFLICT (cache_key) DO UPDATE SET
+                news_id = EXCLUDED.news_id,
+                title = EXCLUDED.title,
+                cache_name = EXCLUDED.cache_name,
+                expires_at = EXCLUDED.expires_at,
+                created_at = now()
+            WHERE chat_context_cache.expires_at <= now()
+               -- 이전 버전(요청 경로에서 생성)이 남긴 '거절됨' 행은 만료 전이라도 교체.
+               -- 지금은 NULL을 쓰지 않으므로 그 행들이 TTL로 사라지면 해당 없음
+               OR chat_context_cache.cache_name IS NULL
+            RETURNING cache_name
+            """,
+            (key, news_id, title, name, CHAT_CACHE_TTL_SEC - EXPIRY_MARGIN_SEC),
+        )
+        won = cur.fetchone() is not None
+        cur.close()
+    if won:
+        return name
+    # 다른 cron job이 먼저 만듦 — 우리 것은 지우고 그쪽을 사용
+    _delete_remote(name)
+    found, name, _ = _lookup(key)
+    return name if found else None
+
+
+def drop_cached_content(name: str):
+    """원격 캐시가 사라진 경우(만료·삭제) 매핑 제거 — 이후 요청은 캐시 없이 보냄."""
+    with _memo_lock:
+        for key in [k for k, v in _memo.items() if v[1] == name]:
+            del _memo[key]
+    try:
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM chat_context_cache WHERE cache_name = %s", (name,))
+            cur.close()
+    except Exception as e:
+        print(f"  컨텍스트 캐시 매핑 삭제 실패: {e}")
+
+
+def expire_context_caches(replaced: list) -> int:
+    """새 브리핑으로 교체된 기사의 매핑과 원격 캐시 삭제 (cron에서 호출).
+    replaced: [(region, category, 새 news_id)] — 같은 (region, category)의 다른
+    뉴스에 딸린 항목만 지우고, news_id 없는 항목은 TTL 만료에 맡김. 삭제 건수 반환."""
+    if not replaced:
+        return 0
+    regions, categories, news_ids = (list(col) for col in zip(*replaced))
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            DELETE FROM chat_context_cache c
+            USING news n, unnest(%s::text[], %s::text[], %s::int[]) AS r(region, category, news_id)
+            WHERE n.id = c.news_id
+              AND n.region = r.region AND n.category = r.category AND n.id <> r.news_id
+            RETURNING c.cache_name
+            """,
+            (regions, categories, news_ids),
+        )
+        names = [r[0] for r in cur.fetchall() if r[0]]
+        cur.close()
+    with _memo_lock:
+        for key in [k for k, v in _memo.items() if v[1] in names]:
+            del _memo[key]
+    for name in names:
+        _delete_remote(name)
+    return len(names)
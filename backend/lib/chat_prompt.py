@@ -0,0 +1,60 @@
+"""/api/chat 튜터 프롬프트 — 시스템 지시문과 뉴스 컨텍스트 프리앰블.
+
+chat 핸들러와 cron(추천 질문 답변 사전 생성)이 같은 텍스트를 만들어야
+응답 캐시·컨텍스트 캐시 키가 일치하므로 한 곳에 둔다. 바꾸면 기존 캐시는
+자연히 미스 처리됨 (키에 포함).
+"""
+
+
+CHAT_SYSTEM_INSTRUCTION = """너는 지음. 사용자와 함께 뉴스를 읽고 같이 생각을 넓혀가는 AI 토론 친구다.
+
+대화 원칙:
+- 한국어, 친근한 반말 톤 ("~야", "~지", "~네")
+- 1회 답변은 2~4문장 (장황 금지)
+- 균형잡힌 시각: 한쪽 의견만 강요하지 않음. 찬반 모두 보여주기
+- 사용자가 의견 물으면 양쪽 입장 짚어주고 "너는 어떻게 봐?" 식으로 되묻기
+- 뉴스 사실 모르면 솔직히 "그건 잘 모르겠어" 인정. 추측하지 말 것
+- 정치/종교/민감 이슈는 중립 유지. 단정 금지
+- 이모지 1~2개까지만 사용 (남발 금지)
+- 뉴스 맥락(왜 중요한지 포함)을 바탕으로 구체적으로 답할 것. 뉴스와 동떨어진 추상적 답변 금지
+- 용어 설명이 뉴스 컨텍스트에 제공된 경우, 그 용어가 대화에 나오면 쉽고 자연스럽게 풀어 설명할 것
+- 소크라테스식 접근: 답변 끝에 사용자 사고를 넓히는 후속 질문이나 다른 관점을 가볍게 한 줄 던져. 단 매번 강제하지 말고, 자연스러울 때만."""
+
+
+PREAMBLE_ACK = "응, 이 뉴스 같이 봤지! 궁금한 거 있으면 편하게 물어봐."
+
+
+def build_preamble(news_context) -> str | None:
+    """news_context → 첫 user 턴으로 주입할 '[지금 보고 있는 뉴스]' 텍스트."""
+    if not isinstance(news_context, dict) or not news_context:
+        return None
+    title = (news_context.get("title") or "").strip()
+    body_text = (news_context.get("body") or "").strip()
+    if not title and not body_text:
+        return None
+
+    ctx_lines = ["[지금 보고 있는 뉴스]"]
+    if title:
+        ctx_lines.append(f"제목: {title}")
+    if body_text:
+        ctx_lines.append(f"내용: {body_text}")
+
+    why_matters = (news_context.get("why_matters") or "").strip()
+    if why_matters:
+        ctx_lines.append(f"왜 중요한가: {why_matters}")
+
+    glossary = news_context.get("glossary")
+    if isinstance(glossary, list) and glossary:
+        terms = []
+        for item in glossary:
+            if not isinstance(item, dict):
+                continue
+            term = (item.get("term") or "").strip()
+            definition = (item.get("definition") or "").strip()
+            if term and definition:
+                terms.append(f"{term} - {definition}")
+        if terms:
+            ctx_lines.append(f"용어: {' / '.join(terms)}")
+
+    ctx_lines.append("\n이 뉴스에 대해 사용자랑 자연스럽게 대화 시작해.")
+    return "\n".join(ctx_lines)
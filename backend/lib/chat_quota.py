@@ -0,0 +1,103 @@
+"""채팅 일일 사용량 — chat_usage 원자 카운터 + 프로세스 사전 체크 + 롤업/정리.
+
+- consume_chat_quota(): 한도 미만이면 +1 후 누적 수, 이미 한도면 증가 없이 거절.
+  조건부 UPSERT 1문장(count < limit일 때만 증가)이라 동시 요청에도 한도를 넘지 않음.
+- 사전 체크(CHAT_QUOTA_PRECHECK): 한도에 도달한 (유저, KST 날짜)를 프로세스
+  메모리에 기억해 같은 날 재요청은 DB 없이 거절. 한도 미만 유저는 항상 DB로.
+- rollup_chat_usage(): 보존 기간(CHAT_USAGE_RETENTION_DAYS)이 지난 날짜를
+  chat_usage_daily(날짜별 유저 수·메시지 수)로 합친 뒤 원본 행 삭제. cron에서 호출.
+"""
+
+import os
+import threading
+from datetime import datetime, timezone, timedelta
+from .db import connection
+
+
+KST = timezone(timedelta(hours=9))
+
+CHAT_QUOTA_PRECHECK = os.environ.get("CHAT_QUOTA_PRECHECK", "1") == "1"
+CHAT_USAGE_RETENTION_DAYS = int(os.environ.get("CHAT_USAGE_RETENTION_DAYS", "30"))
+ROLLUP_MAX_DAYS = 31  # 1회 호출당 롤업할 날짜 수 상한 (밀린 백로그는 다음 cron이 이어감)
+EXHAUSTED_MAX = 50000  # 사전 체크 메모 상한 — 넘으면 비움
+
+_exhausted = set()  # 오늘 한도 도달한 user_id
+_exhausted_date = None
+_exhausted_lock = threading.Lock()
+
+
+def _today() -> str:
+    return datetime.now(KST).strftime("%Y-%m-%d")
+
+
+def _is_exhausted(user_id: str, today: str) -> bool:
+    return _exhausted_date == today and user_id in _exhausted
+
+
+def _mark_exhausted(user_id: str, today: str):
+    global _exhausted_date
+    with _exhausted_lock:
+        if _exhausted_date != today or len(_exhausted) >= EXHAUSTED_MAX:
+            _exhausted.clear()
+            _exhausted_date = today
+        _exhausted.add(user_id)
+
+
+def consume_chat_quota(user_id: str, limit: int) -> tuple:
+    """KST 오늘 날짜 기준 사용량 1회 차감 시도. (allowed, used) 반환.
+    거절 시 used는 limit (카운트는 한도에서 멈춤)."""
+    today = _today()
+    if CHAT_QUOTA_PRECHECK and _is_exhausted(user_id, today):
+        return False, limit
+
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            INSERT INTO chat_usage (user_id, date, count)
+            VALUES (%s, %s, 1)
+            ON CONFLICT (user_id, date)
+            DO UPDATE SET count = chat_usage.count + 1
+            WHERE chat_usage.count < %s
+            RETURNING count
+            """,
+            (user_id, today, limit),
+        )
+        row = cur.fetchone()
+        cur.close()
+
+    if row is None:
+        _mark_exhausted(user_id, today)
+        return False, limit
+    used = row[0]
+    if used >= limit:
+        _mark_exhausted(user_id, today)
+    return True, used
+
+
+def rollup_chat_usage(retention_days: int = CHAT_USAGE_RETENTION_DAYS) -> int:
+    """보존 기간 지난 날짜를 chat_usage_daily로 합치고 원본 삭제. 처리한 날짜 수 반환."""
+    cutoff = (datetime.now(KST) - timedelta(days=retention_days)).strftime("%Y-%m-%d")
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT DISTINCT date FROM chat_usage WHERE date < %s ORDER BY date LIMIT %s",
+            (cutoff, ROLLUP_MAX_DAYS),
+        )
+        dates = [r[0] for r in cur.fetchall()]
+        for date in dates:
+            cur.execute(
+                """
+                WITH moved AS (
+                    DELETE FROM chat_usage WHERE date = %s RETURNING count
+                )
+                INSERT INTO chat_usage_daily (date, users, messages)
+                SELECT %s, COUNT(*), COALESCE(SUM(count), 0) FROM moved
+                ON CONFLICT (date) DO UPDATE SET
+                    users = chat_usage_daily.users + EXCLUDED.users,
+                    messages = chat_usage_daily.messages + EXCLUDED.messages
+                """,
+                (date, date),
+            )
+        cur.close()
+    return len(dates)
@@ -0,0 +1,158 @@
+"""첫 턴 채팅 응답 캐시 — 같은 기사에 같은 첫 질문이면 Gemini 호출 없이 응답.
+
+브리핑의 suggested_questions가 탭 가능한 프롬프트로 노출되므로, 많은 유저가
+같은 기사에 글자 그대로 같은 첫 질문을 보낸다. 히스토리가 비어 있는 첫 턴만
+(모델, 시스템 지시문, 프리앰블, 정규화된 메시지) 해시로 캐시.
+
+- 정규화는 NFKC·소문자·공백 압축·끝 문장부호 제거 수준의 exact match.
+  (임베딩 유사도 매칭은 하지 않음 — 오답 재사용 위험 대비 이득이 작음)
+- TTL: CHAT_RESPONSE_CACHE_TTL_SEC. cron이 새 브리핑 저장 후 교체된 기사의 항목만 정리.
+- 행마다 hits/misses 카운터 (misses = 같은 키로 Gemini를 호출해 저장한 횟수).
+- cron은 추천 질문(suggested_questions) 답변을 미리 넣어 둠 (misses=0으로 시작).
+"""
+
+import hashlib
+import os
+import re
+import unicodedata
+from .db import connection
+from .gemini_client import GEMINI_MODEL
+
+
+CHAT_RESPONSE_CACHE_ENABLED = os.environ.get("CHAT_RESPONSE_CACHE_ENABLED", "1") == "1"
+CHAT_RESPONSE_CACHE_TTL_SEC = int(os.environ.get("CHAT_RESPONSE_CACHE_TTL_SEC", str(12 * 3600)))
+
+_TRAILING_PUNCT = re.compile(r"[\s?!.~…？！。]+$")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_message(message: str) -> str:
+    text = unicodedata.normalize("NFKC", message).casefold()
+    text = _WHITESPACE.sub(" ", text).strip()
+    return _TRAILING_PUNCT.sub("", text)
+
+
+def _cache_key(system_instruction: str, preamble: str, message: str) -> str:
+    h = hashlib.sha256()
+    for part in (GEMINI_MODEL, system_instruction, preamble, normalize_message(message)):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def get_cached_reply(system_instruction: str, preamble: str, message: str) -> str | None:
+    """캐시된 첫 턴 응답 (히트 시 hits +1). 없거나 장애면 None (fail-soft)."""
+    if not CHAT_RESPONSE_CACHE_ENABLED:
+        return None
+    try:
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                UPDATE chat_response_cache SET hits = hits + 1
+                WHERE cache_key = %s AND expires_at > now()
+                RETURNING reply
+                """,
+                (_cache_key(system_instruction, preamble, message),),
+            )
+            row = cur.fetchone()
+            cur.close()
+        return row[0] if row else None
+    except Exception as e:
+        print(f"  응답 캐시 조회 실패: {e}")
+        return None
+
+
+def store_replies(system_instruction: str, preamble: str, pairs: list,
+                  news_id: int | None = None, precomputed: bool = False, conn=None) -> int:
+    """[(message, reply)]를 한 번에 저장. 같은 키가 이미 있으면 misses 누적, 만료된
+    행이면 응답도 교체. precomputed=True(cron 사전 생성)는 미스로 세지 않음.
+    저장(갱신) 건수 반환."""
+    if not CHAT_RESPONSE_CACHE_ENABLED or not pairs:
+        return 0
+    rows = [
+        (_cache_key(system_instruction, preamble, message), news_id,
+         normalize_message(message), reply, 0 if precomputed else 1, CHAT_RESPONSE_CACHE_TTL_SEC)
+        for message, reply in pairs
+    ]
+    with connection(conn) as conn:
+        cur = conn.cursor()
+        cur.executemany(
+            """
+            INSERT INTO chat_response_cache (cache_key, news_id, message, reply, misses, expires_at)
+            VALUES (%s, %s, %s, %s, %s, now() + make_interval(secs => %s))
+            ON CONFLICT (cache_key) DO UPDATE SET
+                misses = chat_response_cache.misses + EXCLUDED.misses,
+                reply = CASE WHEN chat_response_cache.expires_at <= now()
+                             THEN EXCLUDED.reply ELSE chat_response_cache.reply END,
+                expires_at = GREATEST(chat_response_cache.expires_at, EXCLUDED.expires_at)
+            """,
+            rows,
+        )
+        cur.close()
+    return len(rows)
+
+
+def store_reply(system_instruction: str, preamble: str, message: str, reply: str,
+                news_id: int | None = None):
+    """미스 후 Gemini 응답 저장 (fail-soft)."""
+    try:
+        store_replies(system_instruction, preamble, [(message, reply)], news_id=news_id)
+    except Exception as e:
+        print(f"  응답 캐시 저장 실패: {e}")
+
+
+def expire_response_cache(replaced: list) -> int:
+    """새 브리핑으로 교체된 기사의 항목 삭제 (cron에서 호출).
+    replaced: [(region, category, 새 news_id)] — 같은 (region, category)의 다른
+    뉴스에 딸린 항목만 지움. 이번 실행이 새 news_id로 사전 생성한 답변과 다른
+    지역·카테고리 항목은 남고, news_id 없는 항목은 TTL 만료에 맡김. 삭제 건수 반환."""
+    if not replaced:
+        return 0
+    regions, categories, news_ids = (list(col) for col in zip(*replaced))
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            DELETE FROM chat_response_cache c
+            USING news n, unnest(%s::text[], %s::text[], %s::int[]) AS r(region, category, news_id)
+            WHERE n.id = c.news_id
+              AND n.region = r.region AND n.category = r.category AND n.id <> r.news_id
+            """,
+            (regions, categories, news_ids),
+        )
+        deleted = cur.rowcount
+        cur.close()
+    return deleted
+
+
+def response_cache_stats() -> dict:
+    """현재 브리핑 기준 캐시 항목 수·히트·미스 합계."""
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT COUNT(*), COALESCE(SUM(hits), 0), COALESCE(SUM(misses), 0)
+            FROM chat_response_cache WHERE expires_at > now()
+            """
+        )
+        entries, hits, misses = (int(v) for v in cur.fetchone())
+        cur.execute(
+            """
+            SELECT message, news_id, hits, misses FROM chat_response_cache
+            WHERE expires_at > now() ORDER BY hits DESC LIMIT 10
+            """
+        )
+        top = [
+            {"message": r[0], "news_id": r[1], "hits": r[2], "misses": r[3]}
+            for r in cur.fetchall()
+        ]
+        cur.close()
+    total = hits + misses
+    return {
+        "entries": entries,
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / total, 3) if total else None,
+        "top": top,
+    }
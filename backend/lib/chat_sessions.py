@@ -0,0 +1,131 @@
+"""서버 측 채팅 세션 — 첫 턴에 session_id 발급, 이후 클라이언트는 새 메시지만 전송.
+
+세션에는 뉴스 컨텍스트 프리앰블(첫 user 턴 텍스트)과 대화 히스토리를 보관하고,
+트리밍(max_history)은 서버가 결정한다. TTL(CHAT_SESSION_TTL_SEC)이 지나면 만료.
+
+백엔드는 CHAT_SESSION_BACKEND로 선택:
+- postgres (기본): chat_sessions 테이블. 서버리스 인스턴스 간 공유.
+- memory: 프로세스 메모리. 로컬 개발·단일 프로세스용 (인스턴스 간 공유 안 됨).
+
+세션은 user_id에 묶임 — 다른 유저의 session_id로는 조회되지 않음.
+"""
+
+import os
+import secrets
+import threading
+import time
+from psycopg2.extras import Json
+from .db import connection
+
+
+CHAT_SESSION_BACKEND = os.environ.get("CHAT_SESSION_BACKEND", "postgres")
+CHAT_SESSION_TTL_SEC = int(os.environ.get("CHAT_SESSION_TTL_SEC", str(6 * 3600)))
+MEMORY_MAX_SESSIONS = 10000
+
+
+def new_session_id() -> str:
+    return secrets.token_urlsafe(16)
+
+
+class PostgresSessionStore:
+    def load(self, session_id: str, user_id: str) -> dict | None:
+        """{"preamble", "history"} 또는 None (없음·만료·다른 유저)."""
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT preamble, history FROM chat_sessions
+                WHERE id = %s AND user_id = %s AND expires_at > now()
+                """,
+                (session_id, user_id),
+            )
+            row = cur.fetchone()
+            cur.close()
+        if not row:
+            return None
+        return {"preamble": row[0], "history": row[1] or []}
+
+    def save(self, session_id: str, user_id: str, preamble: str | None, history: list):
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                INSERT INTO chat_sessions (id, user_id, preamble, history, expires_at)
+                VALUES (%s, %s, %s, %s, now() + make_interval(secs => %s))
+                ON CONFLICT (id) DO UPDATE SET
+                    preamble = EXCLUDED.preamble,
+                    history = EXCLUDED.history,
+                    updated_at = now(),
+                    expires_at = EXCLUDED.expires_at
+                WHERE chat_sessions.user_id = EXCLUDED.user_id
+                """,
+                (session_id, user_id, preamble, Json(history), CHAT_SESSION_TTL_SEC),
+            )
+            cur.close()
+
+    def prune(self) -> int:
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM chat_sessions WHERE expires_at <= now()")
+            deleted = cur.rowcount
+            cur.close()
+        return deleted
+
+
+class MemorySessionStore:
+    def __init__(self, max_sessions: int = MEMORY_MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._sessions = {}  # session_id → (expires_at, user_id, preamble, history)
+        self._lock = threading.Lock()
+
+    def load(self, session_id: str, user_id: str) -> dict | None:
+        with self._lock:
+            hit = self._sessions.get(session_id)
+        if not hit or hit[0] <= time.monotonic() or hit[1] != user_id:
+            return None
+        return {"preamble": hit[2], "history": list(hit[3])}
+
+    def save(self, session_id: str, user_id: str, preamble: str | None, history: list):
+        with self._lock:
+            hit = self._sessions.get(session_id)
+            if hit and hit[1] != user_id:
+                return
+            if not hit and len(self._sessions) >= self.max_sessions:
+                self._prune_locked()
+                if len(self._sessions) >= self.max_sessions:
+                    # 가장 먼저 만료될 세션부터 밀어냄
+                    oldest = min(self._sessions, key=lambda k: self._sessions[k][0])
+                    del self._sessions[oldest]
+            expires_at = time.monotonic() + CHAT_SESSION_TTL_SEC
+            self._sessions[session_id] = (expires_at, user_id, preamble, list(history))
+
+    def prune(self) -> int:
+        with self._lock:
+            return self._prune_locked()
+
+    def _prune_locked(self) -> int:
+        now = time.monotonic()
+        expired = [k for k, v in self._sessions.items() if v[0] <= now]
+        for k in expired:
+            del self._sessions[k]
+        return len(expired)
+
+
+_BACKENDS = {"postgres": PostgresSessionStore, "memory": MemorySessionStore}
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """CHAT_SESSION_BACKEND에 맞는 프로세스 공용 세션 저장소."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = _BACKENDS.get(CHAT_SESSION_BACKEND, PostgresSessionStore)()
+    return _store
+
+
+def prune_chat_sessions() -> int:
+    """만료 세션 삭제 후 삭제 건수 반환 (cron에서 호출)."""
+    return get_store().prune()
@@ -13,8 +13,13 @@
 - canonicalization은 Gemini가 추출 단계에서 수행 (slug/kind/domain 직접 반환).
 """
 
+import os
+import threading
+import time
+from collections import Counter
 from datetime import datetime, timezone, timedelta
-from .db import get_conn
+from psycopg2.extras import execute_values
+from .db import connection
 
 
 KST = timezone(timedelta(hours=9))
@@ -26,6 +31,16 @@ MAX_STAGE = 5
 VALID_KINDS = ("person", "org", "event", "place", "term")
 VALID_DOMAINS = ("politics", "economy", "society", "tech", "foreign", "etc")
 
+# 노출 합치기(coalescing) 창(초). 0이면 요청마다 바로 기록.
+# 켜면 창 안의 같은 (user, concept) 증가분을 합쳐 한 번에 flush — 단, 서버리스
+# 인스턴스가 창 안에서 종료되면 버퍼분은 유실되므로 장수 프로세스에서만 권장.
+EXPOSURE_COALESCE_SEC = float(os.environ.get("EXPOSURE_COALESCE_SEC", "0"))
+EXPOSURE_BUFFER_MAX = 5000  # 버퍼 내 (user, concept) 키 상한 — 넘으면 즉시 flush
+
+# user_progress_* 카운터 갱신을 유저 단위로 직렬화하는 advisory lock 네임스페이스
+# (pg_advisory_xact_lock(PROGRESS_LOCK_NS, hashtext(user_id)) — 트리거와 재계산이 공유)
+PROGRESS_LOCK_NS = 0x75707267  # 'uprg'
+
 
 def _now() -> str:
     return datetime.now(KST).isoformat()
@@ -35,239 +50,304 @@ def _today() -> str:
     return datetime.now(KST).strftime("%Y-%m-%d")
 
 
-def _add_days(ymd: str, days: int) -> str:
-    base = datetime.strptime(ymd, "%Y-%m-%d")
-    return (base + timedelta(days=days)).strftime("%Y-%m-%d")
-
+# ── 수집(cron) 측 ────────────────────────────────────────────
 
-def init_concepts_db():
-    """개념 학습 3테이블 생성 (멱등). news.py GET처럼 런타임 호출 가능."""
-    conn = get_conn()
-    try:
+def upsert_concepts(rows: list, conn=None) -> dict:
+    """slug 기준 개념 일괄 upsert. 기존이면 last_seen/정의 갱신 (occurrence_count는
+    add_occurrences에서 증가). multi-row INSERT ... ON CONFLICT 한 문장으로
+    처리하고 {slug: concept_id} 반환.
+    rows: [(slug, display_name, kind, domain, definition), ...]
+    한 문장에서 같은 행을 두 번 갱신할 수 없으므로 slug 중복은 정의가 긴 쪽만 남김."""
+    now = _now()
+    dedup = {}
+    for slug, display_name, kind, domain, definition in rows:
+        kind = kind if kind in VALID_KINDS else "term"
+        domain = domain if domain in VALID_DOMAINS else "etc"
+        prev = dedup.get(slug)
+        if prev is None or len(definition) > len(prev[4]):
+            dedup[slug] = (slug, display_name, kind, domain, definition, now, now)
+    if not dedup:
+        return {}
+    with connection(conn) as conn:
         cur = conn.cursor()
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS concepts (
-                id SERIAL PRIMARY KEY,
-                slug TEXT UNIQUE NOT NULL,
-                display_name TEXT NOT NULL,
-                kind TEXT NOT NULL DEFAULT 'term',
-                domain TEXT NOT NULL DEFAULT 'etc',
-                definition TEXT NOT NULL DEFAULT '',
-                occurrence_count INTEGER NOT NULL DEFAULT 0,
-                first_seen_at TEXT NOT NULL,
-                last_seen_at TEXT NOT NULL
-            )
+        result = execute_values(
+            cur,
             """
+            INSERT INTO concepts
+                (slug, display_name, kind, domain, definition,
+                 first_seen_at, last_seen_at)
+            VALUES %s
+            ON CONFLICT (slug) DO UPDATE SET
+                last_seen_at = EXCLUDED.last_seen_at,
+                display_name = EXCLUDED.display_name,
+                definition = CASE
+                    WHEN length(EXCLUDED.definition) > length(concepts.definition)
+                    THEN EXCLUDED.definition ELSE concepts.definition END
+            RETURNING slug, id
+            """,
+            list(dedup.values()),
+            page_size=len(dedup),
+            fetch=True,
         )
-        cur.execute(
+        cur.close()
+        return {slug: concept_id for slug, concept_id in result}
+
+
+def add_occurrences(news_id: int, pairs: list, session_key: str, conn=None) -> int:
+    """개념-뉴스 등장 일괄 기록. pairs: [(concept_id, article_title), ...].
+    등장 기록 INSERT와 occurrence_count 증가를 CTE 한 문장으로 처리
+    (신규 삽입분만 concept별로 묶어 더함). 신규 삽입 건수 반환."""
+    pairs = list(dict.fromkeys(pairs))
+    if not pairs:
+        return 0
+    now = _now()
+    with connection(conn) as conn:
+        cur = conn.cursor()
+        result = execute_values(
+            cur,
             """
-            CREATE TABLE IF NOT EXISTS concept_occurrences (
-                id SERIAL PRIMARY KEY,
-                concept_id INTEGER NOT NULL REFERENCES concepts(id) ON DELETE CASCADE,
-                news_id INTEGER NOT NULL REFERENCES news(id) ON DELETE CASCADE,
-                article_title TEXT NOT NULL DEFAULT '',
-                session_key TEXT NOT NULL DEFAULT '',
-                created_at TEXT NOT NULL,
-                UNIQUE (concept_id, news_id, article_title)
+            WITH ins AS (
+                INSERT INTO concept_occurrences
+                    (concept_id, news_id, article_title, session_key, created_at)
+                VALUES %s
+                ON CONFLICT (concept_id, news_id, article_title) DO NOTHING
+                RETURNING concept_id
+            ), cnt AS (
+                SELECT concept_id, COUNT(*) AS n FROM ins GROUP BY concept_id
             )
-            """
+            UPDATE concepts c SET occurrence_count = c.occurrence_count + cnt.n
+            FROM cnt WHERE c.id = cnt.concept_id
+            RETURNING cnt.n
+            """,
+            [(cid, news_id, title, session_key, now) for cid, title in pairs],
+            page_size=len(pairs),
+            fetch=True,
         )
+        cur.close()
+        return sum(r[0] for r in result)
+
+
+# ── 개념 추출 백필 큐 ────────────────────────────────────────
+# concept_extraction_status: news row별 추출 상태 (pending → running → done/failed/skipped).
+# running은 lease — EXTRACTION_LEASE_SEC 안에 끝나지 않은(워커가 죽은) 행은 다시 집음.
+
+EXTRACTION_LEASE_SEC = 600
+EXTRACTION_MAX_ATTEMPTS = 3
+
+
+def enqueue_concept_extraction(conn=None) -> int:
+    """상태 행이 없는 news를 pending으로 등록 (NOT EXISTS anti-join). 추가 건수 반환."""
+    with connection(conn) as conn:
+        cur = conn.cursor()
         cur.execute(
             """
-            CREATE TABLE IF NOT EXISTS user_concept_mastery (
-                user_id TEXT NOT NULL,
-                concept_id INTEGER NOT NULL REFERENCES concepts(id) ON DELETE CASCADE,
-                exposure_count INTEGER NOT NULL DEFAULT 0,
-                srs_stage INTEGER NOT NULL DEFAULT 0,
-                next_review_date TEXT,
-                mastered BOOLEAN NOT NULL DEFAULT FALSE,
-                first_exposed_at TEXT NOT NULL,
-                last_result_at TEXT,
-                mastered_at TEXT,
-                PRIMARY KEY (user_id, concept_id)
+            INSERT INTO concept_extraction_status (news_id, status)
+            SELECT n.id, 'pending' FROM news n
+            WHERE NOT EXISTS (
+                SELECT 1 FROM concept_extraction_status s WHERE s.news_id = n.id
             )
+            ON CONFLICT (news_id) DO NOTHING
             """
         )
-        cur.execute(
-            "CREATE INDEX IF NOT EXISTS idx_ucm_user_due "
-            "ON user_concept_mastery (user_id, next_review_date)"
-        )
-        cur.execute(
-            "CREATE INDEX IF NOT EXISTS idx_co_news ON concept_occurrences (news_id)"
-        )
-        conn.commit()
+        added = cur.rowcount
         cur.close()
-    finally:
-        conn.close()
+        return added
 
 
-# ── 수집(cron) 측 ────────────────────────────────────────────
-
-def upsert_concept(slug: str, display_name: str, kind: str,
-                   domain: str, definition: str) -> int:
-    """slug 기준 개념 upsert. 기존이면 last_seen/정의 갱신, occurrence_count는
-    add_occurrence에서 증가. 개념 id 반환."""
-    kind = kind if kind in VALID_KINDS else "term"
-    domain = domain if domain in VALID_DOMAINS else "etc"
-    now = _now()
-    conn = get_conn()
-    try:
+def claim_concept_extraction() -> int | None:
+    """처리할 news_id 하나를 running으로 집어 바로 commit (FOR UPDATE SKIP LOCKED —
+    병렬 워커끼리 같은 행을 집지 않음). 최신 뉴스부터. 없으면 None."""
+    with connection() as conn:
         cur = conn.cursor()
         cur.execute(
             """
-            INSERT INTO concepts
-                (slug, display_name, kind, domain, definition,
-                 first_seen_at, last_seen_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (slug) DO UPDATE SET
-                last_seen_at = EXCLUDED.last_seen_at,
-                display_name = EXCLUDED.display_name,
-                -- 새 정의가 더 길면 채택(빈/짧은 정의 덮어쓰기 방지)
-                definition = CASE
-                    WHEN length(EXCLUDED.definition) > length(concepts.definition)
-                    THEN EXCLUDED.definition ELSE concepts.definition END
-            RETURNING id
+            UPDATE concept_extraction_status s
+            SET status = 'running', attempts = s.attempts + 1, updated_at = now()
+            WHERE s.news_id = (
+                SELECT news_id FROM concept_extraction_status
+                WHERE status = 'pending'
+                   OR (status = 'failed' AND attempts < %s)
+                   OR (status = 'running' AND updated_at < now() - make_interval(secs => %s))
+                ORDER BY news_id DESC
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING s.news_id
             """,
-            (slug, display_name, kind, domain, definition, now, now),
+            (EXTRACTION_MAX_ATTEMPTS, EXTRACTION_LEASE_SEC),
         )
-        concept_id = cur.fetchone()[0]
-        conn.commit()
+        row = cur.fetchone()
         cur.close()
-        return concept_id
-    finally:
-        conn.close()
+        return row[0] if row else None
 
 
-def add_occurrence(concept_id: int, news_id: int,
-                   article_title: str, session_key: str) -> bool:
-    """개념-뉴스 등장 기록. UNIQUE로 중복 무시. 신규 등장이면 occurrence_count++.
-    신규 삽입 여부 반환."""
-    conn = get_conn()
-    try:
+def set_concept_extraction_status(news_id: int, status: str,
+                                  error: str | None = None, conn=None):
+    """추출 결과 기록 (done/failed/skipped/pending). 없으면 행 생성."""
+    with connection(conn) as conn:
         cur = conn.cursor()
         cur.execute(
             """
-            INSERT INTO concept_occurrences
-                (concept_id, news_id, article_title, session_key, created_at)
-            VALUES (%s, %s, %s, %s, %s)
-            ON CONFLICT (concept_id, news_id, article_title) DO NOTHING
-            RETURNING id
+            INSERT INTO concept_extraction_status (news_id, status, last_error)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (news_id) DO UPDATE SET
+                status = EXCLUDED.status,
+                last_error = EXCLUDED.last_error,
+                updated_at = now()
             """,
-            (concept_id, news_id, article_title, session_key, _now()),
+            (news_id, status, error[:500] if error else None),
         )
-        inserted = cur.fetchone() is not None
-        if inserted:
-            cur.execute(
-                "UPDATE concepts SET occurrence_count = occurrence_count + 1 "
-                "WHERE id = %s",
-                (concept_id,),
-            )
-        conn.commit()
         cur.close()
-        return inserted
-    finally:
-        conn.close()
-
 
-# ── 유저 학습 측 ─────────────────────────────────────────────
 
-def record_exposure(user_id: str, concept_id: int):
-    """유저가 개념을 (수동) 노출. 행 없으면 stage=0으로 생성, 있으면 exposure_count++.
-    능동 테스트 없이도 '만난 개념'으로 카운트되는 패시브 신호."""
-    now = _now()
-    conn = get_conn()
-    try:
+def concept_extraction_progress() -> dict:
+    """상태별 건수 {"pending", "running", "done", "failed", "skipped", "total"}.
+    failed 중 재시도 한도에 걸린 건수는 "failed_final"."""
+    with connection() as conn:
         cur = conn.cursor()
         cur.execute(
             """
-            INSERT INTO user_concept_mastery
-                (user_id, concept_id, exposure_count, srs_stage, first_exposed_at)
-            VALUES (%s, %s, 1, 0, %s)
-            ON CONFLICT (user_id, concept_id) DO UPDATE SET
-                exposure_count = user_concept_mastery.exposure_count + 1
+            SELECT status, COUNT(*), COUNT(*) FILTER (WHERE attempts >= %s)
+            FROM concept_extraction_status GROUP BY status
             """,
-            (user_id, concept_id, now),
+            (EXTRACTION_MAX_ATTEMPTS,),
         )
-        conn.commit()
+        rows = cur.fetchall()
         cur.close()
-    finally:
-        conn.close()
+    progress = {s: 0 for s in ("pending", "running", "done", "failed", "skipped")}
+    final_failed = 0
+    for status, count, exhausted in rows:
+        progress[status] = int(count)
+        if status == "failed":
+            final_failed = int(exhausted)
+    progress["failed_final"] = final_failed
+    progress["total"] = sum(progress[s] for s in ("pending", "running", "done", "failed", "skipped"))
+    return progress
 
 
-def record_review(user_id: str, concept_id: int, correct: bool):
-    """능동 테스트(퀴즈/복습) 결과로 Leitner 진행.
-    정답=다음 단계(5→마스터), 오답=1단계 리셋. 미존재 행은 노출로 간주 후 처리."""
-    today = _today()
+# ── 유저 학습 측 ─────────────────────────────────────────────
+
+def record_exposures(user_id: str, concept_ids: list, conn=None) -> dict:
+    """유저가 개념들을 (수동) 노출 — 능동 테스트 없이도 '만난 개념'으로 카운트되는
+    패시브 신호. 행 없으면 stage=0으로 생성. unnest 한 문장으로 upsert하고
+    {concept_id: 누적 exposure_count} 반환. 같은 id가 여러 번 오면 그만큼 증가.
+    concepts에 없는 id는 건너뛰므로 결과에서 빠짐 (FK 위반으로 전체 실패 방지)."""
+    counts = Counter(concept_ids)
+    if not counts:
+        return {}
+    ids = list(counts)
     now = _now()
-    conn = get_conn()
-    try:
+    with connection(conn) as conn:
         cur = conn.cursor()
-        # 행 보장 (노출 없이 바로 퀴즈 가능성 방어)
         cur.execute(
             """
-            INSERT INTO user_concept_mastery
+            INSERT INTO user_concept_mastery AS u
                 (user_id, concept_id, exposure_count, srs_stage, first_exposed_at)
-            VALUES (%s, %s, 0, 0, %s)
-            ON CONFLICT (user_id, concept_id) DO NOTHING
+            SELECT %s, v.cid, v.n, 0, %s
+            FROM unnest(%s::int[], %s::int[]) AS v(cid, n)
+            WHERE EXISTS (SELECT 1 FROM concepts c WHERE c.id = v.cid)
+            ON CONFLICT (user_id, concept_id) DO UPDATE SET
+                exposure_count = u.exposure_count + EXCLUDED.exposure_count
+            RETURNING u.concept_id, u.exposure_count
             """,
-            (user_id, concept_id, now),
+            (user_id, now, ids, [counts[i] for i in ids]),
         )
+        result = dict(cur.fetchall())
+        cur.close()
+        return result
+
+
+class _ExposureBuffer:
+    """(user, concept)별 노출 증가분을 EXPOSURE_COALESCE_SEC 동안 모았다가
+    유저당 record_exposures 한 번으로 flush. flush는 창이 지난 뒤 들어온
+    요청이 동기로 수행 (백그라운드 스레드 없음)."""
+
+    def __init__(self):
+        self._pending = {}  # user_id → Counter(concept_id)
+        self._size = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    def add(self, user_id: str, concept_ids: list) -> int:
+        with self._lock:
+            bucket = self._pending.setdefault(user_id, Counter())
+            before = len(bucket)
+            bucket.update(concept_ids)
+            self._size += len(bucket) - before
+            if self._opened_at is None:
+                self._opened_at = time.monotonic()
+        self.flush_if_due()
+        return len(concept_ids)
+
+    def flush_if_due(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            due = (time.monotonic() - self._opened_at >= EXPOSURE_COALESCE_SEC
+                   or self._size >= EXPOSURE_BUFFER_MAX)
+            if not due:
+                return
+            pending, self._pending = self._pending, {}
+            self._size, self._opened_at = 0, None
+        try:
+            with connection() as conn:
+                # 유저 순서를 고정해 동시 flush 간 유저별 잠금 교착 방지
+                for user_id, bucket in sorted(pending.items()):
+                    record_exposures(user_id, list(bucket.elements()), conn=conn)
+        except Exception:
+            # 실패분은 버퍼로 되돌려 다음 flush에서 재시도
+            with self._lock:
+                for user_id, bucket in pending.items():
+                    self._pending.setdefault(user_id, Counter()).update(bucket)
+                self._size = sum(len(b) for b in self._pending.values())
+                if self._opened_at is None:
+                    self._opened_at = time.monotonic()
+            raise
+
+
+exposure_buffer = _ExposureBuffer()
+
+
+def record_reviews(user_id: str, reviews: list, conn=None) -> list:
+    """능동 테스트(퀴즈/복습) 결과로 Leitner 진행 — 퀴즈 세션 전체를 한 번에.
+    정답=다음 단계(5→마스터), 오답=1단계 리셋. 미존재 행은 노출로 간주 후 처리.
+
+    상태 전이는 srs_apply_reviews() 저장 함수의 단일 upsert로 원자적으로 수행
+    (동시 복습이 SELECT/UPDATE 사이에 끼어들 수 없음). reviews는
+    [(concept_id, correct), ...] 순서대로 적용되므로 같은 개념이 여러 번 있어도
+    차례로 진행. 간격·최대 단계는 INTERVAL_DAYS/MAX_STAGE를 인자로 넘김.
+    concepts에 없는 id는 건너뜀. [(concept_id, srs_stage, mastered), ...] 반환."""
+    if not reviews:
+        return []
+    with connection(conn) as conn:
+        cur = conn.cursor()
         cur.execute(
-            "SELECT srs_stage, mastered FROM user_concept_mastery "
-            "WHERE user_id = %s AND concept_id = %s",
-            (user_id, concept_id),
+            "SELECT * FROM srs_apply_reviews("
+            "%s, %s::int[], %s::bool[], %s::date, %s, %s::int[], %s)",
+            (
+                user_id,
+                [int(cid) for cid, _ in reviews],
+                [bool(correct) for _, correct in reviews],
+                _today(),
+                _now(),
+                INTERVAL_DAYS,
+                MAX_STAGE,
+            ),
         )
-        stage, mastered = cur.fetchone()
-
-        if correct:
-            if stage >= MAX_STAGE:
-                cur.execute(
-                    """
-                    UPDATE user_concept_mastery SET
-                        mastered = TRUE,
-                        mastered_at = COALESCE(mastered_at, %s),
-                        last_result_at = %s
-                    WHERE user_id = %s AND concept_id = %s
-                    """,
-                    (now, now, user_id, concept_id),
-                )
-            else:
-                next_stage = max(stage, 1) + 1 if stage >= 1 else 1
-                cur.execute(
-                    """
-                    UPDATE user_concept_mastery SET
-                        srs_stage = %s,
-                        next_review_date = %s,
-                        last_result_at = %s
-                    WHERE user_id = %s AND concept_id = %s
-                    """,
-                    (next_stage, _add_days(today, INTERVAL_DAYS[next_stage - 1]),
-                     now, user_id, concept_id),
-                )
-        else:
-            cur.execute(
-                """
-                UPDATE user_concept_mastery SET
-                    srs_stage = 1,
-                    next_review_date = %s,
-                    mastered = FALSE,
-                    last_result_at = %s
-                WHERE user_id = %s AND concept_id = %s
-                """,
-                (_add_days(today, INTERVAL_DAYS[0]), now, user_id, concept_id),
-            )
-        conn.commit()
+        rows = cur.fetchall()
         cur.close()
-    finally:
-        conn.close()
+        return rows
+
+
+def record_review(user_id: str, concept_id: int, correct: bool):
+    """단건 복습 결과 반영 (record_reviews 참고)."""
+    record_reviews(user_id, [(concept_id, correct)])
 
 
 def get_concepts_for_news(news_id: int) -> list:
     """뉴스에 등장한 개념 목록 (기사 제목별 매핑 포함). 앱이 카드 노출/퀴즈 시
     어느 concept_id를 기록할지 알기 위해 news 페이로드에 실어줌."""
-    conn = get_conn()
-    try:
+    with connection() as conn:
         cur = conn.cursor()
         cur.execute(
             """
@@ -294,57 +374,107 @@ def get_concepts_for_news(news_id: int) -> list:
             }
             for r in rows
         ]
-    finally:
-        conn.close()
 
 
 def get_user_progress(user_id: str) -> dict:
-    """진척 시각화용 집계. 완독보너스 자리에 띄울 핵심 수치."""
-    conn = get_conn()
-    try:
+    """진척 시각화용 집계. 완독보너스 자리에 띄울 핵심 수치.
+
+    user_progress_* 카운터(user_concept_mastery 트리거가 같은 트랜잭션에서 유지)만
+    읽으므로 유저의 개념 행 수와 무관하게 단일 조회. due_today는 복습 예정일
+    히스토그램에서 오늘 이전 구간 합."""
+    with connection() as conn:
         cur = conn.cursor()
         cur.execute(
             """
             SELECT
-                COUNT(*)                                   AS encountered,
-                COUNT(*) FILTER (WHERE mastered)           AS mastered,
-                COUNT(*) FILTER (WHERE srs_stage BETWEEN 1 AND 4
-                                 AND NOT mastered)         AS learning,
-                COUNT(*) FILTER (WHERE next_review_date IS NOT NULL
-                                 AND next_review_date <= %s
-                                 AND NOT mastered)         AS due_today
-            FROM user_concept_mastery
-            WHERE user_id = %s
+                COALESCE(s.encountered, 0),
+                COALESCE(s.mastered, 0),
+                COALESCE(s.learning, 0),
+                (SELECT COALESCE(SUM(d.n), 0) FROM user_progress_due d
+                 WHERE d.user_id = k.user_id AND d.due_date <= %s),
+                -- 토픽(domain)별 mastery % — "G7 관련 80% 숙지" 류 viz
+                (SELECT COALESCE(json_agg(json_build_array(p.domain, p.total, p.mastered)),
+                                 '[]'::json)
+                 FROM user_progress_domain p
+                 WHERE p.user_id = k.user_id AND p.total > 0)
+            FROM (SELECT %s::text AS user_id) k
+            LEFT JOIN user_progress_summary s ON s.user_id = k.user_id
             """,
             (_today(), user_id),
         )
-        enc, mas, lrn, due = cur.fetchone()
-
-        # 토픽(domain)별 mastery % — "G7 관련 80% 숙지" 류 viz
+        enc, mas, lrn, due, domain_rows = cur.fetchone()
+        cur.close()
+    domains = [
+        {"domain": d, "total": t, "mastered": m,
+         "ratio": round(m / t, 2) if t else 0.0}
+        for d, t, m in domain_rows
+    ]
+    return {
+        "encountered": enc,
+        "mastered": mas,
+        "learning": lrn,
+        "due_today": due,
+        "domains": domains,
+    }
+
+
+def reconcile_user_progress(user_id: str | None = None, conn=None) -> int:
+    """user_progress_* 카운터를 user_concept_mastery에서 처음부터 재계산.
+    user_id 없으면 전체 유저. 개념 삭제(cascade) 등으로 어긋난 카운터 보정용.
+
+    동시 노출/복습의 트리거와 섞이지 않도록 먼저 잠금:
+    - 유저 1명: 트리거와 같은 유저 advisory xact lock → 그 유저의 쓰기만 대기
+    - 전체: user_concept_mastery SHARE 잠금 → 재계산이 끝날 때까지 쓰기 전체 대기
+    잠금 획득 뒤의 문장은 진행 중이던 쓰기가 commit된 스냅샷을 읽으므로 이중 계산·
+    누락·유니크 충돌 없음. 잠금은 트랜잭션 끝(commit)에 풀림. 재계산한 유저 수 반환."""
+    params = {"uid": user_id}
+    only_user = "AND user_id = %(uid)s" if user_id else ""
+    only_u = "AND u.user_id = %(uid)s" if user_id else ""
+    with connection(conn) as conn:
+        cur = conn.cursor()
+        if user_id:
+            cur.execute(
+                "SELECT pg_advisory_xact_lock(%s, hashtext(%s))",
+                (PROGRESS_LOCK_NS, user_id),
+            )
+        else:
+            cur.execute("LOCK TABLE user_concept_mastery IN SHARE MODE")
+        for table in ("user_progress_summary", "user_progress_domain", "user_progress_due"):
+            cur.execute(f"DELETE FROM {table} WHERE TRUE {only_user}", params)
         cur.execute(
-            """
-            SELECT c.domain,
-                   COUNT(*)                          AS total,
-                   COUNT(*) FILTER (WHERE u.mastered) AS mastered
+            f"""
+            INSERT INTO user_progress_summary (user_id, encountered, mastered, learning)
+            SELECT user_id,
+                   COUNT(*),
+                   COUNT(*) FILTER (WHERE mastered),
+                   COUNT(*) FILTER (WHERE srs_stage BETWEEN 1 AND 4 AND NOT mastered)
+            FROM user_concept_mastery
+            WHERE TRUE {only_user}
+            GROUP BY user_id
+            """,
+            params,
+        )
+        users = cur.rowcount
+        cur.execute(
+            f"""
+            INSERT INTO user_progress_domain (user_id, domain, total, mastered)
+            SELECT u.user_id, c.domain, COUNT(*), COUNT(*) FILTER (WHERE u.mastered)
             FROM user_concept_mastery u
             JOIN concepts c ON c.id = u.concept_id
-            WHERE u.user_id = %s
-            GROUP BY c.domain
+            WHERE TRUE {only_u}
+            GROUP BY u.user_id, c.domain
             """,
-            (user_id,),
+            params,
+        )
+        cur.execute(
+            f"""
+            INSERT INTO user_progress_due (user_id, due_date, n)
+            SELECT user_id, next_review_date, COUNT(*)
+            FROM user_concept_mastery
+            WHERE next_review_date IS NOT NULL AND NOT mastered {only_user}
+            GROUP BY user_id, next_review_date
+            """,
+            params,
         )
-        domains = [
-            {"domain": d, "total": t, "mastered": m,
-             "ratio": round(m / t, 2) if t else 0.0}
-            for d, t, m in cur.fetchall()
-        ]
         cur.close()
-        return {
-            "encountered": enc,
-            "mastered": mas,
-            "learning": lrn,
-            "due_today": due,
-            "domains": domains,
-        }
-    finally:
-        conn.close()
+        return users
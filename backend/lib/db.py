@@ -1,187 +1,267 @@
+import json
 import os
+import threading
+import time
+from contextlib import contextmanager
 import psycopg2
+from psycopg2.extras import Json, execute_values
+from psycopg2.pool import ThreadedConnectionPool, PoolError
 from datetime import datetime, timezone, timedelta
+from .summary import normalize_summary
 
 
 KST = timezone(timedelta(hours=9))
 
+# 커넥션 풀 — warm 인스턴스 간 재사용. 서버리스 인스턴스 수 × POOL_MAX가
+# Postgres max_connections를 넘지 않게 작게 유지.
+POOL_MIN = int(os.environ.get("DB_POOL_MIN", "1"))
+POOL_MAX = int(os.environ.get("DB_POOL_MAX", "4"))
+POOL_WAIT_SEC = float(os.environ.get("DB_POOL_WAIT_SEC", "10"))
+CONNECT_TIMEOUT_SEC = 5
+# 이 시간 이상 놀던 커넥션은 꺼내기 전에 SELECT 1로 생존 확인 (PG 재시작·idle kill 대비)
+HEALTHCHECK_IDLE_SEC = 30
 
-def get_conn():
-    return psycopg2.connect(os.environ["POSTGRES_URL"])
+_pool = None
+_pool_lock = threading.Lock()
+_pool_slots = threading.BoundedSemaphore(POOL_MAX)
+_last_used = {}  # id(conn) → 마지막 반납 시각(monotonic)
 
 
-def init_db():
-    conn = get_conn()
-    try:
-        cur = conn.cursor()
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS news (
-                id SERIAL PRIMARY KEY,
-                region TEXT NOT NULL,
-                category TEXT NOT NULL DEFAULT 'general',
-                summary TEXT NOT NULL,
-                sources TEXT NOT NULL,
-                created_at TEXT NOT NULL,
-                dialogue TEXT
-            )
-        """)
-        # 기존 테이블에 category 컬럼이 없으면 추가
-        cur.execute("""
-            DO $$
-            BEGIN
-                IF NOT EXISTS (
-                    SELECT 1 FROM information_schema.columns
-                    WHERE table_name = 'news' AND column_name = 'category'
-                ) THEN
-                    ALTER TABLE news ADD COLUMN category TEXT NOT NULL DEFAULT 'general';
-                END IF;
-            END $$;
-        """)
-        # dialogue 컬럼이 없으면 추가
-        cur.execute("""
-            DO $$
-            BEGIN
-                IF NOT EXISTS (
-                    SELECT 1 FROM information_schema.columns
-                    WHERE table_name = 'news' AND column_name = 'dialogue'
-                ) THEN
-                    ALTER TABLE news ADD COLUMN dialogue TEXT;
-                END IF;
-            END $$;
-        """)
-        conn.commit()
-        cur.close()
-    finally:
-        conn.close()
+def _get_pool() -> ThreadedConnectionPool:
+    global _pool
+    if _pool is None or _pool.closed:
+        with _pool_lock:
+            if _pool is None or _pool.closed:
+                _pool = ThreadedConnectionPool(
+                    POOL_MIN, POOL_MAX, os.environ["POSTGRES_URL"],
+                    connect_timeout=CONNECT_TIMEOUT_SEC,
+                )
+    return _pool
 
 
-def init_chat_db():
-    """chat_usage 테이블 생성 (일일 AI 채팅 사용량 추적)."""
-    conn = get_conn()
+def _is_alive(conn) -> bool:
+    if conn.closed:
+        return False
+    last = _last_used.get(id(conn))
+    if last is None or time.monotonic() - last < HEALTHCHECK_IDLE_SEC:
+        return True
     try:
         cur = conn.cursor()
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS chat_usage (
-                user_id TEXT NOT NULL,
-                date TEXT NOT NULL,
-                count INTEGER NOT NULL DEFAULT 0,
-                PRIMARY KEY (user_id, date)
-            )
-        """)
-        conn.commit()
+        cur.execute("SELECT 1")
         cur.close()
-    finally:
-        conn.close()
+        conn.rollback()
+        return True
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        return False
+
+
+def _checkout():
+    """풀에서 살아있는 커넥션 하나 확보. 죽은 커넥션은 버리고 새로 연결."""
+    pool = _get_pool()
+    # 풀 크기(POOL_MAX)를 넘는 요청은 PoolError 대신 잠시 대기
+    for _ in range(POOL_MAX + 1):
+        conn = pool.getconn()
+        if _is_alive(conn):
+            return conn
+        _last_used.pop(id(conn), None)
+        pool.putconn(conn, close=True)
+    raise PoolError("healthy connection unavailable")
+
+
+def _release(conn, broken: bool = False):
+    pool = _get_pool()
+    if broken or conn.closed:
+        _last_used.pop(id(conn), None)
+        pool.putconn(conn, close=True)
+    else:
+        _last_used[id(conn)] = time.monotonic()
+        pool.putconn(conn)
 
 
-def increment_chat_usage(user_id: str) -> int:
-    """KST 오늘 날짜 기준 사용량 +1 후 누적 count 반환.
+@contextmanager
+def connection(conn=None):
+    """풀 커넥션 컨텍스트. 정상 종료 시 commit, 예외 시 rollback 후 반납.
 
-    INSERT ... ON CONFLICT DO UPDATE (원자적 UPSERT) — 동시 요청에도 안전.
+    conn을 넘기면 그 커넥션을 그대로 쓰고 commit/반납은 바깥 호출자 몫
+    (여러 헬퍼를 한 트랜잭션으로 묶을 때)::
+
+        with connection() as conn:
+            save_news(..., conn=conn)
+            update_dialogue(..., conn=conn)
     """
-    today = datetime.now(KST).strftime("%Y-%m-%d")
-    conn = get_conn()
+    if conn is not None:
+        yield conn
+        return
+    if not _pool_slots.acquire(timeout=POOL_WAIT_SEC):
+        raise PoolError(f"connection pool exhausted (max={POOL_MAX})")
     try:
+        conn = _checkout()
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        except BaseException:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            _release(conn, broken=broken)
+    finally:
+        _pool_slots.release()
+
+
+def save_news(region: str, category: str, summary: str, sources: str,
+              dialogue: str | None = None, conn=None) -> int:
+    """뉴스 row 저장 후 새 id 반환 (RETURNING — 재조회·동시 cron 오인 없음).
+    summary는 레거시 TEXT 그대로 + 정규화본을 summary_json에 함께 저장."""
+    with connection(conn) as conn:
         cur = conn.cursor()
         cur.execute(
-            """
-            INSERT INTO chat_usage (user_id, date, count)
-            VALUES (%s, %s, 1)
-            ON CONFLICT (user_id, date)
-            DO UPDATE SET count = chat_usage.count + 1
-            RETURNING count
-            """,
-            (user_id, today),
+            "INSERT INTO news (region, category, summary, summary_json, sources, created_at, dialogue) VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING id",
+            (region, category, summary, Json(normalize_summary(summary)), sources,
+             datetime.now(KST).isoformat(), dialogue),
         )
-        count = cur.fetchone()[0]
-        conn.commit()
+        news_id = cur.fetchone()[0]
         cur.close()
-        return count
-    finally:
-        conn.close()
+        return news_id
 
 
-def save_news(region: str, category: str, summary: str, sources: str, dialogue: str | None = None):
-    conn = get_conn()
-    try:
+def invalidate_briefing_cache(news_id: int, conn=None):
+    """news row가 바뀌면 그 row로 렌더한 /api/news 캐시(briefing_cache) 삭제 —
+    다음 요청이 다시 렌더. 각 인스턴스의 L1 메모는 MEMO_TTL_SEC 안에 만료."""
+    with connection(conn) as conn:
         cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO news (region, category, summary, sources, created_at, dialogue) VALUES (%s, %s, %s, %s, %s, %s)",
-            (region, category, summary, sources, datetime.now(KST).isoformat(), dialogue),
-        )
-        conn.commit()
+        cur.execute("DELETE FROM briefing_cache WHERE news_id = %s", (news_id,))
         cur.close()
-    finally:
-        conn.close()
 
 
-def update_summary(news_id: int, summary: str):
+def mark_news_enriched(news_id: int, conn=None):
+    """후처리 쓰기 완료 표시 — 이후부터 이 row의 브리핑 렌더를 캐시함."""
+    with connection(conn) as conn:
+        cur = conn.cursor()
+        cur.execute("UPDATE news SET enriched_at = now() WHERE id = %s", (news_id,))
+        cur.close()
+
+
+def update_summary(news_id: int, summary: str, conn=None):
     """기존 뉴스 row의 summary 교체 (개념 추출 후 quiz에 concept_ids 주입용)."""
-    conn = get_conn()
-    try:
+    with connection(conn) as conn:
         cur = conn.cursor()
         cur.execute(
-            "UPDATE news SET summary = %s WHERE id = %s",
-            (summary, news_id),
+            "UPDATE news SET summary = %s, summary_json = %s WHERE id = %s",
+            (summary, Json(normalize_summary(summary)), news_id),
         )
-        conn.commit()
         cur.close()
-    finally:
-        conn.close()
+        invalidate_briefing_cache(news_id, conn=conn)
 
 
-def update_dialogue(news_id: int, dialogue: str):
+def update_dialogue(news_id: int, dialogue: str, conn=None):
     """기존 뉴스 row에 dialogue를 나중에 추가/교체."""
-    conn = get_conn()
-    try:
+    with connection(conn) as conn:
         cur = conn.cursor()
         cur.execute(
             "UPDATE news SET dialogue = %s WHERE id = %s",
             (dialogue, news_id),
         )
-        conn.commit()
         cur.close()
-    finally:
-        conn.close()
+        invalidate_briefing_cache(news_id, conn=conn)
 
 
-def get_today_news(region: str, category: str = "general"):
-    """오늘 날짜에 저장된 뉴스 목록 반환 (중복 방지용)"""
-    conn = get_conn()
-    try:
+def get_today_titles(region: str, category: str = "general") -> list:
+    """오늘 저장된 뉴스들의 기사 제목 목록 (중복 방지용).
+    summary_json에서 제목만 투영하고, 백필 전 레거시 행만 파이썬에서 파싱."""
+    with connection() as conn:
         cur = conn.cursor()
         today = datetime.now(KST).strftime("%Y-%m-%d")
         cur.execute(
-            "SELECT summary FROM news WHERE region = %s AND category = %s AND created_at LIKE %s ORDER BY created_at ASC",
-            (region, category, f"{today}%"),
+            """
+            SELECT jsonb_path_query_array(summary_json, '$.items[*].title'),
+                   CASE WHEN summary_json IS NULL THEN summary END
+            FROM news
+            WHERE region = %s AND category = %s AND created_kst_date = %s
+            ORDER BY created_ts ASC
+            """,
+            (region, category, today),
         )
         rows = cur.fetchall()
         cur.close()
-        return [row[0] for row in rows]
-    finally:
-        conn.close()
+    titles = []
+    for projected, legacy in rows:
+        if projected is None:
+            projected = [it.get("title") for it in normalize_summary(legacy)["items"]]
+        titles.extend(t.strip() for t in projected if isinstance(t, str) and t.strip())
+    return titles
 
 
 def get_latest_news(region: str, category: str = "general"):
-    conn = get_conn()
-    try:
+    with connection() as conn:
         cur = conn.cursor()
         cur.execute(
-            "SELECT id, region, category, summary, sources, created_at, dialogue FROM news WHERE region = %s AND category = %s ORDER BY created_at DESC LIMIT 1",
+            """
+            SELECT id, region, category, sources, created_ts, dialogue,
+                   summary_json::text, summary_json->'items', summary_json->'insight',
+                   CASE WHEN summary_json IS NULL THEN summary END,
+                   enriched_at IS NOT NULL
+            FROM news WHERE region = %s AND category = %s
+            ORDER BY created_ts DESC LIMIT 1
+            """,
             (region, category),
         )
         row = cur.fetchone()
         cur.close()
-        if row:
-            return {
-                "id": row[0],
-                "region": row[1],
-                "category": row[2],
-                "summary": row[3],
-                "sources": row[4],
-                "created_at": row[5],
-                "dialogue": row[6],
-            }
-        return None
-    finally:
-        conn.close()
+    if row:
+        if row[6] is None:
+            # 백필 전 레거시 행 — 여기서만 텍스트 파싱
+            parsed = normalize_summary(row[9])
+            summary_text, items, insight = json.dumps(parsed, ensure_ascii=False), parsed["items"], parsed.get("insight", "")
+        else:
+            summary_text, items, insight = row[6], row[7], row[8]
+        return {
+            "id": row[0],
+            "region": row[1],
+            "category": row[2],
+            "summary": summary_text,  # 정규화된 JSON 문자열 (레거시 summary 필드용)
+            "items": items,
+            "insight": "" if insight is None else insight,
+            "sources": row[3],
+            # 기존 계약 유지: KST ISO 문자열
+            "created_at": row[4].astimezone(KST).isoformat(),
+            "dialogue": row[5],
+            "enriched": row[10],  # False면 후처리 중 — 렌더 결과를 캐시하지 말 것
+        }
+    return None
+
+
+def backfill_summary_json(batch: int = 200, conn=None, max_batches: int | None = None) -> int:
+    """summary_json이 비어 있는 행을 배치 단위로 정규화. 채운 행 수 반환.
+    마이그레이션과 admin(구버전 인스턴스가 쓴 행 보정)에서 호출.
+    직접 연 커넥션이면 배치마다 commit, conn을 넘기면 commit은 호출 측 몫.
+    max_batches가 있으면 그 배치 수까지만 처리."""
+    filled = 0
+    owns_conn = conn is None
+    with connection(conn) as conn:
+        cur = conn.cursor()
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            cur.execute(
+                "SELECT id, summary FROM news WHERE summary_json IS NULL ORDER BY id LIMIT %s",
+                (batch,),
+            )
+            rows = cur.fetchall()
+            if not rows:
+                break
+            execute_values(
+                cur,
+                "UPDATE news SET summary_json = v.j::jsonb FROM (VALUES %s) AS v(id, j) WHERE news.id = v.id",
+                [(news_id, json.dumps(normalize_summary(summary), ensure_ascii=False))
+                 for news_id, summary in rows],
+            )
+            if owns_conn:
+                conn.commit()
+            filled += len(rows)
+            batches += 1
+        cur.close()
+    return filled
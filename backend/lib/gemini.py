@@ -1,17 +1,38 @@
+import contextvars
+import copy
 import os
 import re
 import json
+import threading
+import time
 from datetime import datetime, timezone, timedelta
 from urllib.request import Request, urlopen
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from google import genai
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeout
 from google.genai import types
-from .db import save_news, get_today_news, update_dialogue, update_summary, get_conn
-from .concepts_db import init_concepts_db, upsert_concept, add_occurrence
-
-
-GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "")
-GEMINI_MODEL = "gemini-2.5-flash"
+from .db import (
+    save_news, get_today_titles, update_dialogue, update_summary,
+    invalidate_briefing_cache, mark_news_enriched, connection,
+)
+from .concepts_db import (
+    upsert_concepts, add_occurrences, enqueue_concept_extraction,
+    claim_concept_extraction, set_concept_extraction_status, concept_extraction_progress,
+)
+from .summary import parse_summary
+from .briefing import refresh_briefing
+from .gemini_client import generate, response_text
+from .scheduler import run_jobs
+from .tracing import pipeline_run, span, current_run
+from .chat_prompt import CHAT_SYSTEM_INSTRUCTION, PREAMBLE_ACK, build_preamble
+from .chat_context import ensure_cached_content
+from .chat_response_cache import normalize_message, store_replies
+
+
+# fetch_and_store 후처리 단계별 제한 시간(초) — dialogue·개념 추출·답변 사전 생성은 병렬 실행
+DIALOGUE_TIMEOUT_SEC = 90
+CONCEPT_TIMEOUT_SEC = 90
+ANSWERS_TIMEOUT_SEC = 90
+# suggested_questions 답변을 cron에서 미리 만들어 chat 응답 캐시에 넣을지 (0이면 끔)
+PRECOMPUTE_CHAT_ANSWERS = os.environ.get("PRECOMPUTE_CHAT_ANSWERS", "1") == "1"
 
 SYSTEM_INSTRUCTION = """너는 뉴스 큐레이터이자 학습 콘텐츠 제작자다. 뉴스를 보고 싶지만 뭘 봐야 할지 모르는 한국 독자를 위해 오늘의 핵심 뉴스를 선별하고 쉽게 전달한다.
 절대 규칙:
@@ -181,21 +202,6 @@ def _resolve_all_urls(data: dict) -> dict:
     return data
 
 
-def _extract_titles_from_summaries(summaries: list) -> list:
-    """저장된 summary 목록에서 뉴스 제목 추출"""
-    titles = []
-    for raw_summary in summaries:
-        try:
-            parsed = json.loads(raw_summary)
-            for item in parsed.get("items", []):
-                title = item.get("title", "").strip()
-                if title:
-                    titles.append(title)
-        except Exception:
-            pass
-    return titles
-
-
 DIALOGUE_SYSTEM = """너는 라디오 뉴스 팟캐스트 작가다. 진행자 두 명의 자연스러운 한국어 대화를 만든다.
 
 진행자 A (지음): 친근하고 호기심 많은 진행자. 뉴스를 소개하고 질문을 던짐. 반말톤("~지", "~네", "~야").
@@ -229,27 +235,22 @@ DIALOGUE_PROMPT = """아래 오늘의 뉴스 7편과 인사이트를 보고, 두
 - 한국어 구어체"""
 
 
-def generate_dialogue(news_data: dict) -> list:
-    """뉴스 데이터로 2인 대화 스크립트 생성. 실패 시 빈 리스트."""
+def generate_dialogue(news_data: dict, cancel: threading.Event | None = None) -> list:
+    """뉴스 데이터로 2인 대화 스크립트 생성. 실패·취소 시 빈 리스트."""
     try:
         news_json = json.dumps(news_data, ensure_ascii=False)
         prompt = DIALOGUE_PROMPT.format(news_json=news_json)
-        client = genai.Client(api_key=GEMINI_API_KEY)
-        response = client.models.generate_content(
-            model=GEMINI_MODEL,
-            contents=prompt,
+        response = generate(
+            prompt,
             config=types.GenerateContentConfig(
                 system_instruction=DIALOGUE_SYSTEM,
                 temperature=0.9,
                 max_output_tokens=4000,
                 thinking_config=types.ThinkingConfig(thinking_budget=0),
             ),
+            cancel=cancel,
         )
-        raw = (response.text or "").strip()
-        if not raw and response.candidates:
-            parts = response.candidates[0].content.parts if response.candidates[0].content else []
-            text_parts = [p.text for p in parts if hasattr(p, "text") and p.text]
-            raw = "\n".join(text_parts).strip()
+        raw = response_text(response)
         if not raw:
             return []
         # JSON 추출
@@ -344,9 +345,9 @@ def _slugify(text: str) -> str:
     return s or re.sub(r"\s+", "-", (text or "").strip())
 
 
-def _extract_concepts(news_data: dict) -> dict:
+def _extract_concepts(news_data: dict, cancel: threading.Event | None = None) -> dict:
     """뉴스 데이터로 개념 + 퀴즈-개념 링크 생성.
-    반환: {"concepts": [...], "quiz_links": [...]}. 실패 시 빈 dict(cron 안 죽임)."""
+    반환: {"concepts": [...], "quiz_links": [...]}. 실패·취소 시 빈 dict(cron 안 죽임)."""
     try:
         # glossary·quiz가 프롬프트에 포함되도록 items만 슬림하게 전달.
         # quiz는 quiz_index 참조용으로 question 텍스트만 순서대로.
@@ -368,21 +369,17 @@ def _extract_concepts(news_data: dict) -> dict:
         prompt = CONCEPT_PROMPT.format(
             news_json=json.dumps(slim, ensure_ascii=False)
         )
-        client = genai.Client(api_key=GEMINI_API_KEY)
-        response = client.models.generate_content(
-            model=GEMINI_MODEL,
-            contents=prompt,
+        response = generate(
+            prompt,
             config=types.GenerateContentConfig(
                 system_instruction=CONCEPT_SYSTEM,
                 temperature=0.2,
                 max_output_tokens=4000,
                 thinking_config=types.ThinkingConfig(thinking_budget=0),
             ),
+            cancel=cancel,
         )
-        raw = (response.text or "").strip()
-        if not raw and response.candidates:
-            parts = response.candidates[0].content.parts if response.candidates[0].content else []
-            raw = "\n".join(p.text for p in parts if hasattr(p, "text") and p.text).strip()
+        raw = response_text(response)
         if not raw:
             return {}
         if raw.startswith("```"):
@@ -403,17 +400,30 @@ def _extract_concepts(news_data: dict) -> dict:
         return {}
 
 
-def extract_and_store_concepts(news_data: dict, news_id: int):
+def extract_and_store_concepts(news_data: dict, news_id: int) -> bool:
     """뉴스에서 개념 추출 → concepts upsert + concept_occurrences 기록 +
-    quiz 문항에 concept_ids 주입 후 summary 재저장.
-    fetch_and_store 끝에서 호출. 실패해도 뉴스/대화 저장에 영향 없음."""
-    init_concepts_db()
+    quiz 문항에 concept_ids 주입 후 summary 재저장 + 큐 상태 done. 백필 경로용.
+    같은 트랜잭션에서 이 row의 브리핑 캐시도 무효화 (개념이 반영된 본문으로 재렌더).
+    추출 결과가 비면 아무것도 쓰지 않고 False."""
     extracted = _extract_concepts(news_data)
+    with connection() as conn:
+        if not _store_concepts(news_data, news_id, extracted, conn):
+            return False
+        set_concept_extraction_status(news_id, "done", conn=conn)
+        invalidate_briefing_cache(news_id, conn=conn)
+    return True
+
+
+def _store_concepts(news_data: dict, news_id: int, extracted: dict, conn) -> bool:
+    """_extract_concepts 결과를 conn의 트랜잭션 안에서 적재. 중간 실패 시
+    예외를 올려 호출자가 통째로 롤백하게 함(부분 적재 없음). 개념이 0건이면 False.
+    news_data의 quiz에 concept_ids를 주입하므로 다른 단계가 news_data를
+    읽는 중에는 호출하지 말 것."""
     concepts = extracted.get("concepts") or []
     quiz_links = extracted.get("quiz_links") or []
     if not concepts:
         print("  개념 0건 — 추출 스킵")
-        return
+        return False
 
     # 기사 제목 → 매칭 검증용
     valid_titles = {
@@ -421,9 +431,8 @@ def extract_and_store_concepts(news_data: dict, news_id: int):
         for it in news_data.get("items", [])
         if it.get("title")
     }
-    session_key = _session_key()
-    slug_to_id = {}  # quiz_links 주입 시 slug → concept_id 조회용
-    stored = 0
+    rows = []
+    slug_titles = []  # (slug, 매칭된 기사 제목 목록)
     for c in concepts:
         if not isinstance(c, dict):
             continue
@@ -431,29 +440,28 @@ def extract_and_store_concepts(news_data: dict, news_id: int):
         if not display:
             continue
         slug = (c.get("slug") or "").strip() or _slugify(display)
-        try:
-            concept_id = upsert_concept(
-                slug=slug,
-                display_name=display,
-                kind=(c.get("kind") or "term").strip(),
-                domain=(c.get("domain") or "etc").strip(),
-                definition=(c.get("definition") or "").strip(),
-            )
-        except Exception as e:
-            print(f"  개념 upsert 실패 [{slug}]: {e}")
-            continue
-        slug_to_id[slug] = concept_id
+        rows.append((
+            slug,
+            display,
+            (c.get("kind") or "term").strip(),
+            (c.get("domain") or "etc").strip(),
+            (c.get("definition") or "").strip(),
+        ))
         articles = c.get("articles") or []
         matched = [t.strip() for t in articles if t.strip() in valid_titles]
         # 매칭 0이면 뉴스 전체에 1건이라도 귀속(노출 코퍼스 손실 방지)
         if not matched and valid_titles:
             matched = [next(iter(valid_titles))]
-        for title in matched:
-            try:
-                if add_occurrence(concept_id, news_id, title, session_key):
-                    stored += 1
-            except Exception as e:
-                print(f"  occurrence 실패 [{slug}/{title[:20]}]: {e}")
+        slug_titles.append((slug, matched))
+
+    # 개념 upsert 1문장 + occurrence 적재 1문장 (브리핑당 왕복 O(1))
+    slug_to_id = upsert_concepts(rows, conn=conn)  # quiz_links 주입 시에도 사용
+    pairs = [
+        (slug_to_id[slug], title)
+        for slug, titles in slug_titles if slug in slug_to_id
+        for title in titles
+    ]
+    stored = add_occurrences(news_id, pairs, _session_key(), conn=conn)
 
     # quiz_links → 해당 quiz 문항에 concept_ids 주입 (위치 기반, 문자열 매칭 없음)
     title_to_item = {
@@ -484,67 +492,239 @@ def extract_and_store_concepts(news_data: dict, news_id: int):
 
     # concept_ids가 하나라도 주입됐으면 summary 재저장
     if injected:
-        try:
-            update_summary(news_id, json.dumps(news_data, ensure_ascii=False))
-        except Exception as e:
-            print(f"  summary 재저장 실패: {e}")
+        update_summary(news_id, json.dumps(news_data, ensure_ascii=False), conn=conn)
     print(f"  개념 {len(concepts)}건, occurrence {stored}건, quiz링크 {injected}건 저장")
+    return True
 
 
-def backfill_concepts(limit: int = 5) -> dict:
-    """concept_occurrences 없는 기존 news row만 골라 개념 추출 백필 (콜드스타트 코퍼스).
-
-    Vercel 타임아웃 회피: 호출당 limit건만 처리. 멱등 — 이미 처리된 news_id는
-    NOT IN으로 제외되므로 안전하게 반복 호출 가능.
-    파싱 불가/items 없는 row는 occurrence가 안 생겨 영구히 남으므로,
-    caller는 processed==0이면 루프 종료해야 함(remaining>0이어도)."""
-    init_concepts_db()
-    conn = get_conn()
-    try:
+def _load_news_data(news_id: int) -> dict | None:
+    """백필용 news row 로드. summary_json 우선, 없으면(레거시) summary 파싱."""
+    with connection() as conn:
         cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT id, summary FROM news
-            WHERE id NOT IN (SELECT DISTINCT news_id FROM concept_occurrences)
-            ORDER BY id DESC
-            LIMIT %s
-            """,
-            (limit,),
-        )
-        rows = cur.fetchall()
-        cur.execute(
-            "SELECT COUNT(*) FROM news "
-            "WHERE id NOT IN (SELECT DISTINCT news_id FROM concept_occurrences)"
-        )
-        remaining_before = cur.fetchone()[0]
+        cur.execute("SELECT summary_json, summary FROM news WHERE id = %s", (news_id,))
+        row = cur.fetchone()
         cur.close()
-    finally:
-        conn.close()
+    if not row:
+        return None
+    data = row[0] if isinstance(row[0], dict) else parse_summary(row[1])
+    return data if isinstance(data, dict) else None
 
-    processed, skipped = 0, 0
-    for news_id, summary in rows:
-        try:
-            data = json.loads(summary) if isinstance(summary, str) else summary
-        except Exception:
-            data = None
-        if not isinstance(data, dict) or not data.get("items"):
-            skipped += 1
-            continue
+
+def _backfill_one(news_id: int) -> str:
+    """claim한 news_id 하나 처리 후 최종 상태(done/skipped/failed) 반환."""
+    try:
+        data = _load_news_data(news_id)
+        if not data or not data.get("items"):
+            # 파싱 불가/items 없음 — 재시도해도 같으므로 큐에서 뺌
+            set_concept_extraction_status(news_id, "skipped", "items 없음")
+            return "skipped"
+        if extract_and_store_concepts(data, news_id):
+            return "done"
+        set_concept_extraction_status(news_id, "failed", "개념 추출 결과 없음")
+    except Exception as e:
+        print(f"  백필 실패 [news_id={news_id}]: {e}")
         try:
-            extract_and_store_concepts(data, news_id)
-            processed += 1
-        except Exception as e:
-            print(f"  백필 실패 [news_id={news_id}]: {e}")
-            skipped += 1
+            set_concept_extraction_status(news_id, "failed", str(e))
+        except Exception as e2:
+            print(f"  백필 상태 기록 실패 [news_id={news_id}]: {e2}")
+    return "failed"
+
+
+def backfill_concepts(limit: int = 5, workers: int = 1,
+                      time_budget_sec: float | None = None) -> dict:
+    """개념 추출 백필 (콜드스타트 코퍼스) — concept_extraction_status 큐 기반.
+
+    상태 행이 없는 news를 pending으로 등록한 뒤, workers개 스레드가 각자
+    claim(FOR UPDATE SKIP LOCKED) → 추출 → done/failed/skipped 기록을 반복.
+    호출당 최대 limit건, time_budget_sec가 지나면 새 claim을 멈춤 (Vercel 타임아웃 회피).
+    Gemini 호출은 gemini_client의 공용 RPM 예산을 워커 간 공유.
+    멱등 — 중단돼도 상태가 남아 다음 호출이 이어감 (running lease 만료 후 재시도).
+    caller는 progress의 pending이 0이 되거나 processed+failed+skipped==0이면 종료."""
+    enqueued = enqueue_concept_extraction()
+    deadline = time.monotonic() + time_budget_sec if time_budget_sec else None
+    counts = {"done": 0, "failed": 0, "skipped": 0}
+    lock = threading.Lock()
+    taken = [0]
+
+    def _worker():
+        while True:
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+            with lock:
+                if taken[0] >= limit:
+                    return
+                taken[0] += 1
+            news_id = claim_concept_extraction()
+            if news_id is None:
+                return
+            with span("backfill_item", news_id=news_id) as s:
+                status = _backfill_one(news_id)
+                s.status = "ok" if status == "done" else status
+            with lock:
+                counts[status] += 1
+
+    workers = max(1, min(workers, limit))
+    with pipeline_run("backfill_concepts", limit=limit, workers=workers) as run:
+        if workers == 1:
+            _worker()
+        else:
+            run_jobs(_worker, [()] * workers, max_workers=workers)
+        run.set(enqueued=enqueued, **counts)
+
+    progress = concept_extraction_progress()
     return {
-        "processed": processed,
-        "skipped": skipped,
-        "remaining": max(0, remaining_before - processed),
+        "processed": counts["done"],
+        "failed": counts["failed"],
+        "skipped": counts["skipped"],
+        "enqueued": enqueued,
+        "remaining": progress["pending"] + progress["failed"] - progress["failed_final"],
+        "progress": progress,
     }
 
 
+ANSWERS_PROMPT = """아래 뉴스 기사마다 사용자가 기사를 보고 처음 던진 질문 목록이 있어.
+각 질문에 대해, 그 기사를 함께 보고 있는 대화에서 첫 답변을 하듯이 답해.
+
+{blocks}
+
+반드시 아래 JSON 형식으로만 출력해. 다른 텍스트 없이 JSON만.
+{{"answers": [{{"article": 1, "question": "질문 원문 그대로", "answer": "답변"}}]}}
+
+규칙:
+- 모든 질문에 답할 것. question은 목록의 문장을 그대로 복사
+- 각 answer는 해당 기사 내용만 바탕으로 (다른 기사 섞지 말 것)"""
+
+
+def _chat_preamble(item: dict) -> str | None:
+    """앱이 /api/chat에 보내는 news_context와 같은 필드로 프리앰블 생성
+    (응답 캐시 키가 실제 요청과 일치해야 히트)."""
+    return build_preamble({
+        "title": item.get("title", ""),
+        "body": item.get("body", ""),
+        "why_matters": item.get("why_matters", ""),
+        "glossary": item.get("glossary") or [],
+    })
+
+
+def precompute_answers(news_data: dict, cancel: threading.Event | None = None) -> list:
+    """모든 기사의 suggested_questions 답변을 Gemini 1회 호출로 생성.
+    반환: [(preamble, [(question, answer), ...])]. 실패·취소 시 빈 리스트(cron 안 죽임)."""
+    targets = []  # (preamble, questions)
+    for item in news_data.get("items", []):
+        questions = [q.strip() for q in item.get("suggested_questions") or []
+                     if isinstance(q, str) and q.strip()]
+        preamble = _chat_preamble(item)
+        if preamble and questions:
+            targets.append((preamble, questions))
+    if not targets:
+        return []
+
+    try:
+        blocks = []
+        for i, (preamble, questions) in enumerate(targets, 1):
+            q_lines = "\n".join(f"- {q}" for q in questions)
+            blocks.append(f"[기사 {i}]\n{preamble}\n질문:\n{q_lines}")
+        response = generate(
+            ANSWERS_PROMPT.format(blocks="\n\n".join(blocks)),
+            config=types.GenerateContentConfig(
+                system_instruction=CHAT_SYSTEM_INSTRUCTION,
+                temperature=0.8,
+                max_output_tokens=8000,
+                response_mime_type="application/json",
+                thinking_config=types.ThinkingConfig(thinking_budget=0),
+            ),
+            cancel=cancel,
+        )
+        answers = extract_json(response_text(response)).get("answers") or []
+    except Exception as e:
+        print(f"  추천 질문 답변 생성 실패: {e}")
+        return []
+
+    # 기사 번호 + 질문 원문(정규화)으로 매칭 — 목록에 없는 질문은 버림
+    wanted = [
+        {normalize_message(q): q for q in questions} for _, questions in targets
+    ]
+    pairs = [[] for _ in targets]
+    for a in answers:
+        if not isinstance(a, dict):
+            continue
+        idx = a.get("article")
+        answer = (a.get("answer") or "").strip()
+        if not isinstance(idx, int) or not 1 <= idx <= len(targets) or not answer:
+            continue
+        question = wanted[idx - 1].pop(normalize_message(a.get("question") or ""), None)
+        if question:
+            pairs[idx - 1].append((question, answer))
+    result = [(targets[i][0], p) for i, p in enumerate(pairs) if p]
+    print(f"  추천 질문 답변 {sum(len(p) for _, p in result)}건 생성")
+    return result
+
+
+def _result_within(future, deadline: float, label: str, fallback):
+    """deadline(monotonic)까지 future 결과 대기. 타임아웃/예외면 fallback."""
+    try:
+        return future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except FutureTimeout:
+        print(f"  {label} 타임아웃 — 스킵")
+        run = current_run()
+        if run is not None:
+            run.set(timeouts=run.attrs.get("timeouts", []) + [label])
+    except Exception as e:
+        print(f"  {label} 실패: {e}")
+    return fallback
+
+
+def _traced(stage: str, fn, *args):
+    """fn을 stage span으로 감싸 실행. 실패를 삼키고 빈 값을 돌려주는 단계는 status=empty."""
+    with span(stage) as s:
+        result = fn(*args)
+        if not result:
+            s.status = "empty"
+        return result
+
+
+def _run_enrichment(data: dict) -> tuple:
+    """dialogue 생성·개념 추출·추천 질문 답변 생성을 병렬 실행.
+    (dialogue_list, extracted, answers) 반환. 단계별 timeout을 넘기면 그 단계만
+    빈 결과로 처리하고, 반환 시 cancel을 켜 남은 단계의 추가 호출을 막음."""
+    started = time.monotonic()
+    executor = ThreadPoolExecutor(max_workers=3)
+    cancel = threading.Event()
+
+    def _submit(stage, fn):
+        # 단계별 span이 현재 run에 붙도록 contextvars 사본에서 실행.
+        # 단계마다 data 사본 — 타임아웃으로 버린 단계가 계속 읽는 동안에도
+        # 3)의 _store_concepts가 원본에 concept_ids를 주입할 수 있게
+        return executor.submit(contextvars.copy_context().run, _traced, stage, fn,
+                               copy.deepcopy(data), cancel)
+
+    try:
+        dialogue_f = _submit("dialogue", generate_dialogue)
+        concepts_f = _submit("concepts", _extract_concepts)
+        answers_f = _submit("answers", precompute_answers) if PRECOMPUTE_CHAT_ANSWERS else None
+        dialogue_list = _result_within(
+            dialogue_f, started + DIALOGUE_TIMEOUT_SEC, "dialogue 생성", [])
+        extracted = _result_within(
+            concepts_f, started + CONCEPT_TIMEOUT_SEC, "개념 추출", {})
+        answers = _result_within(
+            answers_f, started + ANSWERS_TIMEOUT_SEC, "추천 질문 답변", []) if answers_f else []
+    finally:
+        # 타임아웃으로 버린 단계는 다음 Gemini 호출 전에 멈춤 (진행 중인 호출은 못 끊음)
+        cancel.set()
+        executor.shutdown(wait=False)
+    return dialogue_list, extracted, answers
+
+
 def fetch_and_store(region: str = "world", category: str = "general"):
-    """Gemini로 뉴스 요약을 생성하고 DB에 저장"""
+    """Gemini로 뉴스 요약을 생성하고 DB에 저장. 저장한 news id 반환(전부 중복이면 None).
+    단계별 소요·토큰은 pipeline_runs에 기록 (tracing.py)."""
+    with pipeline_run("fetch_and_store", region=region, category=category) as run:
+        news_id = _fetch_and_store(region, category)
+        run.set(news_id=news_id)
+        return news_id
+
+
+def _fetch_and_store(region: str, category: str):
     KST = timezone(timedelta(hours=9))
     now = datetime.now(KST)
     today_str = now.strftime("%Y-%m-%d")
@@ -552,7 +732,9 @@ def fetch_and_store(region: str = "world", category: str = "general"):
 
     # 오늘 이미 저장된 뉴스 제목 추출 (중복 방지)
     exclude_instruction = ""
-    covered_titles = _extract_titles_from_summaries(get_today_news(region, category))
+    with span("covered_titles") as s:
+        covered_titles = get_today_titles(region, category)
+        s.set(count=len(covered_titles))
     if covered_titles:
         titles_str = "\n".join(f"- {t}" for t in covered_titles)
         exclude_instruction = (
@@ -569,48 +751,46 @@ def fetch_and_store(region: str = "world", category: str = "general"):
 
     prompt = PROMPT + date_instruction + exclude_instruction + FORMAT_INSTRUCTION
 
-    client = genai.Client(api_key=GEMINI_API_KEY)
-    response = client.models.generate_content(
-        model=GEMINI_MODEL,
-        contents=prompt,
-        config=types.GenerateContentConfig(
-            tools=[types.Tool(google_search=types.GoogleSearch())],
-            system_instruction=SYSTEM_INSTRUCTION,
-            thinking_config=types.ThinkingConfig(thinking_budget=0),
-        ),
-    )
-    # response.text가 None인 경우 parts에서 직접 텍스트 추출
-    raw = response.text or ""
-    if not raw and response.candidates:
-        parts = response.candidates[0].content.parts if response.candidates[0].content else []
-        text_parts = [p.text for p in parts if hasattr(p, "text") and p.text]
-        raw = "\n".join(text_parts)
-
-    data = extract_json(raw)
-    if "items" not in data:
-        raise ValueError("응답에 items 필드가 없습니다")
-
-    data = _resolve_all_urls(data)
-
-    # 배치 내 중복 제거 (동일 제목)
-    seen_titles = set()
-    unique_items = []
-    for item in data.get("items", []):
-        title = item.get("title", "").strip()
-        if title and title not in seen_titles:
-            seen_titles.add(title)
-            unique_items.append(item)
-    data["items"] = unique_items
-
-    # 저장 직전 DB 재확인 — 생성 중 추가된 뉴스와도 중복 제거
-    fresh_titles = set(_extract_titles_from_summaries(get_today_news(region, category)))
-    data["items"] = [
-        item for item in data["items"]
-        if item.get("title", "").strip() not in fresh_titles
-    ]
+    with span("search") as s:
+        response = generate(
+            prompt,
+            config=types.GenerateContentConfig(
+                tools=[types.Tool(google_search=types.GoogleSearch())],
+                system_instruction=SYSTEM_INSTRUCTION,
+                thinking_config=types.ThinkingConfig(thinking_budget=0),
+            ),
+        )
+        raw = response_text(response)
+
+        data = extract_json(raw)
+        if "items" not in data:
+            raise ValueError("응답에 items 필드가 없습니다")
+        s.set(items=len(data["items"]))
+
+    with span("resolve_urls"):
+        data = _resolve_all_urls(data)
+
+    with span("dedup") as s:
+        # 배치 내 중복 제거 (동일 제목)
+        seen_titles = set()
+        unique_items = []
+        for item in data.get("items", []):
+            title = item.get("title", "").strip()
+            if title and title not in seen_titles:
+                seen_titles.add(title)
+                unique_items.append(item)
+        data["items"] = unique_items
+
+        # 저장 직전 DB 재확인 — 생성 중 추가된 뉴스와도 중복 제거
+        fresh_titles = set(get_today_titles(region, category))
+        data["items"] = [
+            item for item in data["items"]
+            if item.get("title", "").strip() not in fresh_titles
+        ]
+        s.set(kept=len(data["items"]), dropped=len(unique_items) - len(data["items"]))
     if not data["items"]:
         print(f"[{now}] {region} [{category}] 모든 뉴스가 중복 — 저장 건너뜀")
-        return
+        return None
 
     summary = json.dumps(data, ensure_ascii=False)
     sources = json.dumps(
@@ -619,28 +799,80 @@ def fetch_and_store(region: str = "world", category: str = "general"):
         ensure_ascii=False,
     )
 
-    # 1) 뉴스 먼저 저장 (dialogue 생성 실패/타임아웃 대비)
-    save_news(region, category, summary, sources, None)
+    # 1) 뉴스 먼저 저장 (dialogue 생성 실패/타임아웃 대비). RETURNING id로
+    #    방금 쓴 row를 정확히 집음 — 같은 (region, category) cron이 겹쳐도 안전
+    with span("save_news"):
+        news_id = save_news(region, category, summary, sources, None)
     print(f"[{datetime.now(KST)}] {region} [{category}] 뉴스 저장 완료 ({len(data['items'])}건)")
 
-    # 방금 저장한 row id 확보 (dialogue·concept 둘 다 사용)
-    from .db import get_latest_news
-    latest = get_latest_news(region, category)
-    news_id = latest.get("id") if latest else None
+    # 2) dialogue 생성 + 개념 추출 + 추천 질문 답변 — 서로 독립된 Gemini 호출이라
+    #    동시에 실행. 모두 data를 읽기만 하고, 쓰기는 결과가 모인 뒤 3)에서 순차로.
+    dialogue_list, extracted, answers = _run_enrichment(data)
 
-    # 2) dialogue 생성 후 같은 row를 update
-    #    별도 try로 감싸서 dialogue 실패가 cron 전체를 죽이지 않게 함
+    # 3) DB 쓰기 — dialogue update, 개념/occurrence 적재, summary 재저장,
+    #    enriched_at 표시를 한 커넥션·한 트랜잭션으로. 개념 단계는 savepoint로
+    #    감싸 실패해도 dialogue는 남기고, 어느 쪽 실패도 cron 전체를 죽이지 않게 함.
+    #    enriched_at 전까지 /api/news는 이 row를 렌더만 하고 캐시하지 않음
     try:
-        dialogue_list = generate_dialogue(data)
-        if dialogue_list and news_id:
-            update_dialogue(news_id, json.dumps(dialogue_list, ensure_ascii=False))
+        with span("db_write"), connection() as conn:
+            if dialogue_list:
+                update_dialogue(news_id, json.dumps(dialogue_list, ensure_ascii=False), conn=conn)
+            if extracted:
+                cur = conn.cursor()
+                cur.execute("SAVEPOINT concepts")
+                try:
+                    if _store_concepts(data, news_id, extracted, conn):
+                        set_concept_extraction_status(news_id, "done", conn=conn)
+                    cur.execute("RELEASE SAVEPOINT concepts")
+                except Exception as e:
+                    cur.execute("ROLLBACK TO SAVEPOINT concepts")
+                    print(f"  개념 저장 스킵: {e}")
+                cur.close()
+            if answers:
+                # 첫 질문이 추천 질문과 같으면 /api/chat이 바로 응답하도록 캐시 시딩
+                cur = conn.cursor()
+                cur.execute("SAVEPOINT answers")
+                try:
+                    for preamble, pairs in answers:
+                        store_replies(CHAT_SYSTEM_INSTRUCTION, preamble, pairs,
+                                      news_id=news_id, precomputed=True, conn=conn)
+                    cur.execute("RELEASE SAVEPOINT answers")
+                except Exception as e:
+                    cur.execute("ROLLBACK TO SAVEPOINT answers")
+                    print(f"  추천 질문 답변 저장 스킵: {e}")
+                cur.close()
+            mark_news_enriched(news_id, conn=conn)
+        if dialogue_list:
             print(f"  대화 {len(dialogue_list)}턴 저장 완료")
     except Exception as e:
-        print(f"  dialogue 생성/저장 스킵: {e}")
+        print(f"  후처리 저장 실패(롤백): {e}")
+        # 더 채워질 내용이 없으므로 지금 본문을 캐시해도 됨 (이후 백필은 캐시 무효화)
+        try:
+            mark_news_enriched(news_id)
+        except Exception as e2:
+            print(f"  enriched_at 표시 실패: {e2}")
+
+    # 4) 기사별 채팅 컨텍스트 캐시 미리 생성 — /api/chat은 조회만 함.
+    #    최소 토큰 미달 기사는 API 호출 없이 건너뜀
+    with span("context_cache") as s:
+        created = 0
+        for item in data["items"]:
+            preamble = _chat_preamble(item)
+            if not preamble:
+                continue
+            try:
+                if ensure_cached_content(CHAT_SYSTEM_INSTRUCTION, preamble, PREAMBLE_ACK,
+                                         news_id=news_id, title=item.get("title")):
+                    created += 1
+            except Exception as e:
+                print(f"  컨텍스트 캐시 생성 스킵: {str(e)[:120]}")
+        s.set(cached=created)
 
-    # 3) 개념 추출 → 학습 코퍼스 적재 (별도 try, 실패해도 무해)
+    # 5) /api/news 렌더 캐시 교체 (dialogue·concept_ids 반영본)
     try:
-        if news_id:
-            extract_and_store_concepts(data, news_id)
+        with span("refresh_briefing"):
+            refresh_briefing(region, category)
     except Exception as e:
-        print(f"  개념 추출/저장 스킵: {e}")
+        print(f"  briefing 캐시 갱신 스킵: {e}")
+
+    return news_id
@@ -0,0 +1,171 @@
+"""프로세스 공용 Gemini 클라이언트 — 커넥션 재사용 + 재시도 + 응답 텍스트 추출.
+
+genai.Client는 내부에 HTTP 커넥션 풀을 들고 있으므로 호출마다 새로 만들면
+매번 TLS 핸드셰이크를 다시 한다. get_client()로 warm 인스턴스 동안 하나를 공유.
+
+- GEMINI_TIMEOUT_SEC: 요청 타임아웃 (generate()의 timeout으로 호출별 재지정 가능)
+- GEMINI_MAX_RETRIES: 429/5xx·연결 오류 재시도 횟수 (지수 백오프 + full jitter)
+- GEMINI_RPM: 분당 호출 예산 — cron 병렬 팬아웃 등 프로세스 전체에서 공유
+- GEMINI_BASE_URL: 엔드포인트 교체. devtools/fake_gemini.py 로컬 서버로 오프라인 측정용
+
+토큰 사용량(usage_metadata)·재시도·예산 대기는 tracing의 현재 span에 기록.
+"""
+
+import os
+import random
+import threading
+import time
+import httpx
+from google import genai
+from google.genai import errors, types
+from .scheduler import RateBudget
+from .tracing import record_budget_wait, record_retry, record_usage
+
+
+GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "")
+GEMINI_MODEL = "gemini-2.5-flash"
+GEMINI_BASE_URL = os.environ.get("GEMINI_BASE_URL", "")
+GEMINI_TIMEOUT_SEC = float(os.environ.get("GEMINI_TIMEOUT_SEC", "120"))
+GEMINI_MAX_RETRIES = int(os.environ.get("GEMINI_MAX_RETRIES", "3"))
+GEMINI_RPM = int(os.environ.get("GEMINI_RPM", "60"))
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+BACKOFF_BASE_SEC = 1.0
+BACKOFF_CAP_SEC = 20.0
+
+_client = None
+_client_lock = threading.Lock()
+_budget = RateBudget(GEMINI_RPM)
+
+
+def _http_options(timeout_sec: float) -> types.HttpOptions:
+    options = types.HttpOptions(timeout=int(timeout_sec * 1000))
+    if GEMINI_BASE_URL:
+        options.base_url = GEMINI_BASE_URL
+    return options
+
+
+def get_client() -> genai.Client:
+    """지연 생성되는 프로세스 공용 클라이언트 (스레드 안전)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = genai.Client(
+                    api_key=GEMINI_API_KEY,
+                    http_options=_http_options(GEMINI_TIMEOUT_SEC),
+                )
+    return _client
+
+
+def _is_retryable(e: Exception) -> bool:
+    if isinstance(e, errors.APIError):
+        return e.code in RETRY_STATUS
+    return isinstance(e, httpx.TransportError)
+
+
+def _backoff(attempt: int) -> float:
+    return random.uniform(0, min(BACKOFF_CAP_SEC, BACKOFF_BASE_SEC * 2 ** attempt))
+
+
+def _acquire_budget():
+    waited = time.monotonic()
+    _budget.acquire()
+    record_budget_wait(time.monotonic() - waited)
+
+
+def _with_timeout(config, timeout):
+    if timeout is None:
+        return config
+    config = config or types.GenerateContentConfig()
+    config.http_options = _http_options(timeout)
+    return config
+
+
+class Cancelled(Exception):
+    """cancel 이벤트가 켜져 호출하지 않음 (결과를 기다리는 쪽이 이미 포기)."""
+
+
+def _check_cancel(cancel: threading.Event | None):
+    if cancel is not None and cancel.is_set():
+        raise Cancelled("cancelled")
+
+
+def generate(contents, config: types.GenerateContentConfig | None = None,
+             model: str = GEMINI_MODEL, timeout: float | None = None,
+             retries: int = GEMINI_MAX_RETRIES, use_budget: bool = True,
+             cancel: threading.Event | None = None):
+    """generate_content 래퍼. 분당 예산 대기 후 호출, 재시도 가능한 오류는
+    지수 백오프로 retries회까지 재시도. 마지막 오류는 그대로 올림.
+    유저가 기다리는 경로(chat)는 use_budget=False·적은 retries로 대기를 줄일 것.
+    cancel이 켜져 있으면 매 시도 전(예산 대기 후 포함) Cancelled — 타임아웃으로
+    버려진 단계가 예산·토큰을 계속 쓰지 않게."""
+    config = _with_timeout(config, timeout)
+    for attempt in range(retries + 1):
+        _check_cancel(cancel)
+        if use_budget:
+            _acquire_budget()
+            _check_cancel(cancel)
+        try:
+            response = get_client().models.generate_content(
+                model=model, contents=contents, config=config,
+            )
+            record_usage(response)
+            return response
+        except Exception as e:
+            if attempt >= retries or not _is_retryable(e):
+                raise
+            record_retry()
+            delay = _backoff(attempt)
+            print(f"  Gemini 재시도 {attempt + 1}/{retries} ({delay:.1f}s 후): {e}")
+            time.sleep(delay)
+
+
+def stream(contents, config: types.GenerateContentConfig | None = None,
+           model: str = GEMINI_MODEL, timeout: float | None = None,
+           retries: int = GEMINI_MAX_RETRIES, use_budget: bool = True):
+    """generate_content_stream 래퍼 — 도착하는 텍스트 조각을 그대로 yield.
+    이미 내보낸 조각은 되돌릴 수 없으므로 첫 조각 전에 난 오류만 재시도."""
+    config = _with_timeout(config, timeout)
+    for attempt in range(retries + 1):
+        if use_budget:
+            _acquire_budget()
+        emitted = False
+        last = None
+        try:
+            for chunk in get_client().models.generate_content_stream(
+                model=model, contents=contents, config=config,
+            ):
+                last = chunk
+                text = _parts_text(chunk, "")
+                if text:
+                    emitted = True
+                    yield text
+            # 누적 usage_metadata는 마지막 조각에 실림
+            if last is not None:
+                record_usage(last)
+            return
+        except Exception as e:
+            if emitted or attempt >= retries or not _is_retryable(e):
+                raise
+            record_retry()
+            delay = _backoff(attempt)
+            print(f"  Gemini 스트림 재시도 {attempt + 1}/{retries} ({delay:.1f}s 후): {e}")
+            time.sleep(delay)
+
+
+def _parts_text(response, sep: str) -> str:
+    if not response.candidates:
+        return ""
+    content = response.candidates[0].content
+    parts = content.parts if content and content.parts else []
+    return sep.join(p.text for p in parts if getattr(p, "text", None))
+
+
+def response_text(response) -> str:
+    """응답 텍스트. response.text가 None이면 candidates[0].content.parts에서
+    text 조각을 직접 이어붙임 (검색 도구 사용 시 등)."""
+    raw = (response.text or "").strip()
+    if not raw:
+        raw = _parts_text(response, "\n").strip()
+    return raw
@@ -0,0 +1,797 @@
+"""스키마 마이그레이션 — schema_version 테이블 + 프로세스 단위 래치.
+
+- 요청 경로(news/concepts/chat/admin 조회)는 check_schema()로 버전만 비교.
+  DDL·백필은 절대 실행하지 않고, 뒤처져 있으면 경고만 남김 (기능별 fail-soft).
+- 적용은 cron과 admin?action=migrate의 migrate()만.
+- 인스턴스 간 동시 적용은 pg_try_advisory_lock으로 배제 (잡지 못하면 건너뜀).
+
+새 스키마 변경은 MIGRATIONS 끝에 (버전, 이름, 함수)로 추가. 함수는 커넥션을
+받아 DDL을 실행하고, 러너가 schema_version 기록과 함께 commit한다.
+이미 적용된 마이그레이션은 절대 수정하지 말 것 (기존 DB엔 재실행 안 됨).
+대상 테이블이 없을 수 있는 변경·CONCURRENTLY 인덱스(실패 시 INVALID 잔재)는
+REPEATABLE_STEPS(멱등, migrate()마다 실행)로 보장.
+"""
+
+import threading
+import time
+from functools import partial
+import psycopg2.errors
+from .db import backfill_summary_json, connection
+from .concepts_db import PROGRESS_LOCK_NS, reconcile_user_progress
+
+
+_LOCK_KEY = 0x6A6E6577  # pg_advisory_lock 키 ('jnew')
+
+
+# CONCURRENTLY로 만드는 인덱스 (테이블, 인덱스, 정의). 빌드가 중간에 실패하면
+# INVALID 인덱스가 남고 IF NOT EXISTS가 재시도를 막으므로, 마이그레이션 기록과
+# 무관하게 REPEATABLE_STEPS의 _ensure_indexes가 매번 유효성을 확인
+NEWS_INDEXES = (
+    # 최신 1건 조회는 (region, category) 범위 역순 첫 항목 → id까지 index-only
+    ("news", "idx_news_latest", "(region, category, created_ts DESC) INCLUDE (id)"),
+    ("news", "idx_news_today", "(region, category, created_kst_date)"),
+)
+# chat_usage는 유저×날짜로 계속 쌓인 테이블 — 쓰기 막지 않게 CONCURRENTLY.
+# 없으면 rollup_chat_usage의 날짜 조회가 전체 스캔
+CHAT_USAGE_INDEXES = (
+    ("chat_usage", "idx_chat_usage_date", "(date)"),
+)
+# users·app_reviews는 앱 쪽에서 만드는 테이블 — 생긴 뒤의 migrate()에서 생성
+ADMIN_LISTING_INDEXES = (
+    ("users", "idx_users_created", "(created_at DESC, id DESC)"),
+    ("app_reviews", "idx_app_reviews_created", "(created_at DESC, id DESC)"),
+)
+
+
+def _ensure_indexes(conn, indexes):
+    """indexes의 CONCURRENTLY 인덱스 보장. 테이블이 있는 것 중 인덱스가 없거나
+    INVALID(빌드 실패 잔재)인 것만 DROP/CREATE INDEX CONCURRENTLY로 (재)생성.
+    멱등 — 할 일이 없으면 카탈로그 조회만 하고 끝남."""
+    cur = conn.cursor()
+    missing = []
+    for table, index, definition in indexes:
+        cur.execute("SELECT to_regclass(%s)", (table,))
+        if cur.fetchone()[0] is None:
+            continue
+        cur.execute("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)", (index,))
+        row = cur.fetchone()
+        if row is None or not row[0]:
+            missing.append((table, index, definition, row is not None))
+    if not missing:
+        cur.close()
+        return
+    conn.commit()
+    conn.autocommit = True
+    try:
+        for table, index, definition, invalid in missing:
+            if invalid:
+                print(f"  INVALID 인덱스 재생성: {index}")
+                cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index}")
+            cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index} ON {table} {definition}")
+            print(f"  인덱스 생성: {index}")
+    finally:
+        conn.autocommit = False
+    cur.close()
+
+
+def _m1_news(conn):
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS news (
+            id SERIAL PRIMARY KEY,
+            region TEXT NOT NULL,
+            category TEXT NOT NULL DEFAULT 'general',
+            summary TEXT NOT NULL,
+            sources TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            dialogue TEXT
+        )
+    """)
+    # 레거시 테이블 보정 (category/dialogue 컬럼이 나중에 추가됨)
+    cur.execute(
+        "ALTER TABLE news ADD COLUMN IF NOT EXISTS category TEXT NOT NULL DEFAULT 'general'"
+    )
+    cur.execute("ALTER TABLE news ADD COLUMN IF NOT EXISTS dialogue TEXT")
+    cur.close()
+
+
+def _m2_chat_usage(conn):
+    """일일 AI 채팅 사용량 추적."""
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS chat_usage (
+            user_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, date)
+        )
+    """)
+    cur.close()
+
+
+def _m3_concepts(conn):
+    """개념 학습 3테이블 (concepts_db.py 참고)."""
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS concepts (
+            id SERIAL PRIMARY KEY,
+            slug TEXT UNIQUE NOT NULL,
+            display_name TEXT NOT NULL,
+            kind TEXT NOT NULL DEFAULT 'term',
+            domain TEXT NOT NULL DEFAULT 'etc',
+            definition TEXT NOT NULL DEFAULT '',
+            occurrence_count INTEGER NOT NULL DEFAULT 0,
+            first_seen_at TEXT NOT NULL,
+            last_seen_at TEXT NOT NULL
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS concept_occurrences (
+            id SERIAL PRIMARY KEY,
+            concept_id INTEGER NOT NULL REFERENCES concepts(id) ON DELETE CASCADE,
+            news_id INTEGER NOT NULL REFERENCES news(id) ON DELETE CASCADE,
+            article_title TEXT NOT NULL DEFAULT '',
+            session_key TEXT NOT NULL DEFAULT '',
+            created_at TEXT NOT NULL,
+            UNIQUE (concept_id, news_id, article_title)
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS user_concept_mastery (
+            user_id TEXT NOT NULL,
+            concept_id INTEGER NOT NULL REFERENCES concepts(id) ON DELETE CASCADE,
+            exposure_count INTEGER NOT NULL DEFAULT 0,
+            srs_stage INTEGER NOT NULL DEFAULT 0,
+            next_review_date TEXT,
+            mastered BOOLEAN NOT NULL DEFAULT FALSE,
+            first_exposed_at TEXT NOT NULL,
+            last_result_at TEXT,
+            mastered_at TEXT,
+            PRIMARY KEY (user_id, concept_id)
+        )
+    """)
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_ucm_user_due "
+        "ON user_concept_mastery (user_id, next_review_date)"
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_co_news ON concept_occurrences (news_id)"
+    )
+    cur.close()
+
+
+def _m4_briefing_cache(conn):
+    """/api/news 렌더 결과 캐시 (briefing.py 참고)."""
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS briefing_cache (
+            region TEXT NOT NULL,
+            category TEXT NOT NULL,
+            news_id INTEGER NOT NULL REFERENCES news(id) ON DELETE CASCADE,
+            etag TEXT NOT NULL,
+            body BYTEA NOT NULL,
+            rendered_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (region, category)
+        )
+    """)
+    cur.close()
+
+
+def _m5_news_timestamps(conn):
+    """news.created_at(TEXT ISO 문자열) → created_ts(timestamptz) + KST 날짜 생성 컬럼.
+
+    온라인 백필: 배치마다 commit해 긴 row lock 없이 채우고, 인덱스는
+    CONCURRENTLY로 생성. 레거시 created_at 텍스트는 구버전 인스턴스 호환용으로 유지.
+    """
+    cur = conn.cursor()
+    cur.execute("ALTER TABLE news ADD COLUMN IF NOT EXISTS created_ts TIMESTAMPTZ")
+    cur.execute("ALTER TABLE news ALTER COLUMN created_ts SET DEFAULT now()")
+    conn.commit()
+    while True:
+        cur.execute("""
+            UPDATE news SET created_ts = created_at::timestamptz
+            WHERE id IN (SELECT id FROM news WHERE created_ts IS NULL LIMIT 500)
+        """)
+        updated = cur.rowcount
+        conn.commit()
+        if updated == 0:
+            break
+    cur.execute("ALTER TABLE news ALTER COLUMN created_ts SET NOT NULL")
+    # "오늘" 조회용. timezone(text, timestamptz)는 IMMUTABLE이라 생성 컬럼 가능
+    cur.execute("""
+        ALTER TABLE news ADD COLUMN IF NOT EXISTS created_kst_date DATE
+        GENERATED ALWAYS AS ((created_ts AT TIME ZONE 'Asia/Seoul')::date) STORED
+    """)
+    conn.commit()
+    cur.close()
+    _ensure_indexes(conn, NEWS_INDEXES)
+
+
+def _m6_srs_apply_reviews(conn):
+    """Leitner 전이를 단일 upsert로 수행하는 저장 함수 (concepts_db.record_reviews).
+
+    ON CONFLICT DO UPDATE의 SET 식은 모두 기존 행(u) 기준으로 평가됨.
+    간격 배열은 1-based라 p_intervals[stage] = INTERVAL_DAYS[stage - 1].
+    """
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION srs_apply_reviews(
+            p_user TEXT, p_concepts INTEGER[], p_correct BOOLEAN[],
+            p_today DATE, p_now TEXT, p_intervals INTEGER[], p_max_stage INTEGER
+        ) RETURNS TABLE (r_concept_id INTEGER, r_stage INTEGER, r_mastered BOOLEAN)
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            FOR i IN 1 .. COALESCE(array_length(p_concepts, 1), 0) LOOP
+                CONTINUE WHEN NOT EXISTS (
+                    SELECT 1 FROM concepts c WHERE c.id = p_concepts[i]
+                );
+                INSERT INTO user_concept_mastery AS u
+                    (user_id, concept_id, exposure_count, srs_stage,
+                     next_review_date, mastered, first_exposed_at, last_result_at)
+                VALUES (p_user, p_concepts[i], 0, 1,
+                        to_char(p_today + p_intervals[1], 'YYYY-MM-DD'),
+                        FALSE, p_now, p_now)
+                ON CONFLICT (user_id, concept_id) DO UPDATE SET
+                    srs_stage = CASE
+                        WHEN NOT p_correct[i] THEN 1
+                        WHEN u.srs_stage >= p_max_stage THEN u.srs_stage
+                        ELSE u.srs_stage + 1 END,
+                    next_review_date = CASE
+                        WHEN NOT p_correct[i]
+                            THEN to_char(p_today + p_intervals[1], 'YYYY-MM-DD')
+                        WHEN u.srs_stage >= p_max_stage THEN u.next_review_date
+                        ELSE to_char(p_today + p_intervals[u.srs_stage + 1], 'YYYY-MM-DD') END,
+                    mastered = CASE
+                        WHEN NOT p_correct[i] THEN FALSE
+                        WHEN u.srs_stage >= p_max_stage THEN TRUE
+                        ELSE u.mastered END,
+                    mastered_at = CASE
+                        WHEN p_correct[i] AND u.srs_stage >= p_max_stage
+                            THEN COALESCE(u.mastered_at, p_now)
+                        ELSE u.mastered_at END,
+                    last_result_at = p_now
+                RETURNING u.concept_id, u.srs_stage, u.mastered
+                INTO r_concept_id, r_stage, r_mastered;
+                RETURN NEXT;
+            END LOOP;
+        END
+        $$
+    """)
+    cur.close()
+
+
+def _m7_user_progress_counters(conn):
+    """유저별 진척 카운터 테이블 + user_concept_mastery 트리거로 증분 유지.
+
+    트리거는 OLD 기여분을 빼고 NEW 기여분을 더함 (노출 카운트만 바뀌는
+    UPDATE는 WHEN 조건으로 건너뜀). 트리거 생성이 테이블 쓰기를 막는 동안
+    같은 트랜잭션에서 전체 재계산해 시작값을 맞춤.
+    """
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS user_progress_summary (
+            user_id TEXT PRIMARY KEY,
+            encountered INTEGER NOT NULL DEFAULT 0,
+            mastered INTEGER NOT NULL DEFAULT 0,
+            learning INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS user_progress_domain (
+            user_id TEXT NOT NULL,
+            domain TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            mastered INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, domain)
+        )
+    """)
+    # 미마스터 개념의 복습 예정일 히스토그램 — due_today = 오늘 이전 구간 합
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS user_progress_due (
+            user_id TEXT NOT NULL,
+            due_date TEXT NOT NULL,
+            n INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, due_date)
+        )
+    """)
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION ucm_progress_apply(r user_concept_mastery, sign INTEGER)
+        RETURNS void LANGUAGE plpgsql AS $$
+        DECLARE
+            d TEXT;
+        BEGIN
+            INSERT INTO user_progress_summary AS s (user_id, encountered, mastered, learning)
+            VALUES (r.user_id, sign,
+                    CASE WHEN r.mastered THEN sign ELSE 0 END,
+                    CASE WHEN r.srs_stage BETWEEN 1 AND 4 AND NOT r.mastered
+                         THEN sign ELSE 0 END)
+            ON CONFLICT (user_id) DO UPDATE SET
+                encountered = s.encountered + EXCLUDED.encountered,
+                mastered = s.mastered + EXCLUDED.mastered,
+                learning = s.learning + EXCLUDED.learning,
+                updated_at = now();
+
+            SELECT c.domain INTO d FROM concepts c WHERE c.id = r.concept_id;
+            INSERT INTO user_progress_domain AS p (user_id, domain, total, mastered)
+            VALUES (r.user_id, COALESCE(d, 'etc'), sign,
+                    CASE WHEN r.mastered THEN sign ELSE 0 END)
+            ON CONFLICT (user_id, domain) DO UPDATE SET
+                total = p.total + EXCLUDED.total,
+                mastered = p.mastered + EXCLUDED.mastered;
+
+            IF r.next_review_date IS NOT NULL AND NOT r.mastered THEN
+                INSERT INTO user_progress_due AS q (user_id, due_date, n)
+                VALUES (r.user_id, r.next_review_date, sign)
+                ON CONFLICT (user_id, due_date) DO UPDATE SET n = q.n + EXCLUDED.n;
+            END IF;
+        END
+        $$
+    """)
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION ucm_progress_trigger() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                PERFORM ucm_progress_apply(OLD, -1);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM ucm_progress_apply(NEW, 1);
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    cur.execute("DROP TRIGGER IF EXISTS ucm_progress_ins_del ON user_concept_mastery")
+    cur.execute("""
+        CREATE TRIGGER ucm_progress_ins_del
+        AFTER INSERT OR DELETE ON user_concept_mastery
+        FOR EACH ROW EXECUTE FUNCTION ucm_progress_trigger()
+    """)
+    cur.execute("DROP TRIGGER IF EXISTS ucm_progress_upd ON user_concept_mastery")
+    cur.execute("""
+        CREATE TRIGGER ucm_progress_upd
+        AFTER UPDATE ON user_concept_mastery
+        FOR EACH ROW
+        WHEN (OLD.srs_stage IS DISTINCT FROM NEW.srs_stage
+              OR OLD.mastered IS DISTINCT FROM NEW.mastered
+              OR OLD.next_review_date IS DISTINCT FROM NEW.next_review_date)
+        EXECUTE FUNCTION ucm_progress_trigger()
+    """)
+    cur.close()
+    reconcile_user_progress(conn=conn)
+
+
+def _m8_chat_sessions(conn):
+    """서버 측 채팅 세션 (chat_sessions.py 참고). 만료분은 cron이 정리."""
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS chat_sessions (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            preamble TEXT,
+            history JSONB NOT NULL DEFAULT '[]',
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            expires_at TIMESTAMPTZ NOT NULL
+        )
+    """)
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_chat_sessions_expires ON chat_sessions (expires_at)"
+    )
+    cur.close()
+
+
+def _m9_chat_context_cache(conn):
+    """기사별 Gemini cachedContent 매핑 (chat_context.py 참고). cron이 만든 캐시만
+    기록. cache_name NULL은 요청 경로가 생성하던 때의 '거절됨' 행 (TTL로 사라짐)."""
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS chat_context_cache (
+            cache_key TEXT PRIMARY KEY,
+            news_id INTEGER,
+            title TEXT,
+            cache_name TEXT,
+            expires_at TIMESTAMPTZ NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+    cur.close()
+
+
+def _m10_chat_response_cache(conn):
+    """첫 턴 채팅 응답 캐시 (chat_response_cache.py 참고)."""
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS chat_response_cache (
+            cache_key TEXT PRIMARY KEY,
+            news_id INTEGER,
+            message TEXT NOT NULL,
+            reply TEXT NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            misses INTEGER NOT NULL DEFAULT 1,
+            expires_at TIMESTAMPTZ NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+    cur.close()
+
+
+def _m11_chat_usage_rollup(conn):
+    """chat_usage 정리용 날짜 인덱스 + 날짜별 롤업 테이블 (chat_quota.py 참고)."""
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS chat_usage_daily (
+            date TEXT PRIMARY KEY,
+            users INTEGER NOT NULL DEFAULT 0,
+            messages INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.commit()
+    cur.close()
+    _ensure_indexes(conn, CHAT_USAGE_INDEXES)
+
+
+def _m12_rate_limits(conn):
+    """공유 rate limit 카운터 (ratelimit.py 참고). 유실돼도 되는 값이라 UNLOGGED —
+    WAL을 안 쓰므로 요청마다의 UPSERT가 가벼움 (크래시 시 비워짐)."""
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE UNLOGGED TABLE IF NOT EXISTS rate_limits (
+            bucket TEXT PRIMARY KEY,
+            window_start BIGINT NOT NULL,
+            prev INTEGER NOT NULL DEFAULT 0,
+            curr INTEGER NOT NULL DEFAULT 0,
+            touched_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+    cur.close()
+
+
+def _m13_news_summary_json(conn):
+    """news.summary(TEXT) → summary_json(JSONB) 정규화본 (summary.py 참고).
+
+    쓰기 경로가 함께 채우고, 기존 행은 배치 commit으로 온라인 백필. 배포 중
+    구버전 인스턴스가 NULL로 쓸 수 있어 NOT NULL은 걸지 않음 (읽기 측 폴백 +
+    admin backfill_summary_json으로 보정).
+    """
+    cur = conn.cursor()
+    cur.execute("ALTER TABLE news ADD COLUMN IF NOT EXISTS summary_json JSONB")
+    cur.close()
+    conn.commit()
+    # 배치마다 commit — 마이그레이션 트랜잭션을 길게 잡지 않음
+    while backfill_summary_json(conn=conn, max_batches=1):
+        conn.commit()
+
+
+def _m14_concept_extraction_status(conn):
+    """개념 추출 백필 큐 (concepts_db.py 참고). 기존 뉴스는 occurrence 유무로
+    done/pending 시드 — 이후엔 큐 상태만 보고 NOT IN 전체 스캔은 하지 않음."""
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS concept_extraction_status (
+            news_id INTEGER PRIMARY KEY REFERENCES news(id) ON DELETE CASCADE,
+            status TEXT NOT NULL DEFAULT 'pending'
+                CHECK (status IN ('pending', 'running', 'done', 'failed', 'skipped')),
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+    # done은 큐 조회 대상이 아니므로 부분 인덱스
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_ces_queue ON concept_extraction_status (status, news_id DESC)
+        WHERE status <> 'done'
+    """)
+    cur.execute("""
+        INSERT INTO concept_extraction_status (news_id, status)
+        SELECT n.id,
+               CASE WHEN EXISTS (SELECT 1 FROM concept_occurrences o WHERE o.news_id = n.id)
+                    THEN 'done' ELSE 'pending' END
+        FROM news n
+        ON CONFLICT (news_id) DO NOTHING
+    """)
+    cur.close()
+
+
+def _m15_admin_listing_indexes(conn):
+    """관리자 유저·리뷰 목록 keyset 페이지네이션용 (created_at DESC, id DESC) 인덱스.
+    테이블이 아직 없을 수 있어 REPEATABLE_STEPS가 매 migrate()마다 다시 보장."""
+    _ensure_indexes(conn, ADMIN_LISTING_INDEXES)
+
+
+def _m16_admin_stats_snapshots(conn):
+    """관리자 통계 스냅샷 (admin_stats.py 참고). kind별 시(hour) 버킷당 최대 1행."""
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS admin_stats_snapshots (
+            kind TEXT NOT NULL,
+            taken_at TIMESTAMPTZ NOT NULL,
+            stats JSONB NOT NULL,
+            PRIMARY KEY (kind, taken_at)
+        )
+    """)
+    cur.close()
+
+
+def _m17_pipeline_runs(conn):
+    """파이프라인 실행 계측 기록 (tracing.py 참고). spans는 단계별 JSON 배열."""
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS pipeline_runs (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            status TEXT NOT NULL,
+            error TEXT,
+            attrs JSONB NOT NULL DEFAULT '{}',
+            started_at TIMESTAMPTZ NOT NULL,
+            duration_ms INTEGER,
+            prompt_tokens INTEGER NOT NULL DEFAULT 0,
+            output_tokens INTEGER NOT NULL DEFAULT 0,
+            total_tokens INTEGER NOT NULL DEFAULT 0,
+            retries INTEGER NOT NULL DEFAULT 0,
+            spans JSONB NOT NULL DEFAULT '[]'
+        )
+    """)
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_pipeline_runs_started ON pipeline_runs (started_at DESC)"
+    )
+    cur.close()
+
+
+def _m18_news_enriched_at(conn):
+    """news.enriched_at — cron 후처리(dialogue·개념·추천 답변) 쓰기가 끝난 시각.
+    NULL인 row(후처리 중·중단)는 /api/news가 렌더만 하고 캐시하지 않음.
+    기존 행은 완료된 것으로 보고 created_ts로 배치 백필."""
+    cur = conn.cursor()
+    cur.execute("ALTER TABLE news ADD COLUMN IF NOT EXISTS enriched_at TIMESTAMPTZ")
+    conn.commit()
+    while True:
+        cur.execute("""
+            UPDATE news SET enriched_at = created_ts
+            WHERE id IN (SELECT id FROM news WHERE enriched_at IS NULL LIMIT 500)
+        """)
+        updated = cur.rowcount
+        conn.commit()
+        if updated == 0:
+            break
+    cur.close()
+
+
+def _m19_user_progress_lock(conn):
+    """진척 카운터 트리거가 유저 advisory xact lock을 먼저 잡도록 교체.
+    reconcile_user_progress(user_id)와 같은 잠금을 공유 → 재계산의 DELETE/INSERT와
+    동시 노출·복습의 카운터 upsert가 섞여 유니크 충돌·이중 계산이 나지 않음."""
+    cur = conn.cursor()
+    cur.execute(f"""
+        CREATE OR REPLACE FUNCTION ucm_progress_trigger() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            uid TEXT;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                uid := OLD.user_id;
+            ELSE
+                uid := NEW.user_id;
+            END IF;
+            PERFORM pg_advisory_xact_lock({PROGRESS_LOCK_NS}, hashtext(uid));
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                PERFORM ucm_progress_apply(OLD, -1);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM ucm_progress_apply(NEW, 1);
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    cur.close()
+
+
+def _m20_concept_delete_progress(conn):
+    """개념 삭제 시 user_progress_domain 보정. user_concept_mastery는 concepts를
+    ON DELETE CASCADE로 참조하는데, cascade로 도는 AFTER DELETE 트리거 시점엔
+    부모 행이 이미 없어 domain 조회가 NULL → 'etc'를 잘못 깎고 원래 domain은 남음.
+    → concepts BEFORE DELETE 트리거가 (부모가 있을 때) 원래 domain에서 유저별로
+    먼저 빼고, ucm 트리거는 개념이 사라진 행의 domain 갱신을 건너뜀.
+    summary·due 카운터는 mastery 행 값만 쓰므로 cascade 트리거로 그대로 맞음."""
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION ucm_progress_apply(r user_concept_mastery, sign INTEGER)
+        RETURNS void LANGUAGE plpgsql AS $$
+        DECLARE
+            d TEXT;
+        BEGIN
+            INSERT INTO user_progress_summary AS s (user_id, encountered, mastered, learning)
+            VALUES (r.user_id, sign,
+                    CASE WHEN r.mastered THEN sign ELSE 0 END,
+                    CASE WHEN r.srs_stage BETWEEN 1 AND 4 AND NOT r.mastered
+                         THEN sign ELSE 0 END)
+            ON CONFLICT (user_id) DO UPDATE SET
+                encountered = s.encountered + EXCLUDED.encountered,
+                mastered = s.mastered + EXCLUDED.mastered,
+                learning = s.learning + EXCLUDED.learning,
+                updated_at = now();
+
+            -- 개념이 없으면 concepts 삭제 cascade — domain은 BEFORE DELETE 트리거가 처리
+            SELECT c.domain INTO d FROM concepts c WHERE c.id = r.concept_id;
+            IF FOUND THEN
+                INSERT INTO user_progress_domain AS p (user_id, domain, total, mastered)
+                VALUES (r.user_id, COALESCE(d, 'etc'), sign,
+                        CASE WHEN r.mastered THEN sign ELSE 0 END)
+                ON CONFLICT (user_id, domain) DO UPDATE SET
+                    total = p.total + EXCLUDED.total,
+                    mastered = p.mastered + EXCLUDED.mastered;
+            END IF;
+
+            IF r.next_review_date IS NOT NULL AND NOT r.mastered THEN
+                INSERT INTO user_progress_due AS q (user_id, due_date, n)
+                VALUES (r.user_id, r.next_review_date, sign)
+                ON CONFLICT (user_id, due_date) DO UPDATE SET n = q.n + EXCLUDED.n;
+            END IF;
+        END
+        $$
+    """)
+    cur.execute(f"""
+        CREATE OR REPLACE FUNCTION concepts_progress_delete() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            -- 진척 트리거·reconcile과 같은 유저 잠금 (유저 순서 고정으로 교착 방지)
+            PERFORM pg_advisory_xact_lock({PROGRESS_LOCK_NS}, hashtext(u.user_id))
+            FROM (SELECT DISTINCT user_id FROM user_concept_mastery
+                  WHERE concept_id = OLD.id ORDER BY user_id) u;
+            UPDATE user_progress_domain p
+            SET total = p.total - x.n, mastered = p.mastered - x.m
+            FROM (SELECT user_id, COUNT(*) AS n, COUNT(*) FILTER (WHERE mastered) AS m
+                  FROM user_concept_mastery WHERE concept_id = OLD.id
+                  GROUP BY user_id) x
+            WHERE p.user_id = x.user_id AND p.domain = COALESCE(OLD.domain, 'etc');
+            RETURN OLD;
+        END
+        $$
+    """)
+    cur.execute("DROP TRIGGER IF EXISTS concepts_progress_del ON concepts")
+    cur.execute("""
+        CREATE TRIGGER concepts_progress_del
+        BEFORE DELETE ON concepts
+        FOR EACH ROW EXECUTE FUNCTION concepts_progress_delete()
+    """)
+    cur.close()
+    # 이미 어긋난 카운터('etc' 음수 등)는 한 번 재계산으로 정리
+    reconcile_user_progress(conn=conn)
+
+
+MIGRATIONS = [
+    (1, "news", _m1_news),
+    (2, "chat_usage", _m2_chat_usage),
+    (3, "concepts", _m3_concepts),
+    (4, "briefing_cache", _m4_briefing_cache),
+    (5, "news_timestamps", _m5_news_timestamps),
+    (6, "srs_apply_reviews", _m6_srs_apply_reviews),
+    (7, "user_progress_counters", _m7_user_progress_counters),
+    (8, "chat_sessions", _m8_chat_sessions),
+    (9, "chat_context_cache", _m9_chat_context_cache),
+    (10, "chat_response_cache", _m10_chat_response_cache),
+    (11, "chat_usage_rollup", _m11_chat_usage_rollup),
+    (12, "rate_limits", _m12_rate_limits),
+    (13, "news_summary_json", _m13_news_summary_json),
+    (14, "concept_extraction_status", _m14_concept_extraction_status),
+    (15, "admin_listing_indexes", _m15_admin_listing_indexes),
+    (16, "admin_stats_snapshots", _m16_admin_stats_snapshots),
+    (17, "pipeline_runs", _m17_pipeline_runs),
+    (18, "news_enriched_at", _m18_news_enriched_at),
+    (19, "user_progress_lock", _m19_user_progress_lock),
+    (20, "concept_delete_progress", _m20_concept_delete_progress),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# 버전과 무관하게 migrate()마다 실행하는 멱등 단계 — 앱 쪽 테이블처럼 생기는
+# 시점을 모르는 대상, 빌드 실패로 INVALID가 될 수 있는 CONCURRENTLY 인덱스용.
+# 할 일이 없으면 조회만 하고 끝나야 함
+REPEATABLE_STEPS = [
+    ("news_indexes", partial(_ensure_indexes, indexes=NEWS_INDEXES)),
+    ("chat_usage_indexes", partial(_ensure_indexes, indexes=CHAT_USAGE_INDEXES)),
+    ("admin_listing_indexes", partial(_ensure_indexes, indexes=ADMIN_LISTING_INDEXES)),
+]
+
+SCHEMA_RECHECK_SEC = 60  # 뒤처진 상태면 이 간격으로만 다시 확인
+
+_schema_ok = False
+_checked_at = None
+_latch = threading.Lock()
+
+
+def schema_version() -> int:
+    """DB에 적용된 최신 스키마 버전. schema_version 테이블 자체가 없으면 0."""
+    with connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+            return cur.fetchone()[0]
+        except psycopg2.errors.UndefinedTable:
+            conn.rollback()
+            return 0
+        finally:
+            cur.close()
+
+
+def migrate() -> list | None:
+    """대기 중 마이그레이션을 순서대로 적용하고 적용한 버전 목록 반환.
+    각 마이그레이션은 schema_version 기록과 같은 트랜잭션으로 commit.
+
+    다른 인스턴스가 적용 중이면 기다리지 않고 None. 잠금을 기다리는 세션은
+    스냅샷을 쥔 채 대기하게 되는데, 상대의 CREATE INDEX CONCURRENTLY는 오래된
+    스냅샷이 끝나길 기다리므로 서로 교착 → 인덱스 빌드가 INVALID로 중단됨.
+    그래서 잠금 시도도 트랜잭션 밖(autocommit)에서 한 번만."""
+    global _schema_ok
+    applied = []
+    with connection() as conn:
+        cur = conn.cursor()
+        conn.autocommit = True
+        try:
+            cur.execute("SELECT pg_try_advisory_lock(%s)", (_LOCK_KEY,))
+            locked = cur.fetchone()[0]
+        finally:
+            conn.autocommit = False
+        if not locked:
+            cur.close()
+            print("  마이그레이션 건너뜀: 다른 인스턴스가 적용 중")
+            return None
+        try:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                )
+            """)
+            cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+            current = cur.fetchone()[0]
+            conn.commit()
+            for version, name, fn in MIGRATIONS:
+                if version <= current:
+                    continue
+                fn(conn)
+                cur.execute(
+                    "INSERT INTO schema_version (version, name) VALUES (%s, %s)",
+                    (version, name),
+                )
+                conn.commit()
+                applied.append(version)
+                print(f"  마이그레이션 적용: v{version} {name}")
+            for name, fn in REPEATABLE_STEPS:
+                fn(conn)
+                conn.commit()
+        finally:
+            # 세션 advisory lock은 rollback으로 안 풀리므로 명시적으로 해제
+            if not conn.closed:
+                conn.rollback()
+                cur.execute("SELECT pg_advisory_unlock(%s)", (_LOCK_KEY,))
+            cur.close()
+    _schema_ok = True
+    return applied
+
+
+def check_schema() -> bool:
+    """요청 경로용 버전 확인 (적용은 하지 않음). 최신이면 프로세스당 1회로 끝나고,
+    뒤처졌거나 확인 실패면 경고 로그 후 False — SCHEMA_RECHECK_SEC마다 재확인."""
+    global _schema_ok, _checked_at
+    if _schema_ok:
+        return True
+    with _latch:
+        if _schema_ok:
+            return True
+        now = time.monotonic()
+        if _checked_at is not None and now - _checked_at < SCHEMA_RECHECK_SEC:
+            return False
+        _checked_at = now
+        try:
+            version = schema_version()
+        except Exception as e:
+            print(f"  스키마 버전 확인 실패: {e}")
+            return False
+        if version >= LATEST_VERSION:
+            _schema_ok = True
+            return True
+        print(f"  스키마 뒤처짐: DB v{version} < v{LATEST_VERSION} — "
+              "cron 또는 admin?action=migrate로 적용 필요")
+        return False
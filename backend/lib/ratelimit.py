@@ -0,0 +1,150 @@
+"""IP별 요청 제한 — 슬라이딩 윈도 카운터 (키당 O(1) 상태: 현재·직전 윈도 카운트).
+
+추정치 = 직전 윈도 카운트 × (현재 윈도에서 아직 안 지난 비율) + 현재 윈도 카운트.
+요청 시각 목록을 들고 있지 않으므로 키당 메모리가 고정이고 매 요청 정리 비용이 없다.
+
+백엔드 (RATE_LIMIT_BACKEND):
+- memory (기본): 프로세스 메모리. LRU 순서로 보관하며 max_keys를 넘거나 2윈도
+  이상 조용한 키는 제거 → 스크레이퍼 한 IP가 인스턴스 메모리를 불리지 못함.
+- postgres: UNLOGGED rate_limits 테이블에 카운터를 두어 서버리스 인스턴스 간 공유.
+  요청마다 UPSERT 1문장. DB 장애 시 memory 카운터로 fail-open. 오래된 행은 cron 정리.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from .db import connection
+
+
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "memory")
+MAX_KEYS = 10000
+
+
+def client_ip(headers, client_address) -> str:
+    """X-Forwarded-For 첫 항목(원 클라이언트), 없으면 소켓 주소."""
+    forwarded = headers.get("X-Forwarded-For", "")
+    return forwarded.split(",")[0].strip() if forwarded else client_address[0]
+
+
+def _estimate(prev: int, curr: int, window_start: int, window_sec: int, now: float) -> float:
+    elapsed = (now - window_start) / window_sec
+    return prev * (1 - elapsed) + curr
+
+
+class MemoryCounter:
+    """키별 (window_start, prev, curr)을 LRU로 보관하는 로컬 카운터."""
+
+    def __init__(self, window_sec: int, max_keys: int = MAX_KEYS):
+        self.window_sec = window_sec
+        self.max_keys = max_keys
+        self._state = OrderedDict()  # key → [window_start, prev, curr] (오래 안 쓴 순)
+        self._lock = threading.Lock()
+
+    def incr(self, key: str, now: float) -> tuple:
+        """카운트 +1 후 (window_start, prev, curr)."""
+        window_start = int(now // self.window_sec) * self.window_sec
+        with self._lock:
+            state = self._state.pop(key, None)
+            if state is None or state[0] < window_start - self.window_sec:
+                state = [window_start, 0, 0]
+            elif state[0] < window_start:
+                state = [window_start, state[2], 0]
+            state[2] += 1
+            self._state[key] = state
+            self._evict(window_start)
+            return tuple(state)
+
+    def _evict(self, window_start: int):
+        # LRU 맨 앞부터: 상한 초과분 + 2윈도 이상 조용한 키 (앞쪽이 가장 오래됨)
+        while len(self._state) > self.max_keys:
+            self._state.popitem(last=False)
+        while self._state:
+            oldest = next(iter(self._state.values()))
+            if oldest[0] >= window_start - self.window_sec:
+                break
+            self._state.popitem(last=False)
+
+    def __len__(self):
+        return len(self._state)
+
+
+class PostgresCounter:
+    """UNLOGGED rate_limits 테이블 카운터 — 인스턴스 간 공유."""
+
+    def __init__(self, name: str, window_sec: int):
+        self.name = name
+        self.window_sec = window_sec
+
+    def incr(self, key: str, now: float) -> tuple:
+        window_start = int(now // self.window_sec) * self.window_sec
+        with connection() as conn:
+            cur = conn.cursor()
+            # SET의 우변은 모두 갱신 전 값을 봄 → 윈도 전환을 한 문장으로 처리
+            cur.execute(
+                """
+                INSERT INTO rate_limits (bucket, window_start, prev, curr)
+                VALUES (%(bucket)s, %(ws)s, 0, 1)
+                ON CONFLICT (bucket) DO UPDATE SET
+                    prev = CASE
+                        WHEN rate_limits.window_start = EXCLUDED.window_start THEN rate_limits.prev
+                        WHEN rate_limits.window_start = EXCLUDED.window_start - %(win)s THEN rate_limits.curr
+                        ELSE 0 END,
+                    curr = CASE
+                        WHEN rate_limits.window_start = EXCLUDED.window_start THEN rate_limits.curr + 1
+                        ELSE 1 END,
+                    window_start = EXCLUDED.window_start,
+                    touched_at = now()
+                RETURNING window_start, prev, curr
+                """,
+                {"bucket": f"{self.name}:{key}", "ws": window_start, "win": self.window_sec},
+            )
+            row = cur.fetchone()
+            cur.close()
+        return row
+
+
+class RateLimiter:
+    """name별 한도(limit회 / window_sec초). allow(key)가 False면 429로 응답."""
+
+    def __init__(self, name: str, limit: int, window_sec: int = 60,
+                 backend: str = RATE_LIMIT_BACKEND, max_keys: int = MAX_KEYS):
+        self.name = name
+        self.limit = limit
+        self.window_sec = window_sec
+        self._local = MemoryCounter(window_sec, max_keys)
+        self._shared = PostgresCounter(name, window_sec) if backend == "postgres" else None
+
+    def retry_after(self, now: float | None = None) -> int:
+        """현재 윈도가 끝날 때까지 남은 초 (Retry-After 헤더용)."""
+        now = time.time() if now is None else now
+        return max(1, math.ceil(self.window_sec - now % self.window_sec))
+
+    def allow(self, key: str) -> bool:
+        now = time.time()
+        state = None
+        if self._shared is not None:
+            try:
+                state = self._shared.incr(key, now)
+            except Exception as e:
+                print(f"  rate limit 공유 카운터 실패 (로컬로 대체): {e}")
+        if state is None:
+            state = self._local.incr(key, now)
+        window_start, prev, curr = state
+        return _estimate(prev, curr, window_start, self.window_sec, now) <= self.limit
+
+
+def prune_rate_limits(idle_sec: int = 3600) -> int:
+    """postgres 백엔드의 오래된 카운터 행 삭제 (cron에서 호출). 삭제 건수 반환."""
+    if RATE_LIMIT_BACKEND != "postgres":
+        return 0
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "DELETE FROM rate_limits WHERE touched_at < now() - make_interval(secs => %s)",
+            (idle_sec,),
+        )
+        deleted = cur.rowcount
+        cur.close()
+    return deleted
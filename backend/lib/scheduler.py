@@ -0,0 +1,116 @@
+"""cron 팬아웃용 동시성 도구 — 동시 실행 수 제한 + 분당 호출 예산.
+
+서버리스 함수 타임아웃 안에 (region, category) 전체 갱신을 끝내기 위함.
+전체 소요 시간이 job 합계가 아닌 가장 느린 job 수준이 되도록 병렬 실행.
+"""
+
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class RateBudget:
+    """슬라이딩 윈도 호출 예산. acquire()는 윈도 안에 여유가 생길 때까지 대기.
+    per_window <= 0이면 무제한."""
+
+    def __init__(self, per_window: int, window_sec: float = 60.0):
+        self.per_window = per_window
+        self.window_sec = window_sec
+        self._calls = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: float | None = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] >= self.window_sec:
+                    self._calls.popleft()
+                if self.per_window <= 0 or len(self._calls) < self.per_window:
+                    self._calls.append(now)
+                    return True
+                wait_for = self.window_sec - (now - self._calls[0])
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait_for = min(wait_for, remaining)
+            time.sleep(max(wait_for, 0.01))
+
+
+def run_jobs(fn, jobs: list, max_workers: int = 4,
+             job_timeout: float | None = None,
+             deadline_sec: float | None = None) -> list:
+    """jobs(인자 튜플 목록)를 최대 max_workers개씩 동시에 fn(*args)로 실행.
+
+    입력 순서대로 job별 결과 반환:
+      {"args", "status": ok|error|timeout|cancelled, "result", "error", "elapsed_ms"}
+    - job_timeout: 시작 후 이 시간을 넘긴 job은 timeout 처리 (스레드 강제 종료는
+      불가하므로 결과만 포기).
+    - deadline_sec: 전체 예산. 넘기면 아직 시작 못 한 job은 cancelled, 실행 중인
+      job은 job_timeout이 남아 있어도 timeout — 반환은 deadline_sec를 넘지 않음.
+    한 job의 예외는 해당 job 결과에만 기록되고 나머지 실행엔 영향 없음.
+    job은 호출 시점 contextvars 사본에서 실행 (tracing span이 호출자 run에 붙음).
+    """
+    started = {}
+    results = [None] * len(jobs)
+    t0 = time.monotonic()
+
+    def _run(i):
+        started[i] = time.monotonic()
+        return fn(*jobs[i])
+
+    def _elapsed_ms(i, now):
+        return int((now - started.get(i, now)) * 1000)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    futures = {
+        executor.submit(contextvars.copy_context().run, _run, i): i
+        for i in range(len(jobs))
+    }
+    pending = set(futures)
+    deadline_at = None if deadline_sec is None else t0 + deadline_sec
+
+    def _due(i):
+        """실행 중인 job i의 포기 시각: min(시작+job_timeout, 전체 deadline)."""
+        due = deadline_at
+        if job_timeout is not None:
+            job_due = started[i] + job_timeout
+            due = job_due if due is None else min(due, job_due)
+        return due
+
+    try:
+        while pending:
+            now = time.monotonic()
+            dues = [d for d in (_due(futures[f]) for f in pending if futures[f] in started)
+                    if d is not None]
+            if deadline_at is not None:
+                dues.append(deadline_at)
+            wait_for = min([1.0] + [max(0.0, d - now) for d in dues])
+            done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            for f in done:
+                i = futures[f]
+                try:
+                    results[i] = {"status": "ok", "result": f.result()}
+                except Exception as e:
+                    results[i] = {"status": "error", "error": str(e)[:200]}
+                results[i]["elapsed_ms"] = _elapsed_ms(i, now)
+            for f in list(pending):
+                i = futures[f]
+                if i in started:
+                    due = _due(i)
+                    if due is not None and now >= due:
+                        pending.discard(f)
+                        results[i] = {"status": "timeout", "elapsed_ms": _elapsed_ms(i, now)}
+                elif deadline_at is not None and now >= deadline_at and f.cancel():
+                    pending.discard(f)
+                    results[i] = {"status": "cancelled", "elapsed_ms": 0}
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    for i, r in enumerate(results):
+        r["args"] = jobs[i]
+    return results
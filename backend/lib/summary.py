@@ -0,0 +1,70 @@
+"""news.summary 정규화 — Gemini 출력 텍스트를 {"items": [...], "insight": ...} 형태로.
+
+쓰기 시점(save_news/update_summary)에 한 번 정규화해 news.summary_json(JSONB)에
+저장하고, 읽기 경로는 그 값을 그대로 쓴다. parse_summary의 다단계 파싱은
+summary_json이 없는 레거시 행(백필 전)에만 쓰임.
+"""
+
+import json
+
+
+def _try_json_loads(value):
+    try:
+        return json.loads(value)
+    except Exception:
+        return None
+
+
+def parse_summary(summary_value):
+    """
+    Normalize summary payload from DB into a dict with at least:
+    {"items": [...], "insight": "..."}
+    """
+    if isinstance(summary_value, dict):
+        return summary_value
+
+    if not isinstance(summary_value, str):
+        return {"items": [], "insight": str(summary_value or "")}
+
+    # 1) direct JSON object string
+    direct = _try_json_loads(summary_value)
+    if isinstance(direct, dict):
+        return direct
+
+    # 2) double-encoded JSON string
+    if isinstance(direct, str):
+        nested = _try_json_loads(direct)
+        if isinstance(nested, dict):
+            return nested
+
+    text = summary_value.strip()
+
+    # 3) markdown fenced JSON
+    if text.startswith("```"):
+        text = text.replace("```json", "", 1).replace("```", "").strip()
+        fenced = _try_json_loads(text)
+        if isinstance(fenced, dict):
+            return fenced
+
+    # 4) extract first JSON object fragment
+    start = text.find("{")
+    end = text.rfind("}")
+    if start >= 0 and end > start:
+        fragment = _try_json_loads(text[start : end + 1])
+        if isinstance(fragment, dict):
+            return fragment
+
+    # 5) plain text fallback
+    return {"items": [], "insight": text}
+
+
+def normalize_summary(summary_value) -> dict:
+    """parse_summary 결과를 저장 형태로 검증: items는 dict 리스트, insight는
+    dict 또는 문자열. 그 외 최상위 키는 그대로 둠."""
+    parsed = dict(parse_summary(summary_value))
+    items = parsed.get("items")
+    parsed["items"] = [it for it in items if isinstance(it, dict)] if isinstance(items, list) else []
+    insight = parsed.get("insight")
+    if not isinstance(insight, (dict, str)):
+        parsed["insight"] = "" if insight is None else str(insight)
+    return parsed
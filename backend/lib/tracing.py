@@ -0,0 +1,285 @@
+"""파이프라인 계측 — 실행(run) 1건 안의 단계(span)별 소요 시간·토큰·재시도·결과.
+
+    with pipeline_run("fetch_and_store", region="kr", category="tech") as run:
+        with span("search"):
+            response = generate(...)   # gemini_client가 토큰·재시도를 현재 span에 기록
+        run.set(news_id=news_id)
+
+- 현재 run/span은 contextvars로 전달. 스레드로 넘길 때는 contextvars.copy_context()
+  로 감싸 실행해야 그 스레드의 span이 같은 run에 붙음 (scheduler.run_jobs는 자동).
+- 토큰·재시도·예산 대기는 가장 안쪽 span에만 기록 → run 합계에서 중복 없음.
+- span이 끝날 때마다 JSON 한 줄 로그, run이 끝나면 요약 JSON 로그 + pipeline_runs
+  테이블에 1행 (PIPELINE_RUNS_ENABLED, fail-soft — 계측 실패가 파이프라인을 막지 않음).
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from psycopg2.extras import Json
+from .db import connection
+
+
+PIPELINE_RUNS_ENABLED = os.environ.get("PIPELINE_RUNS_ENABLED", "1") == "1"
+PIPELINE_RUNS_RETENTION_DAYS = int(os.environ.get("PIPELINE_RUNS_RETENTION_DAYS", "30"))
+MAX_SPANS_PER_RUN = 500  # 긴 백필 run이 한 행을 무한히 키우지 않게
+
+TOKEN_FIELDS = (
+    ("prompt", "prompt_token_count"),
+    ("output", "candidates_token_count"),
+    ("cached", "cached_content_token_count"),
+    ("thoughts", "thoughts_token_count"),
+    ("total", "total_token_count"),
+)
+
+_current_run = contextvars.ContextVar("pipeline_run", default=None)
+_current_span = contextvars.ContextVar("pipeline_span", default=None)
+
+
+def _log(payload: dict):
+    print(json.dumps(payload, ensure_ascii=False, default=str))
+
+
+class Span:
+    def __init__(self, name: str, run, attrs: dict):
+        self.name = name
+        self.run = run
+        self.attrs = dict(attrs)
+        self.status = "ok"
+        self.error = None
+        self.retries = 0
+        self.budget_wait_ms = 0
+        self.tokens = {}
+        self.started = time.monotonic()
+        self.duration_ms = None
+        self._lock = threading.Lock()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add_tokens(self, counts: dict):
+        with self._lock:
+            for key, value in counts.items():
+                self.tokens[key] = self.tokens.get(key, 0) + value
+
+    def to_dict(self) -> dict:
+        d = {"name": self.name, "status": self.status, "duration_ms": self.duration_ms}
+        if self.run is not None:
+            d["offset_ms"] = int((self.started - self.run.started) * 1000)
+        if self.error:
+            d["error"] = self.error
+        if self.retries:
+            d["retries"] = self.retries
+        if self.budget_wait_ms:
+            d["budget_wait_ms"] = self.budget_wait_ms
+        if self.tokens:
+            d["tokens"] = dict(self.tokens)
+        if self.attrs:
+            d["attrs"] = self.attrs
+        return d
+
+
+class Run:
+    def __init__(self, name: str, attrs: dict):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.attrs = dict(attrs)
+        self.status = "ok"
+        self.error = None
+        self.started_at = datetime.now(timezone.utc)
+        self.started = time.monotonic()
+        self.duration_ms = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add_span(self, s: Span):
+        with self._lock:
+            if len(self.spans) < MAX_SPANS_PER_RUN:
+                self.spans.append(s.to_dict())
+
+    def totals(self) -> dict:
+        with self._lock:
+            spans = list(self.spans)
+        tokens = {}
+        for s in spans:
+            for key, value in (s.get("tokens") or {}).items():
+                tokens[key] = tokens.get(key, 0) + value
+        return {
+            "tokens": tokens,
+            "retries": sum(s.get("retries", 0) for s in spans),
+        }
+
+
+@contextmanager
+def pipeline_run(name: str, **attrs):
+    """run 1건 계측. 예외는 status=error로 기록 후 그대로 올림."""
+    run = Run(name, attrs)
+    token = _current_run.set(run)
+    try:
+        yield run
+    except BaseException as e:
+        run.status, run.error = "error", str(e)[:300]
+        raise
+    finally:
+        _current_run.reset(token)
+        run.duration_ms = int((time.monotonic() - run.started) * 1000)
+        totals = run.totals()
+        _log({
+            "type": "pipeline_run", "run_id": run.id, "name": run.name,
+            "status": run.status, "error": run.error, "duration_ms": run.duration_ms,
+            "attrs": run.attrs, **totals,
+        })
+        _persist(run, totals)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """단계 1개 계측. run 밖에서 써도 로그는 남음. 예외는 status=error로 기록 후 올림."""
+    run = _current_run.get()
+    s = Span(name, run, attrs)
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.status, s.error = "error", str(e)[:300]
+        raise
+    finally:
+        _current_span.reset(token)
+        s.duration_ms = int((time.monotonic() - s.started) * 1000)
+        payload = {"type": "span", "run_id": run.id if run else None, **s.to_dict()}
+        _log(payload)
+        if run is not None:
+            run.add_span(s)
+
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+
+def current_run() -> Run | None:
+    return _current_run.get()
+
+
+def record_usage(response):
+    """응답의 usage_metadata 토큰 수를 현재 span에 누적 (span 밖이면 무시)."""
+    s = _current_span.get()
+    usage = getattr(response, "usage_metadata", None)
+    if s is None or usage is None:
+        return
+    s.add_tokens({
+        key: getattr(usage, attr, None) or 0
+        for key, attr in TOKEN_FIELDS
+    })
+
+
+def record_retry():
+    s = _current_span.get()
+    if s is not None:
+        s.retries += 1
+
+
+def record_budget_wait(seconds: float):
+    s = _current_span.get()
+    if s is not None and seconds > 0:
+        s.budget_wait_ms += int(seconds * 1000)
+
+
+def _persist(run: Run, totals: dict):
+    if not PIPELINE_RUNS_ENABLED:
+        return
+    tokens = totals["tokens"]
+    try:
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                INSERT INTO pipeline_runs (
+                    id, name, status, error, attrs, started_at, duration_ms,
+                    prompt_tokens, output_tokens, total_tokens, retries, spans
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """,
+                (
+                    run.id, run.name, run.status, run.error, Json(run.attrs),
+                    run.started_at, run.duration_ms,
+                    tokens.get("prompt", 0), tokens.get("output", 0), tokens.get("total", 0),
+                    totals["retries"], Json(run.spans),
+                ),
+            )
+            cur.close()
+    except Exception as e:
+        print(f"  pipeline_runs 기록 실패: {e}")
+
+
+# ── 조회 (admin) ─────────────────────────────────────────────
+
+def recent_runs(name: str | None = None, limit: int = 50) -> list:
+    """최근 run 목록 (최신순, spans 포함)."""
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT id, name, status, error, attrs, started_at, duration_ms,
+                   prompt_tokens, output_tokens, total_tokens, retries, spans
+            FROM pipeline_runs
+            WHERE %(name)s::text IS NULL OR name = %(name)s
+            ORDER BY started_at DESC
+            LIMIT %(limit)s
+            """,
+            {"name": name, "limit": limit},
+        )
+        cols = [d[0] for d in cur.description]
+        rows = [dict(zip(cols, r)) for r in cur.fetchall()]
+        cur.close()
+    return rows
+
+
+def stage_stats(name: str | None = None, hours: int = 24) -> list:
+    """최근 hours시간 span 이름별 집계 — 건수·p50/p95 소요·오류·재시도·토큰 합계."""
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT r.name AS run, s->>'name' AS stage,
+                   COUNT(*) AS count,
+                   percentile_cont(0.5) WITHIN GROUP (ORDER BY (s->>'duration_ms')::int) AS p50_ms,
+                   percentile_cont(0.95) WITHIN GROUP (ORDER BY (s->>'duration_ms')::int) AS p95_ms,
+                   COUNT(*) FILTER (WHERE s->>'status' = 'error') AS errors,
+                   COALESCE(SUM((s->>'retries')::int), 0) AS retries,
+                   COALESCE(SUM((s->'tokens'->>'prompt')::bigint), 0) AS prompt_tokens,
+                   COALESCE(SUM((s->'tokens'->>'output')::bigint), 0) AS output_tokens,
+                   COALESCE(SUM((s->'tokens'->>'total')::bigint), 0) AS total_tokens
+            FROM pipeline_runs r, jsonb_array_elements(r.spans) s
+            WHERE r.started_at >= now() - make_interval(hours => %(hours)s)
+              AND (%(name)s::text IS NULL OR r.name = %(name)s)
+            GROUP BY 1, 2
+            ORDER BY 1, p95_ms DESC
+            """,
+            {"name": name, "hours": hours},
+        )
+        cols = [d[0] for d in cur.description]
+        rows = [dict(zip(cols, r)) for r in cur.fetchall()]
+        cur.close()
+    for row in rows:
+        for key in ("p50_ms", "p95_ms"):
+            row[key] = int(row[key]) if row[key] is not None else None
+    return rows
+
+
+def prune_pipeline_runs(retention_days: int = PIPELINE_RUNS_RETENTION_DAYS) -> int:
+    """보존 기간 지난 run 삭제 (cron에서 호출). 삭제 건수 반환."""
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "DELETE FROM pipeline_runs WHERE started_at < now() - make_interval(days => %s)",
+            (retention_days,),
+        )
+        deleted = cur.rowcount
+        cur.close()
+    return deleted
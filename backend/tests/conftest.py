@@ -0,0 +1,7 @@
+import os
+import sys
+
+# api/·lib/를 backend 루트 기준으로 import (Vercel 런타임과 같은 경로)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+# api/admin.py는 import 시 키가 없으면 실패
+os.environ.setdefault("ADMIN_SECRET_KEY", "test")
@@ -0,0 +1,47 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from api.admin import _decode_cursor, _encode_cursor, _listing_queries
+
+
+def test_roundtrip_with_timestamp():
+    ts = datetime(2026, 5, 1, 12, 30, tzinfo=timezone.utc)
+    raw = _encode_cursor({"created_at": ts, "id": 42})
+    assert raw == "2026-05-01T12:30:00+00:00,42"
+    assert _decode_cursor(raw) == ("2026-05-01T12:30:00+00:00", "42")
+
+
+def test_null_created_at_cursor():
+    raw = _encode_cursor({"created_at": None, "id": "uid-1"})
+    assert raw == ",uid-1"
+    assert _decode_cursor(raw) == (None, "uid-1")
+
+
+def test_empty_cursor_is_first_page():
+    assert _decode_cursor("") is None
+    assert _decode_cursor(None) is None
+
+
+@pytest.mark.parametrize("raw", ["no-comma", "2026-05-01T00:00:00,", ","])
+def test_malformed_cursor(raw):
+    with pytest.raises(ValueError):
+        _decode_cursor(raw)
+
+
+def test_listing_phases_after_timestamp_cursor():
+    phases = _listing_queries("reviews", ("2026-05-01T00:00:00+00:00", "7"))
+    assert len(phases) == 2
+    (q1, a1), (q2, a2) = phases
+    assert "created_at IS NOT NULL" in q1 and "(created_at, id) < (%s, %s)" in q1
+    assert a1 == ["2026-05-01T00:00:00+00:00", "7"]
+    # NULL 행은 전부 timestamp 행 뒤
+    assert "created_at IS NULL" in q2 and a2 == []
+
+
+def test_listing_phases_after_null_cursor():
+    phases = _listing_queries("reviews", (None, "7"))
+    assert len(phases) == 1
+    query, args = phases[0]
+    assert "created_at IS NULL AND id < %s" in query
+    assert args == ["7"]
@@ -0,0 +1,22 @@
+import pytest
+
+from lib.briefing import etag_matches
+
+
+ETAG = '"abc123"'
+
+
+@pytest.mark.parametrize("header", [
+    '"abc123"',
+    'W/"abc123"',
+    '"zzz", "abc123"',
+    ' "zzz" ,W/"abc123" ',
+    "*",
+])
+def test_matches(header):
+    assert etag_matches(header, ETAG)
+
+
+@pytest.mark.parametrize("header", [None, "", '"zzz"', "abc123", '"abc1234"'])
+def test_no_match(header):
+    assert not etag_matches(header, ETAG)
@@ -0,0 +1,77 @@
+from contextlib import contextmanager
+
+import pytest
+
+from lib import chat_quota
+from lib.chat_quota import consume_chat_quota
+
+
+class _FakeUsage:
+    """chat_usage 조건부 UPSERT(count < limit일 때만 +1)를 흉내 내는 커서."""
+
+    def __init__(self):
+        self.counts = {}
+        self.queries = 0
+        self._row = None
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, args):
+        user_id, date, limit = args
+        self.queries += 1
+        count = self.counts.get((user_id, date))
+        if count is None:
+            self.counts[(user_id, date)] = 1
+            self._row = (1,)
+        elif count < limit:
+            self.counts[(user_id, date)] = count + 1
+            self._row = (count + 1,)
+        else:
+            self._row = None
+
+    def fetchone(self):
+        return self._row
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def usage(monkeypatch):
+    db = _FakeUsage()
+
+    @contextmanager
+    def connection(conn=None):
+        yield db
+
+    monkeypatch.setattr(chat_quota, "connection", connection)
+    monkeypatch.setattr(chat_quota, "_today", lambda: "2026-05-01")
+    monkeypatch.setattr(chat_quota, "CHAT_QUOTA_PRECHECK", True)
+    chat_quota._exhausted.clear()
+    yield db
+    chat_quota._exhausted.clear()
+
+
+def test_allows_exactly_limit_calls(usage):
+    results = [consume_chat_quota("u1", 3) for _ in range(4)]
+    assert results == [(True, 1), (True, 2), (True, 3), (False, 3)]
+    assert usage.counts[("u1", "2026-05-01")] == 3
+
+
+def test_exhausted_user_rejected_without_db(usage):
+    for _ in range(2):
+        consume_chat_quota("u1", 2)
+    queries = usage.queries
+    assert consume_chat_quota("u1", 2) == (False, 2)
+    assert usage.queries == queries
+    # 다른 유저는 영향 없음
+    assert consume_chat_quota("u2", 2) == (True, 1)
+
+
+def test_new_day_resets_precheck(usage, monkeypatch):
+    for _ in range(2):
+        consume_chat_quota("u1", 2)
+    assert consume_chat_quota("u1", 2)[0] is False
+    monkeypatch.setattr(chat_quota, "_today", lambda: "2026-05-02")
+    assert consume_chat_quota("u1", 2) == (True, 1)
@@ -0,0 +1,21 @@
+import pytest
+
+from lib.chat_response_cache import _cache_key, normalize_message
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("왜 중요해?", "왜 중요해"),
+    ("  왜   중요해 ?!  ", "왜 중요해"),
+    ("WHY?", "why"),
+    ("왜 중요해？", "왜 중요해"),  # 전각 물음표 (NFKC)
+    ("ｆｕｌｌ　ｗｉｄｔｈ", "full width"),
+    ("그래서...", "그래서"),
+    ("중간?에 물음표", "중간?에 물음표"),
+])
+def test_normalize_message(raw, expected):
+    assert normalize_message(raw) == expected
+
+
+def test_cache_key_uses_normalized_message():
+    assert _cache_key("sys", "pre", "왜 중요해?") == _cache_key("sys", "pre", " 왜 중요해 ")
+    assert _cache_key("sys", "pre", "왜 중요해") != _cache_key("sys", "other", "왜 중요해")
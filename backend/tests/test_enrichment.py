@@ -0,0 +1,50 @@
+import threading
+
+import pytest
+
+from lib import gemini, gemini_client
+
+
+def test_generate_skips_call_when_cancelled(monkeypatch):
+    def boom():
+        raise AssertionError("client must not be used")
+
+    monkeypatch.setattr(gemini_client, "get_client", boom)
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(gemini_client.Cancelled):
+        gemini_client.generate("hi", cancel=cancel, use_budget=False)
+
+
+def test_stages_get_copies_and_timed_out_stage_is_cancelled(monkeypatch):
+    seen = {}
+    release = threading.Event()
+    stopped = threading.Event()
+
+    def slow_dialogue(data, cancel):
+        seen["dialogue"] = data
+        release.wait(5)
+        if cancel.is_set():
+            stopped.set()
+        return [{"speaker": "A", "text": "late"}]
+
+    def concepts(data, cancel):
+        seen["concepts"] = data
+        return {"concepts": [{"slug": "x"}]}
+
+    monkeypatch.setattr(gemini, "generate_dialogue", slow_dialogue)
+    monkeypatch.setattr(gemini, "_extract_concepts", concepts)
+    monkeypatch.setattr(gemini, "PRECOMPUTE_CHAT_ANSWERS", False)
+    monkeypatch.setattr(gemini, "DIALOGUE_TIMEOUT_SEC", 0.1)
+
+    data = {"items": [{"title": "t", "quiz": [{"question": "q"}]}]}
+    dialogue, extracted, answers = gemini._run_enrichment(data)
+    assert dialogue == [] and answers == []
+    assert extracted == {"concepts": [{"slug": "x"}]}
+    # 단계마다 별도 사본 — 원본 변경이 버려진 단계에 보이지 않음
+    assert seen["dialogue"] is not data and seen["concepts"] is not data
+    data["items"][0]["quiz"][0]["concept_ids"] = [1]
+    assert "concept_ids" not in seen["dialogue"]["items"][0]["quiz"][0]
+    # 반환 시 cancel이 켜져 남은 단계가 추가 호출 없이 멈춤
+    release.set()
+    assert stopped.wait(2)
@@ -0,0 +1,63 @@
+import pytest
+
+from lib import ratelimit
+from lib.ratelimit import MemoryCounter, RateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(ratelimit.time, "time", lambda: now[0])
+    return now
+
+
+def test_limit_within_window(clock):
+    limiter = RateLimiter("t", limit=2, window_sec=10, backend="memory")
+    clock[0] = 100
+    assert [limiter.allow("ip") for _ in range(3)] == [True, True, False]
+    assert limiter.allow("other")
+
+
+def test_window_rollover_weights_previous_window(clock):
+    limiter = RateLimiter("t", limit=2, window_sec=10, backend="memory")
+    clock[0] = 100
+    for _ in range(3):
+        limiter.allow("ip")
+    # 다음 윈도 절반: 3 × 0.5 + 1 = 2.5 > 2
+    clock[0] = 115
+    assert not limiter.allow("ip")
+    # 그다음 윈도 절반: 직전 윈도(1회) × 0.5 + 1 = 1.5
+    clock[0] = 125
+    assert limiter.allow("ip")
+
+
+def test_counter_rollover_state():
+    counter = MemoryCounter(window_sec=10)
+    counter.incr("k", 100)
+    counter.incr("k", 101)
+    assert counter.incr("k", 112) == (110, 2, 1)
+    # 2윈도 이상 지나면 직전 카운트도 버림
+    assert counter.incr("k", 135) == (130, 0, 1)
+
+
+def test_lru_eviction_over_max_keys():
+    counter = MemoryCounter(window_sec=10, max_keys=2)
+    counter.incr("a", 100)
+    counter.incr("b", 100)
+    counter.incr("a", 101)  # a가 최근 사용
+    counter.incr("c", 102)
+    assert list(counter._state) == ["a", "c"]
+
+
+def test_idle_keys_evicted():
+    counter = MemoryCounter(window_sec=10)
+    counter.incr("idle", 0)
+    counter.incr("busy", 30)
+    assert len(counter) == 1
+    assert "busy" in counter._state
+
+
+@pytest.mark.parametrize("now, expected", [(120, 60), (125, 55), (179.5, 1), (179.99, 1)])
+def test_retry_after(now, expected):
+    limiter = RateLimiter("t", limit=1, window_sec=60, backend="memory")
+    assert limiter.retry_after(now) == expected
@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+from lib.scheduler import RateBudget, run_jobs
+
+
+@pytest.fixture
+def release():
+    """느린 job을 테스트 끝에 풀어 줌 (run_jobs는 스레드를 기다리지 않음)."""
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+def test_results_in_input_order_and_errors_isolated():
+    def fn(x):
+        if x == 2:
+            raise ValueError("boom")
+        time.sleep(0.05 * (3 - x))
+        return x * 10
+
+    results = run_jobs(fn, [(0,), (1,), (2,)], max_workers=3)
+    assert [r["args"] for r in results] == [(0,), (1,), (2,)]
+    assert [r["status"] for r in results] == ["ok", "ok", "error"]
+    assert [r.get("result") for r in results[:2]] == [0, 10]
+    assert "boom" in results[2]["error"]
+
+
+def test_job_timeout(release):
+    t0 = time.monotonic()
+    results = run_jobs(lambda: release.wait(5), [()], max_workers=1, job_timeout=0.2)
+    elapsed = time.monotonic() - t0
+    assert results[0]["status"] == "timeout"
+    assert 150 <= results[0]["elapsed_ms"] < 500
+    assert elapsed < 0.5
+
+
+def test_deadline_caps_running_and_cancels_unstarted(release):
+    t0 = time.monotonic()
+    results = run_jobs(lambda: release.wait(5), [(), ()], max_workers=1,
+                       job_timeout=10, deadline_sec=0.3)
+    elapsed = time.monotonic() - t0
+    # 실행 중인 job은 job_timeout이 남아 있어도 deadline에 timeout
+    assert [r["status"] for r in results] == ["timeout", "cancelled"]
+    assert results[1]["elapsed_ms"] == 0
+    assert elapsed < 0.6
+
+
+def test_timeout_counts_from_job_start(release):
+    # 두 번째 job은 첫 job이 끝난 뒤(0.15s) 시작 — 그 시점부터 0.3s
+    def fn(i):
+        if i == 0:
+            time.sleep(0.15)
+            return "fast"
+        release.wait(5)
+
+    t0 = time.monotonic()
+    results = run_jobs(fn, [(0,), (1,)], max_workers=1, job_timeout=0.3)
+    elapsed = time.monotonic() - t0
+    assert [r["status"] for r in results] == ["ok", "timeout"]
+    assert 0.4 <= elapsed < 0.8
+
+
+def test_budget_allows_up_to_limit_then_waits():
+    budget = RateBudget(2, window_sec=0.2)
+    assert budget.acquire(timeout=0)
+    assert budget.acquire(timeout=0)
+    assert not budget.acquire(timeout=0.01)
+    t0 = time.monotonic()
+    assert budget.acquire()
+    assert 0.1 <= time.monotonic() - t0 < 0.4
+
+
+def test_budget_unlimited():
+    budget = RateBudget(0)
+    assert all(budget.acquire(timeout=0) for _ in range(100))
@@ -0,0 +1,33 @@
+import json
+
+from lib.summary import normalize_summary
+
+
+def test_dict_keeps_only_dict_items():
+    out = normalize_summary({"items": [{"title": "a"}, "junk", 3], "insight": "i", "extra": 1})
+    assert out == {"items": [{"title": "a"}], "insight": "i", "extra": 1}
+
+
+def test_fenced_json_string():
+    raw = "```json\n" + json.dumps({"items": [{"title": "a"}], "insight": "i"}) + "\n```"
+    assert normalize_summary(raw) == {"items": [{"title": "a"}], "insight": "i"}
+
+
+def test_double_encoded_json():
+    raw = json.dumps(json.dumps({"items": [], "insight": {"text": "x"}}))
+    assert normalize_summary(raw) == {"items": [], "insight": {"text": "x"}}
+
+
+def test_plain_text_becomes_insight():
+    assert normalize_summary("  그냥 텍스트 ") == {"items": [], "insight": "그냥 텍스트"}
+
+
+def test_non_list_items_and_bad_insight():
+    assert normalize_summary({"items": {"a": 1}, "insight": 5}) == {"items": [], "insight": "5"}
+    assert normalize_summary({"items": None, "insight": None}) == {"items": [], "insight": ""}
+
+
+def test_does_not_mutate_input():
+    src = {"items": ["junk"], "insight": None}
+    normalize_summary(src)
+    assert src == {"items": ["junk"], "insight": None}